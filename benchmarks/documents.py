@@ -0,0 +1,88 @@
+"""
+Generators of synthetic XML documents for the *xml4h* benchmarks.
+
+Each generator returns XML text for a document with roughly the requested
+number of elements. The elements of interest to queries are always named
+``Item`` and are in the :data:`NS_URI` namespace, whatever the shape of the
+document.
+"""
+
+# Namespace URI of the Item elements in every generated document
+NS_URI = 'urn:bench'
+
+# Named document sizes, in elements
+SIZES = {
+    '1k': 1000,
+    '100k': 100000,
+    '1m': 1000000,
+    }
+
+# Nesting depth of the chains of elements in a deep document. This is kept
+# below the default depth limit of the libxml2 parser used by lxml
+DEEP_DOCUMENT_DEPTH = 100
+
+
+def records_xml(element_count):
+    """
+    :return: XML text for a document of records, where each Item element
+        has attributes and a Title child element with text content.
+    """
+    items = [
+        '<Item id="%d" kind="k%d"><Title>Text %d</Title></Item>'
+        % (i, i % 7, i)
+        for i in range(element_count / 2)]
+    return '<Items xmlns="%s">%s</Items>' % (NS_URI, ''.join(items))
+
+
+def wide_xml(element_count):
+    """
+    :return: XML text for a document where every Item element is a child
+        of the root element.
+    """
+    items = ['<Item n="%d"/>' % i for i in range(element_count)]
+    return '<Items xmlns="%s">%s</Items>' % (NS_URI, ''.join(items))
+
+
+def deep_xml(element_count):
+    """
+    :return: XML text for a document made up of chains of nested Item
+        elements :data:`DEEP_DOCUMENT_DEPTH` deep.
+    """
+    chain = (
+        '<Item>' * DEEP_DOCUMENT_DEPTH + 'Text'
+        + '</Item>' * DEEP_DOCUMENT_DEPTH)
+    chain_count = max(1, element_count / DEEP_DOCUMENT_DEPTH)
+    return '<Items xmlns="%s">%s</Items>' % (NS_URI, chain * chain_count)
+
+
+def namespaced_xml(element_count):
+    """
+    :return: XML text for a document of records like :func:`records_xml`,
+        but with prefixed names from several namespaces and with namespaces
+        declared throughout the document as well as on the root element.
+    """
+    items = [
+        '<b:Item xmlns:x%d="urn:extra:%d" a:id="%d" x%d:kind="k%d">'
+        '<c:Title>Text %d</c:Title></b:Item>'
+        % (i % 5, i % 5, i, i % 5, i % 7, i)
+        for i in range(element_count / 2)]
+    return (
+        '<b:Items xmlns:b="%s" xmlns:a="urn:attrs" xmlns:c="urn:content">'
+        '%s</b:Items>' % (NS_URI, ''.join(items)))
+
+
+# Document generators by name
+DOCUMENT_KINDS = {
+    'records': records_xml,
+    'wide': wide_xml,
+    'deep': deep_xml,
+    'namespaced': namespaced_xml,
+    }
+
+
+def generate_xml(kind, element_count):
+    """
+    :return: XML text for a document of the named kind with roughly the
+        given number of elements.
+    """
+    return DOCUMENT_KINDS[kind](element_count)
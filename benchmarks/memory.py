@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Report the memory used by *xml4h* wrapper objects, in bytes per wrapped node,
+for each available adapter.
+
+The figures count the wrapper object itself plus its instance ``__dict__``
+if it has one, but not the underlying implementation nodes which are owned
+by the XML library.
+
+Usage::
+
+    python benchmarks/memory.py [ELEMENT_COUNT]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import xml4h
+
+from documents import generate_xml
+
+
+def wrapper_size(obj):
+    """
+    :return: the size in bytes of a wrapper object and of its instance
+        attribute dictionary, if it has one.
+    """
+    size = sys.getsizeof(obj)
+    # Use getattr default, since Element lookups raise AttributeError
+    obj_dict = getattr(obj, '__dict__', None)
+    if obj_dict is not None:
+        size += sys.getsizeof(obj_dict)
+    return size
+
+
+def measure(adapter, xml_text):
+    """
+    :return: a dict of average wrapper sizes in bytes for the kinds of
+        objects created when traversing a document parsed by the adapter.
+    """
+    doc = xml4h.parse(xml_text, adapter=adapter)
+    elements = doc.find()
+    texts = [t for e in elements for t in e.children if t.is_text]
+    attributes = [a for e in elements for a in e.attribute_nodes]
+    attribute_dicts = [e.attributes for e in elements]
+    impl_attributes = [a.impl_node for a in attributes]
+    impl_texts = [t.impl_node for t in texts]
+    results = {}
+    for label, objs in [
+            ('Element', elements),
+            ('Text', texts),
+            ('Attribute', attributes),
+            ('AttributeDict', attribute_dicts),
+            ('impl attribute', impl_attributes),
+            ('impl text', impl_texts)]:
+        if not objs or not hasattr(objs[0], '__class__'):
+            continue
+        # Skip implementation nodes owned by the underlying XML library
+        if label.startswith('impl') and (
+                objs[0].__class__.__module__.split('.')[0] != 'xml4h'):
+            continue
+        results[label] = sum(wrapper_size(o) for o in objs) / len(objs)
+    return results
+
+
+def main(element_count=100000):
+    xml_text = generate_xml('records', element_count)
+    print 'Bytes per wrapper object, document with %d elements' % element_count
+    for adapter in xml4h._ADAPTERS_AVAILABLE:
+        results = measure(adapter, xml_text)
+        print '%s:' % adapter.__name__
+        for label in sorted(results):
+            print '    %-16s %6d' % (label, results[label])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
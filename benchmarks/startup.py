@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Time how long it takes to start a Python interpreter and import *xml4h*,
+which matters most to short-lived programs such as command line tools.
+
+Each import runs in a new interpreter process, and the best time of several
+runs is reported alongside the time to start an interpreter that imports
+nothing, and the time to import *xml4h* and then parse a small document with
+the best adapter, which also imports the underlying XML library.
+
+Usage::
+
+    python benchmarks/startup.py [--repeat N] [--max-seconds SECONDS]
+
+With ``--max-seconds`` the script exits with an error status if importing
+*xml4h* takes longer than the given time, beyond the interpreter's own
+startup time.
+"""
+import os
+import sys
+import timeit
+import optparse
+import subprocess
+
+
+PACKAGE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Python statements to time, by name
+STATEMENTS = [
+    ('python', 'pass'),
+    ('import xml4h', 'import xml4h'),
+    ('import xml4h and parse',
+        'import xml4h; xml4h.parse("<a><b/></a>")'),
+    ]
+
+
+def time_statement(statement, repeat):
+    """
+    :return: the shortest time in seconds taken to run the statement in a
+        new Python interpreter, in the given number of runs.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [PACKAGE_DIR] + [p for p in [env.get('PYTHONPATH')] if p])
+    command = [sys.executable, '-c', statement]
+    best_time = None
+    for i in range(repeat):
+        start_time = timeit.default_timer()
+        subprocess.check_call(command, env=env)
+        elapsed_time = timeit.default_timer() - start_time
+        if best_time is None or elapsed_time < best_time:
+            best_time = elapsed_time
+    return best_time
+
+
+def main(args):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--repeat', type='int', default=20,
+        help='number of runs of each statement [default: %default]')
+    parser.add_option('--max-seconds', type='float',
+        help='fail if importing xml4h takes longer than this')
+    options, args = parser.parse_args(args)
+    if args:
+        parser.error('unexpected arguments: %s' % ' '.join(args))
+    seconds = {}
+    for name, statement in STATEMENTS:
+        seconds[name] = time_statement(statement, options.repeat)
+        print '%-25s %8.1fms' % (name, seconds[name] * 1000)
+    import_seconds = seconds['import xml4h'] - seconds['python']
+    print '%-25s %8.1fms' % ('xml4h import overhead', import_seconds * 1000)
+    if options.max_seconds is not None and (
+            import_seconds > options.max_seconds):
+        print '\nImporting xml4h is slower than %.1fms' % (
+            options.max_seconds * 1000)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
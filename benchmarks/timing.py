@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+"""
+Time the core *xml4h* operations -- parsing, traversal, find, XPath queries,
+building and writing -- for each available adapter on synthetic documents
+of several shapes and sizes.
+
+Each operation is run a few times and the best time is reported. Results
+can be saved as JSON, and compared with the results of an earlier run to
+flag operations that have become slower.
+
+Usage::
+
+    python benchmarks/timing.py [options]
+
+For example, to save a baseline then check a change for regressions::
+
+    python benchmarks/timing.py --output baseline.json
+    python benchmarks/timing.py --output new.json --baseline baseline.json
+
+Run with ``--help`` for the full list of options.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import timeit
+import platform
+import optparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import xml4h
+
+from documents import NS_URI, SIZES, DOCUMENT_KINDS, generate_xml
+
+
+class NullWriter(object):
+    """
+    Writer that discards output, so writing benchmarks measure only the
+    work of serialization.
+    """
+
+    def write(self, data):
+        pass
+
+
+def extract_structure(element):
+    """
+    :return: a nested tuple of the name, namespace URI, attributes, text
+        and children of an element, from which to build a copy of it.
+    """
+    return (
+        element.local_name,
+        element.namespace_uri,
+        [(a.local_name, a.value, a.namespace_uri)
+            for a in element.attribute_nodes
+            if a.namespace_uri != xml4h.nodes.Node.XMLNS_URI],
+        element.text,
+        [extract_structure(c) for c in element.children if c.is_element])
+
+
+def traverse(doc):
+    """
+    Visit every node in a document via the *children* of each node.
+    """
+    pending_nodes = [doc.root]
+    while pending_nodes:
+        pending_nodes.extend(pending_nodes.pop().children)
+
+
+def build(adapter, structure, fast=False):
+    """
+    Build a document with the given structure from :func:`extract_structure`
+    using the builder, or a fast builder if *fast* is True.
+
+    :return: the built document.
+    """
+    name, ns_uri, attributes, text, children = structure
+    builder = xml4h.build(name, ns_uri=ns_uri, adapter=adapter, fast=fast)
+    # Stack of the children of each open element still to be built
+    pending_children = [iter(children)]
+    while pending_children:
+        child = next(pending_children[-1], None)
+        if child is None:
+            pending_children.pop()
+            builder = builder.up()
+            continue
+        name, ns_uri, attributes, text, children = child
+        builder = builder.element(name, ns_uri=ns_uri)
+        for attr_name, attr_value, attr_ns_uri in attributes:
+            builder.attributes({attr_name: attr_value}, ns_uri=attr_ns_uri)
+        if text is not None:
+            builder.text(text)
+        pending_children.append(iter(children))
+    return builder.dom_element.document
+
+
+def operations(adapter, xml_text, doc):
+    """
+    :return: a list of (name, function) pairs for the operations to time
+        with the given adapter, where each function takes no arguments.
+    """
+    structure = extract_structure(doc.root)
+    result = [
+        ('parse', lambda: xml4h.parse(xml_text, adapter=adapter)),
+        ('traverse', lambda: traverse(doc)),
+        ('find', lambda: doc.find('Item')),
+        ]
+    if adapter.has_feature('xpath'):
+        result.append(('xpath',
+            lambda: doc.root.xpath('.//b:Item', namespaces={'b': NS_URI})))
+    result.extend([
+        ('build', lambda: build(adapter, structure)),
+        ('build_fast', lambda: build(adapter, structure, fast=True)),
+        ('write', lambda: xml4h.write_node(doc, NullWriter())),
+        ('write_indented',
+            lambda: xml4h.write_node(doc, NullWriter(), indent=2)),
+        ])
+    return result
+
+
+def time_function(func, repeat):
+    """
+    :return: the shortest time in seconds taken by the function in the given
+        number of runs.
+    """
+    best_time = None
+    for i in range(repeat):
+        gc.collect()
+        start_time = timeit.default_timer()
+        func()
+        elapsed_time = timeit.default_timer() - start_time
+        if best_time is None or elapsed_time < best_time:
+            best_time = elapsed_time
+    return best_time
+
+
+def run(adapters, kinds, sizes, operation_names=None, repeat=3):
+    """
+    Time operations for each combination of adapter, document kind and
+    document size, printing each result as it is measured.
+
+    :return: a list of result dicts.
+    """
+    results = []
+    for size_name in sizes:
+        for kind in kinds:
+            xml_text = generate_xml(kind, SIZES[size_name])
+            for adapter in adapters:
+                doc = xml4h.parse(xml_text, adapter=adapter)
+                for name, func in operations(adapter, xml_text, doc):
+                    if operation_names and name not in operation_names:
+                        continue
+                    result = {
+                        'adapter': adapter.__name__,
+                        'document': kind,
+                        'size': size_name,
+                        'operation': name,
+                        'seconds': time_function(func, repeat),
+                        }
+                    print format_result(result)
+                    sys.stdout.flush()
+                    results.append(result)
+                del doc
+    return results
+
+
+def result_key(result):
+    return (result['adapter'], result['document'], result['size'],
+        result['operation'])
+
+
+def format_result(result, comment=''):
+    return '%-20s %-11s %-5s %-15s %10.4fs %s' % (
+        result_key(result) + (result['seconds'], comment))
+
+
+def compare(results, baseline_results, threshold, min_seconds):
+    """
+    Print a comparison of results with those of a baseline run.
+
+    :return: a list of the results that are slower than the baseline by more
+        than the *threshold* fraction, ignoring operations that took less
+        than *min_seconds* in the baseline since these are too short to
+        time reliably.
+    """
+    baseline_seconds = dict(
+        (result_key(r), r['seconds']) for r in baseline_results)
+    regressions = []
+    for result in results:
+        old_seconds = baseline_seconds.get(result_key(result))
+        if old_seconds is None:
+            print format_result(result, '(not in baseline)')
+            continue
+        change = (result['seconds'] - old_seconds) / max(old_seconds, 1e-9)
+        comment = '%+7.1f%%' % (change * 100)
+        if change > threshold and old_seconds >= min_seconds:
+            comment += '  REGRESSION'
+            regressions.append(result)
+        print format_result(result, comment)
+    return regressions
+
+
+def environment():
+    """
+    :return: a dict describing the environment the benchmarks ran in.
+    """
+    info = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'xml4h': xml4h.__version__,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+    try:
+        from lxml import etree
+        info['lxml'] = etree.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def parse_options(args):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    adapter_names = [a.__name__ for a in xml4h._ADAPTERS_AVAILABLE]
+    parser.add_option('--adapters', default=','.join(adapter_names),
+        help='comma-separated adapter class names [default: %default]')
+    parser.add_option('--documents', default=','.join(
+            sorted(DOCUMENT_KINDS)),
+        help='comma-separated document kinds [default: %default]')
+    parser.add_option('--sizes', default='1k,100k',
+        help='comma-separated document sizes, from %s [default: %%default]'
+            % ', '.join(sorted(SIZES, key=SIZES.get)))
+    parser.add_option('--operations', default='',
+        help='comma-separated operations to time [default: all]')
+    parser.add_option('--repeat', type='int', default=3,
+        help='number of runs of each operation [default: %default]')
+    parser.add_option('--output', metavar='FILE',
+        help='write results to a JSON file')
+    parser.add_option('--input', metavar='FILE',
+        help='read results from a JSON file instead of running benchmarks,'
+            ' to compare with a baseline')
+    parser.add_option('--baseline', metavar='FILE',
+        help='compare results with those in a JSON file written earlier')
+    parser.add_option('--threshold', type='float', default=0.2,
+        help='fraction by which an operation must be slower than the'
+            ' baseline to be reported as a regression [default: %default]')
+    parser.add_option('--min-seconds', type='float', default=0.001,
+        help='ignore regressions in operations that took less than this'
+            ' in the baseline [default: %default]')
+    options, args = parser.parse_args(args)
+    if args:
+        parser.error('unexpected arguments: %s' % ' '.join(args))
+    adapters_by_name = dict((a.__name__, a)
+        for a in xml4h._ADAPTERS_AVAILABLE)
+    try:
+        options.adapters = [adapters_by_name[name]
+            for name in options.adapters.split(',')]
+    except KeyError, e:
+        parser.error('adapter not available: %s' % e.args[0])
+    options.documents = options.documents.split(',')
+    options.sizes = options.sizes.split(',')
+    for name in options.documents:
+        if name not in DOCUMENT_KINDS:
+            parser.error('unknown document kind: %s' % name)
+    for name in options.sizes:
+        if name not in SIZES:
+            parser.error('unknown document size: %s' % name)
+    options.operations = [n for n in options.operations.split(',') if n]
+    return options
+
+
+def main(args):
+    options = parse_options(args)
+    if options.input:
+        with open(options.input) as input_file:
+            report = json.load(input_file)
+    else:
+        report = {
+            'environment': environment(),
+            'repeat': options.repeat,
+            'results': run(options.adapters, options.documents,
+                options.sizes, options.operations, options.repeat),
+            }
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        print '\nComparison with baseline %s:' % options.baseline
+        regressions = compare(report['results'], baseline['results'],
+            options.threshold, options.min_seconds)
+        if regressions:
+            print '\n%d regression(s) found' % len(regressions)
+            return 1
+        print '\nNo regressions found'
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
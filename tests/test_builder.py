@@ -149,6 +149,51 @@ class BaseBuilderNodesTest(object):
             '</DocRoot>\n',
             xmlb.dom_element.xml_doc())
 
+    def test_elements_from(self):
+        records = [
+            {'id': 1, 'kind': 'a', 'title': 'One'},
+            {'id': 2, 'kind': None, 'title': None},
+            ]
+        xmlb = (
+            self.my_builder('DocRoot', ns_uri='urn:default')
+                .ns_prefix('x', 'urn:x')
+                .elements_from(records, 'Item',
+                    attributes={'id': 'id', 'x:kind': 'kind',
+                        'double': lambda r: r['id'] * 2},
+                    text='title')
+                .elements_from([('t1', 'v1')], '{urn:y}Tuple',
+                    attributes={'{urn:z}v': 1}, text=0)
+                .element('Last').up()
+            )
+        self.assertEqual(
+            ['Item', 'Item', 'Tuple', 'Last'],
+            [n.name for n in xmlb.dom_element.children])
+        item1, item2, tuple_elem, last = xmlb.dom_element.children
+        self.assertEqual(
+            {'double': '2', 'id': '1', 'x:kind': 'a'},
+            dict((k, v) for k, v in item1.attributes.items()
+                if not k.startswith('xmlns')))
+        self.assertEqual('urn:x', item1.attributes.namespace_uri('x:kind'))
+        self.assertEqual('One', item1.text)
+        # None values are omitted
+        self.assertEqual(['double', 'id'], sorted(item2.attributes.keys()))
+        self.assertEqual(None, item2.text)
+        # Namespaces given by literal URI
+        self.assertEqual('urn:y', tuple_elem.namespace_uri)
+        self.assertEqual('t1', tuple_elem.text)
+        self.assertEqual('v1', tuple_elem.attributes['{urn:z}v'])
+        # Same result as adding each element separately
+        bulk_xmlb = self.my_builder('DocRoot').elements_from(records, 'Item',
+            attributes={'id': 'id', 'kind': 'kind'}, text='title')
+        xmlb = self.my_builder('DocRoot')
+        for r in records:
+            xmlb = xmlb.element('Item').attributes(
+                [(n, r[n]) for n in ['id', 'kind'] if r[n] is not None])
+            if r['title'] is not None:
+                xmlb = xmlb.text(r['title'])
+            xmlb = xmlb.up()
+        self.assertEqual(xmlb.dom_element.xml(), bulk_xmlb.dom_element.xml())
+
     def test_xml(self):
         xmlb = (
             self.my_builder('DocRoot')
@@ -361,6 +406,22 @@ class BaseBuilderNodesTest(object):
         self.assertEqual(['urn:custom', 'urn:custom'],
             [n.namespace_uri for n in attrs2_elem.attribute_nodes])
 
+    def test_ns_prefix_declared_later(self):
+        # A prefix declared on an ancestor after a builder was created is in
+        # that builder's scope
+        xmlb = self.my_builder('DocRoot')
+        a_xmlb = xmlb.element('A')
+        b_xmlb = a_xmlb.element('B')
+        self.assertRaises(xml4h.exceptions.UnknownNamespaceException,
+            b_xmlb.element, 'p:Unknown')
+        a_xmlb.ns_prefix('p', 'urn:p')
+        c_elem = b_xmlb.element('p:C').dom_element
+        self.assertEqual('urn:p', c_elem.namespace_uri)
+        self.assertEqual('p:C', c_elem.name)
+        # The prefix is not in the scope of other builders
+        self.assertRaises(xml4h.exceptions.UnknownNamespaceException,
+            xmlb.element('D').element, 'p:Unknown')
+
     def test_element_creation_with_namespace(self):
         # Define namespaces on elements using prefixes
         xmlb = (
@@ -776,3 +837,90 @@ class TestcElementTreeBuilder(BaseBuilderNodesTest, unittest.TestCase):
     @property
     def adapter(self):
         return xml4h.cElementTreeAdapter
+
+
+class FastBuilderMixin(object):
+    """
+    Runs the builder tests with fast builders.
+    """
+
+    @property
+    def my_builder(self):
+        return functools.partial(xml4h.build, adapter=self.adapter, fast=True)
+
+    def test_fast_builder(self):
+        xmlb = self.my_builder('DocRoot', ns_uri='urn:default')
+        self.assertIsInstance(xmlb, xml4h.FastBuilder)
+        deep_xmlb = xmlb.ns_prefix('x', 'urn:x')
+        for i in range(50):
+            deep_xmlb = deep_xmlb.element('x:Deep').attributes(depth=i)
+        deep_xmlb = deep_xmlb.element('Deepest', ns_uri='urn:deepest')
+        deep_xmlb.element('x:Child').up().element('Child')
+        # Namespaces are resolved in the scope of each builder
+        deepest = deep_xmlb.dom_element
+        self.assertEqual('urn:deepest', deepest.namespace_uri)
+        self.assertEqual(
+            ['urn:x', 'urn:deepest'],
+            [n.namespace_uri for n in deepest.children])
+        self.assertEqual('x:Deep', deepest.parent.name)
+        self.assertEqual('urn:x', deepest.parent.namespace_uri)
+        self.assertEqual('49', deepest.parent.attributes['depth'])
+        self.assertEqual(deepest.root, deep_xmlb.up(51).dom_element)
+        self.assertEqual(
+            deepest.root, deep_xmlb.up(to_name='DocRoot').dom_element)
+        self.assertRaises(xml4h.exceptions.UnknownNamespaceException,
+            deep_xmlb.element, 'y:Unknown')
+        # Same result as building with a standard builder
+        xmlb = xml4h.build('DocRoot', adapter=self.adapter)
+        (xmlb.element('A', attributes={'xmlns:y': 'urn:y'})
+            .element('y:B').text('b').element('G').up(2)
+            .element('C', ns_uri='urn:c').element('D').text(1).up(2)
+            .element('{urn:e}E'))
+        fast_xmlb = self.my_builder('DocRoot')
+        (fast_xmlb.element('A', attributes={'xmlns:y': 'urn:y'})
+            .element('y:B').text('b').element('G').up(2)
+            .element('C', ns_uri='urn:c').element('D').text(1).up(2)
+            .element('{urn:e}E'))
+        self.assertEqual(
+            xmlb.dom_element.xml_doc(), fast_xmlb.dom_element.xml_doc())
+        # Fast building can start from an existing element
+        c_elem = fast_xmlb.dom_element.find_first('C')
+        fast_xmlb = xml4h.build(c_elem, fast=True).element('F')
+        self.assertEqual('urn:c', fast_xmlb.dom_element.namespace_uri)
+        self.assertEqual(c_elem, fast_xmlb.up().dom_element)
+        self.assertEqual('A', fast_xmlb.up(2).dom_element.name)
+
+    def test_fast_builder_same_as_standard(self):
+        # Unprefixed elements below a prefixed element are in the default
+        # namespace, as they are with a standard builder
+        def build(xmlb):
+            (xmlb.ns_prefix('p', 'urn:p').element('A').element('p:C')
+                .element('D', ns_uri='urn:d').element('E').up(2)
+                .element('F').up()
+                .element('p:G').element('H'))
+            return xmlb.dom_element
+        std_root = build(xml4h.build(
+            'Root', ns_uri='urn:root', adapter=self.adapter))
+        fast_root = build(self.my_builder('Root', ns_uri='urn:root'))
+        self.assertEqual(std_root.xml_doc(), fast_root.xml_doc())
+        self.assertEqual(
+            [(n.name, n.namespace_uri) for n in std_root.find()],
+            [(n.name, n.namespace_uri) for n in fast_root.find()])
+        self.assertEqual('urn:root', fast_root.find_first('F').namespace_uri)
+        self.assertEqual('urn:root', fast_root.find_first('H').namespace_uri)
+
+
+class TestXmlDomFastBuilder(FastBuilderMixin, TestXmlDomBuilder):
+    pass
+
+
+class TestLXMLEtreeFastBuilder(FastBuilderMixin, TestLXMLEtreeBuilder):
+    pass
+
+
+class TestElementTreeFastBuilder(FastBuilderMixin, TestElementTreeBuilder):
+    pass
+
+
+class TestcElementTreeFastBuilder(FastBuilderMixin, TestcElementTreeBuilder):
+    pass
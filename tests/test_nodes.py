@@ -62,6 +62,37 @@ class BaseTestNodes(object):
             self.elem3_second, self.doc, wrapped_root.adapter)
         self.assertEqual(wrapped_root.adapter, wrapped_node.adapter)
 
+    def test_wrappers_have_no_instance_dict(self):
+        elem1 = self.xml4h_root.children[0]
+        for obj in [self.xml4h_doc, elem1, self.xml4h_text,
+                elem1.attributes] + elem1.attribute_nodes:
+            self.assertFalse(hasattr(obj, '__dict__'))
+            self.assertRaises(AttributeError, setattr, obj, 'custom', 1)
+        # Child element lookup by attribute name still works
+        self.assertEqual(self.elem1,
+            self.xml4h_doc.DocRoot.children[0].impl_node)
+
+    def test_wrapped_nodes_cache(self):
+        # By default a new wrapper is returned for every lookup
+        self.assertFalse(self.xml4h_root.children[0]
+            is self.xml4h_root.children[0])
+        # When enabled the same wrapper is returned for the same node
+        adapter = self.xml4h_root.adapter
+        adapter.CACHE_WRAPPED_NODES = True
+        elem1 = self.xml4h_root.children[0]
+        self.assertTrue(elem1 is self.xml4h_root.children[0])
+        self.assertTrue(elem1 is self.xml4h_root.find_first(elem1.name))
+        self.assertTrue(elem1.parent is elem1.parent)
+        self.assertTrue(elem1.document is self.xml4h_root.document)
+        # Clearing caches forgets cached wrappers
+        adapter.clear_caches()
+        self.assertFalse(elem1 is self.xml4h_root.children[0])
+        # Deleting a node forgets its cached wrapper
+        elem2 = self.xml4h_root.children[1]
+        self.assertTrue(elem2 is self.xml4h_root.children[1])
+        elem2.delete(destroy=False)
+        self.assertFalse(elem2.impl_node in adapter._wrapped_nodes_cache)
+
     def test_parent(self):
         # Document node has no parent
         xml4h_doc = self.adapter_class.wrap_node(self.doc, self.doc)
@@ -206,6 +237,27 @@ class BaseTestNodes(object):
         self.assertEqual('urn:ns1',
             wrapped_elem.attributes.namespace_uri('ns1:b'))
 
+    def test_namespace_lookups_follow_declaration_changes(self):
+        adapter = self.xml4h_root.adapter
+        elem = self.xml4h_root.children[1]
+        self.xml4h_root.set_attributes({'xmlns:z': 'urn:z'})
+        # Repeated lookups give the same result
+        for i in range(2):
+            self.assertEqual('urn:z', adapter.lookup_ns_uri_by_attr_name(
+                elem.impl_node, 'xmlns:z'))
+            self.assertEqual('z', adapter.lookup_ns_prefix_for_uri(
+                elem.impl_node, 'urn:z'))
+        # Lookups reflect redeclared namespaces
+        self.xml4h_root.set_attributes({'xmlns:z': 'urn:z2'})
+        self.assertEqual('urn:z2', adapter.lookup_ns_uri_by_attr_name(
+            elem.impl_node, 'xmlns:z'))
+        self.assertEqual('z', adapter.lookup_ns_prefix_for_uri(
+            elem.impl_node, 'urn:z2'))
+        # Lookups reflect removed declarations
+        del(self.xml4h_root.attributes['xmlns:z'])
+        self.assertEqual(None, adapter.lookup_ns_uri_by_attr_name(
+            elem.impl_node, 'xmlns:z'))
+
     def test_name(self):
         wrapped_node = self.adapter_class.wrap_node(self.elem1, self.doc)
         self.assertEqual(u'元素1', wrapped_node.name)
@@ -300,6 +352,82 @@ class BaseTestNodes(object):
         self.assertTrue('a' in wrapped_elem.attributes)
         self.assertFalse('e' in wrapped_elem.attributes)
 
+    def test_set_many_attributes(self):
+        wrapped_elem = self.adapter_class.wrap_node(self.elem1, self.doc)
+        attrs = dict(('n%02d' % i, i) for i in range(30))
+        attrs.update({
+            'ns1:d': 'D',
+            '{urn:ns1}e': 'E',
+            })
+        if self.adapter_class != xml4h.LXMLAdapter:
+            # lxml cannot declare namespaces via attributes, see above
+            attrs.update({
+                'xmlns:ns3': 'urn:ns3',
+                'ns3:c': 'C',  # Uses namespace declared in the same call
+                })
+        wrapped_elem.set_attributes(attrs)
+        attrs_dict = wrapped_elem.attributes
+        self.assertEqual('29', attrs_dict['n29'])
+        self.assertEqual('D', attrs_dict['{urn:ns1}d'])
+        self.assertEqual('E', attrs_dict['ns1:e'])
+        if self.adapter_class != xml4h.LXMLAdapter:
+            self.assertEqual('urn:ns3', attrs_dict['xmlns:ns3'])
+            self.assertEqual('C', attrs_dict['{urn:ns3}c'])
+        # Namespace URI argument is applied to unprefixed names
+        wrapped_elem.set_attributes({'f': 'F', 'g': 7}, ns_uri='urn:ns1')
+        self.assertEqual('F', attrs_dict['ns1:f'])
+        self.assertEqual('7', attrs_dict['{urn:ns1}g'])
+
+    def test_attribute_lookup(self):
+        wrapped_elem = self.adapter_class.wrap_node(self.elem1, self.doc)
+        attrs_dict = wrapped_elem.attributes
+        self.assertEqual(3, len(attrs_dict))
+        # Attributes are found by plain, prefixed or Clark-notation names
+        for name in ['a', 'ns1:b', '{urn:ns1}b', 'xmlns:ns1']:
+            self.assertTrue(name in attrs_dict)
+        self.assertEqual('2', attrs_dict['ns1:b'])
+        self.assertEqual('2', attrs_dict['{urn:ns1}b'])
+        self.assertEqual('urn:ns1', attrs_dict['xmlns:ns1'])
+        self.assertFalse('b' in attrs_dict)
+        self.assertEqual(None, attrs_dict['b'])
+        self.assertEqual('urn:ns1', attrs_dict.namespace_uri('ns1:b'))
+        self.assertEqual('ns1', attrs_dict.prefix('ns1:b'))
+        self.assertEqual(None, attrs_dict.namespace_uri('b'))
+        # Single attribute nodes are looked up by name and namespace
+        attr_node = wrapped_elem.attribute_node('b', ns_uri='urn:ns1')
+        self.assertEqual(
+            ('ns1:b', '2'), (attr_node.name, attr_node.value))
+        self.assertEqual(
+            'urn:ns1', wrapped_elem.attribute_node('xmlns:ns1').value)
+        # Lookups reflect changes to the element
+        attrs_dict['c'] = 3
+        self.assertEqual(4, len(attrs_dict))
+        self.assertTrue('c' in attrs_dict)
+        del(attrs_dict['ns1:b'])
+        self.assertEqual(3, len(attrs_dict))
+        self.assertFalse('ns1:b' in attrs_dict)
+        self.assertEqual(None, attrs_dict['ns1:b'])
+
+    def test_xml_prefix_attribute_lookup(self):
+        # The xml prefix is bound to its namespace without being declared
+        doc = xml4h.parse('<a xml:lang="en" xml:space="preserve"/>',
+            adapter=self.adapter_class)
+        elem = doc.root
+        xml_ns_uri = 'http://www.w3.org/XML/1998/namespace'
+        attr_node = elem.attribute_node('xml:lang')
+        self.assertEqual(
+            ('xml:lang', 'en', xml_ns_uri),
+            (attr_node.name, attr_node.value, attr_node.namespace_uri))
+        self.assertEqual('en', elem.attributes['xml:lang'])
+        self.assertEqual(xml_ns_uri, elem.attributes.namespace_uri('xml:lang'))
+        self.assertTrue('xml:space' in elem.attributes)
+        self.assertEqual('preserve',
+            elem.attribute_node('space', ns_uri=xml_ns_uri).value)
+        self.assertEqual('preserve', elem.adapter.get_node_attribute_node(
+            elem.impl_node, 'xml:space').value)
+        self.assertEqual(
+            '<a xml:lang="en" xml:space="preserve"/>', elem.xml(indent=False))
+
     def test_element_text(self):
         # Get text on element
         wrapped_node = self.adapter_class.wrap_node(self.elem1, self.doc)
@@ -380,6 +508,11 @@ class BaseTestNodes(object):
         self.assertEqual('ns2:Element3', elems[0].name)
         self.assertEqual('Element3', elems[0].local_name)
         self.assertEqual('Element4', elems[0].parent.name)
+        # Partial names and namespace URIs do not match
+        self.assertEqual([], self.xml4h_root.find('Element'))
+        self.assertEqual([], self.xml4h_root.find('lement3'))
+        self.assertEqual([], self.xml4h_root.find(ns_uri='urn:ns'))
+        self.assertEqual([], self.xml4h_root.find('Element3', ns_uri='urn:'))
         # Chain finds
         self.xml4h_root.find('Element3')[0].find
         # Find first only
@@ -389,6 +522,36 @@ class BaseTestNodes(object):
         self.assertEqual(self.elem2,
                 self.xml4h_root.find_first('Element2').impl_node)
 
+    def test_iter_methods(self):
+        elem3 = self.xml4h_root.children[2]
+        elem2_second = elem3.children[0]
+        for gen, expected in [
+                (self.xml4h_root.iter_children(), self.xml4h_root.children),
+                (self.xml4h_root.iter_find(), self.xml4h_root.find()),
+                (self.xml4h_root.iter_find('Element3'),
+                    self.xml4h_root.find('Element3')),
+                (self.xml4h_root.iter_find(ns_uri='urn:ns1'),
+                    self.xml4h_root.find(ns_uri='urn:ns1')),
+                (elem2_second.iter_ancestors(), elem2_second.ancestors),
+                (elem3.iter_siblings_before(), elem3.siblings_before),
+                (elem3.iter_siblings_after(), elem3.siblings_after),
+                ]:
+            self.assertIsInstance(gen, types.GeneratorType)
+            self.assertEqual(expected, list(gen))
+        # Results are found and wrapped only as they are requested
+        gen = self.xml4h_root.iter_find('Element2')
+        self.assertEqual(self.elem2, next(gen).impl_node)
+        self.assertEqual(self.elem2_second, next(gen).impl_node)
+        self.assertRaises(StopIteration, next, gen)
+        # Filtered child lookups return the first match, or None
+        self.assertEqual(self.elem3,
+            self.xml4h_root.child('Element3').impl_node)
+        self.assertEqual(self.elem3,
+            self.xml4h_root.child(ns_uri='urn:ns1').impl_node)
+        self.assertEqual(None, self.xml4h_root.child('NoMatchingName'))
+        self.assertEqual(self.elem4, self.xml4h_root.child(
+            filter_fn=lambda n: n.name == 'Element4').impl_node)
+
     def test_has_feature(self):
         # Adapter and node has_feature tests must agree
         self.assertEqual(
@@ -411,6 +574,29 @@ class BaseTestNodes(object):
             self.assertRaises(xml4h.exceptions.FeatureUnavailableException,
                 self.xml4h_root.xpath, '/')
 
+    def test_compile_xpath(self):
+        if not self.adapter_class.has_feature('xpath'):
+            self.assertRaises(xml4h.exceptions.FeatureUnavailableException,
+                xml4h.compile_xpath, '.', adapter=self.adapter_class)
+            return
+        compiled_xpath = xml4h.compile_xpath(
+            './/x:Element3', namespaces={'x': 'urn:ns2'},
+            adapter=self.adapter_class)
+        # Compiled query gives same results as a query string, repeatedly
+        for i in range(2):
+            self.assertEqual(
+                self.xml4h_root.xpath('.//x:Element3',
+                    namespaces={'x': 'urn:ns2'}),
+                self.xml4h_root.xpath(compiled_xpath))
+        self.assertEqual([self.elem3_second],
+            [n.impl_node for n in self.xml4h_root.xpath(compiled_xpath)])
+        # Default namespace is available via '_' alias
+        compiled_xpath = xml4h.compile_xpath(
+            './/_:Element4', namespaces={None: 'urn:ns1'},
+            adapter=self.adapter_class)
+        self.assertEqual([self.elem4],
+            [n.impl_node for n in self.xml4h_root.xpath(compiled_xpath)])
+
     def test_xpath_limited_support_queries(self):
         """
         Basic XPath queries as supported by (c)ElementTree version 1.3+
@@ -685,6 +871,52 @@ class TestLXMLNodes(BaseTestNodes, unittest.TestCase):
         self.xml4h_root = self.xml4h_doc.root
         self.xml4h_text = xml4h.LXMLAdapter.wrap_node(self.text_node, self.doc)
 
+    def test_compiled_xpath_cache(self):
+        adapter = self.xml4h_root.adapter
+        orig_cache_size = adapter.XPATH_CACHE_SIZE
+        adapter._compiled_xpath_cache.clear()
+        try:
+            xml4h.LXMLAdapter.XPATH_CACHE_SIZE = 2
+            self.xml4h_root.xpath('*')
+            compiled_xpath = adapter._compiled_xpath_cache.values()[0]
+            # Same query with the same namespaces reuses compiled expression
+            self.xml4h_root.xpath('*')
+            self.assertEqual(
+                [compiled_xpath], adapter._compiled_xpath_cache.values())
+            # Same query with different namespaces is compiled separately
+            self.xml4h_root.xpath('*', namespaces={'x': 'urn:x'})
+            self.assertEqual(2, len(adapter._compiled_xpath_cache))
+            # Least recently used expression is discarded
+            self.xml4h_root.xpath('*')
+            self.xml4h_root.xpath('.')
+            self.assertEqual(2, len(adapter._compiled_xpath_cache))
+            self.assertTrue(
+                compiled_xpath in adapter._compiled_xpath_cache.values())
+        finally:
+            xml4h.LXMLAdapter.XPATH_CACHE_SIZE = orig_cache_size
+
+    def test_set_attribute_in_undeclared_namespace(self):
+        doc = xml4h.parse(
+            '<root xmlns="urn:r" xmlns:p="urn:p"><a p:y="2"/></root>',
+            adapter=self.adapter_class)
+        elem = doc.find_first('a')
+        # Reading attributes first caches the namespaces in scope, which
+        # change when lxml declares a prefix for the new attribute
+        self.assertEqual(['p:y'], [n.name for n in elem.attribute_nodes])
+        elem.set_attributes({'x': '1'}, ns_uri='urn:foo')
+        attr_node = elem.attribute_node('x', ns_uri='urn:foo')
+        self.assertEqual('urn:foo', attr_node.namespace_uri)
+        self.assertEqual('1', attr_node.value)
+        self.assertTrue(attr_node.name in elem.attributes)
+        self.assertEqual('urn:foo',
+            elem.attributes.namespace_uri(attr_node.name))
+        self.assertEqual(
+            '<a ns0:x="1" p:y="2" xmlns:ns0="urn:foo"/>',
+            elem.xml(indent=False))
+        # The attribute keeps its namespace when the document is reparsed
+        reparsed = xml4h.parse(doc.xml(), adapter=self.adapter_class)
+        self.assertEqual('1', reparsed.find_first('a').attributes['{urn:foo}x'])
+
 
 class TestElementTreeNodes(BaseTestNodes, unittest.TestCase):
 
@@ -761,6 +993,36 @@ class TestElementTreeNodes(BaseTestNodes, unittest.TestCase):
         self.assertFalse(self.elem3_second in
             xml4h_elem3_second.adapter.CACHED_ANCESTRY_DICT)
 
+    def test_ancestry_dict_maintained_by_mutations(self):
+        adapter = self.xml4h_doc.adapter
+        adapter.VERIFY_ANCESTRY_DICT = True
+        # Prime the ancestry dict once
+        self.assertEqual(self.elem4,
+            self.adapter_class.wrap_node(
+                self.elem3_second, self.doc, adapter).parent.impl_node)
+        cached_dict = adapter.CACHED_ANCESTRY_DICT
+        # Append, insert and nested additions
+        new_elem = self.xml4h_root.add_element('NewElem')
+        new_elem.add_element('NewChild').add_text('text')
+        self.xml4h_root.Element2.add_element(
+            'Inserted', before_this_element=True)
+        self.assertEqual('NewElem', new_elem.NewChild.parent.name)
+        self.assertEqual('DocRoot',
+            self.xml4h_root.find_first('Inserted').parent.name)
+        # Clone and transplant subtrees, including descendants
+        other_doc = xml4h.build('Other', adapter=self.adapter_class
+            ).element('Sub1').element('Sub2').up().up().document
+        new_elem.clone_node(other_doc.root.Sub1)
+        self.assertEqual('Sub1', new_elem.Sub1.Sub2.parent.name)
+        new_elem.transplant_node(self.xml4h_root.child('Element2'))
+        self.assertEqual('NewElem', new_elem.Element2.parent.name)
+        # Remove nodes with and without destroying them
+        removed = new_elem.Sub1.delete(destroy=False)
+        self.assertEqual(None, removed.parent)
+        new_elem.NewChild.delete()
+        # The dict was never rebuilt wholesale
+        self.assertTrue(cached_dict is adapter.CACHED_ANCESTRY_DICT)
+
 
 # Note this class extends TestElementTreeNodes class, which performs tests
 # against ElementTree/cElementTree implementations depending on name of class.
@@ -5,10 +5,29 @@ except ImportError:
     import unittest
 import os
 import re
+import sys
+import threading
+import subprocess
+from StringIO import StringIO
 
 import xml4h
 
 
+def film_years(doc):
+    # Used by parse_many tests, in worker processes
+    return [film['year'] for film in doc.find('Film')]
+
+
+def root_name(doc):
+    return doc.root.name
+
+
+def fail_for_root_b(doc):
+    if doc.root.name == 'b':
+        raise ValueError('Failed for %s' % doc.root.name)
+    return doc.root.name
+
+
 class TestParserBasics(unittest.TestCase):
 
     @property
@@ -25,6 +44,49 @@ class TestParserBasics(unittest.TestCase):
         self.assertEqual(8, len(dom.find()))
         self.assertEqual(xml4h.best_adapter, dom.adapter_class)
 
+    def test_xml_libraries_imported_on_first_use(self):
+        # Import xml4h in a new interpreter, since the XML libraries are
+        # already imported by other tests in this one
+        package_dir = os.path.join(os.path.dirname(__file__), '..')
+        script = (
+            'import sys, xml4h\n'
+            'libraries = ["lxml.etree", "xml.etree.cElementTree",'
+            ' "xml.etree.ElementTree", "xml.dom.minidom"]\n'
+            'print [l for l in libraries if l in sys.modules]\n'
+            'adapter = xml4h.XmlDomImplAdapter\n'
+            'print [l for l in libraries if l in sys.modules]\n'
+            'print xml4h.best_adapter.__name__\n')
+        output = subprocess.check_output([sys.executable, '-c', script],
+            cwd=package_dir)
+        self.assertEqual(
+            ['[]', "['xml.dom.minidom']", xml4h.best_adapter.__name__],
+            output.splitlines())
+        self.assertEqual(
+            [a for a in xml4h._ADAPTERS_AVAILABLE
+                if a in xml4h._ADAPTERS_UNAVAILABLE], [])
+        self.assertEqual(xml4h.best_adapter, xml4h._ADAPTERS_AVAILABLE[0])
+
+    def test_parser_config(self):
+        config = xml4h.ParserConfig(recover=True, remove_comments=True)
+        self.assertEqual(['recover', 'remove_comments'],
+            config.changed_options)
+        self.assertEqual([], xml4h.ParserConfig().changed_options)
+        # Configurations with the same options are interchangeable
+        self.assertEqual(
+            xml4h.ParserConfig(remove_comments=True, recover=True), config)
+        self.assertEqual(1, len(set([config,
+            xml4h.ParserConfig(remove_comments=True, recover=True)])))
+
+    def test_buffer_reader(self):
+        reader = xml4h.BufferReader(memoryview(b'<a>text</a>'))
+        self.assertEqual('<a>', reader.read(3))
+        self.assertEqual('text', reader.read(4))
+        self.assertEqual('</a>', reader.read())
+        self.assertEqual('', reader.read(10))
+        reader = xml4h.BufferReader(bytearray(b'<a/>'))
+        self.assertEqual('<a/>', reader.read(100))
+        self.assertEqual('', reader.read(100))
+
 
 class BaseParserTest(object):
     """
@@ -41,6 +103,11 @@ class BaseParserTest(object):
         return os.path.join(
             os.path.dirname(__file__), 'data/example_doc.unicode.xml')
 
+    @property
+    def films_xml_file_path(self):
+        return os.path.join(
+            os.path.dirname(__file__), 'data/monty_python_films.xml')
+
     def parse(self, xml_str):
         return xml4h.parse(xml_str, adapter=self.adapter)
 
@@ -105,6 +172,173 @@ class BaseParserTest(object):
                 '<NSCustomWithPrefixExplicit xmlns="urn:custom"/>', orig_xml)
         self.assertEqual(orig_xml[:200], roundtrip_xml[:200])
 
+    def test_strip_whitespace_text_nodes(self):
+        xml = (
+            '<Root>\n  <A>  </A>\n  <B>text <C/> \n<D/></B>\n'
+            '  <E>\n    <F/>\n  </E>\n</Root>\n')
+        doc = self.parse(xml)
+        self.assertEqual(['A', 'B', 'E'],
+            [n.name for n in doc.root.children])
+        self.assertEqual([], doc.Root.A.children)
+        self.assertEqual(['#text', 'C', 'D'],
+            [n.name for n in doc.Root.B.children])
+        self.assertEqual('text ', doc.Root.B.text)
+        self.assertEqual(['F'], [n.name for n in doc.Root.E.children])
+        # Sibling relationships are consistent after stripping
+        self.assertEqual(['A'], [n.name for n in doc.Root.B.siblings_before])
+        self.assertEqual(['E'], [n.name for n in doc.Root.B.siblings_after])
+        # Whitespace is retained on request
+        doc = xml4h.parse(xml, ignore_whitespace_text_nodes=False,
+            adapter=self.adapter)
+        self.assertEqual(['  '], [n.value for n in doc.Root.A.children])
+        # Whitespace is stripped from elements generated by iterparse
+        if self.adapter.has_feature('iterparse'):
+            self.assertEqual([['#text', 'C', 'D']],
+                [[n.name for n in e.children] for e in xml4h.iterparse(
+                    StringIO(xml), tag='B', adapter=self.adapter)])
+
+    def test_parse_buffers(self):
+        xml_data = open(self.small_xml_file_path, 'rb').read()
+        for xml_buffer in (bytearray(xml_data), memoryview(xml_data),
+                buffer(xml_data)):
+            doc = self.parse(xml_buffer)
+            self.assertEqual(8, len(doc.find()))
+        doc = xml4h.parse_mmap(self.small_xml_file_path, adapter=self.adapter)
+        self.assertEqual(8, len(doc.find()))
+        self.assertEqual(self.parse(xml_data).xml(), doc.xml())
+        if self.adapter.has_feature('iterparse'):
+            self.assertEqual(['NSCustomExplicit', 'NSCustomWithPrefixImplicit',
+                'NSCustomWithPrefixExplicit'],
+                [e.local_name for e in xml4h.iterparse(bytearray(xml_data),
+                    ns_uri='urn:custom', adapter=self.adapter)])
+
+    def test_feed_parser(self):
+        xml_data = open(self.films_xml_file_path, 'rb').read()
+        for ignore_whitespace_text_nodes in (True, False):
+            expected_xml = xml4h.parse(xml_data,
+                ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+                adapter=self.adapter).xml()
+            for chunk_size in (1, 100, len(xml_data)):
+                parser = xml4h.feed_parser(
+                    ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+                    adapter=self.adapter)
+                for i in range(0, len(xml_data), chunk_size):
+                    parser.feed(xml_data[i:i + chunk_size])
+                doc = parser.close()
+                self.assertEqual(expected_xml, doc.xml())
+        self.assertEqual(7, len(doc.find('Film')))
+        self.assertRaises(ValueError, parser.feed, '<a/>')
+        self.assertRaises(ValueError, parser.close)
+        # Namespace definitions are retained
+        parser = xml4h.feed_parser(adapter=self.adapter)
+        parser.feed(open(self.small_xml_file_path, 'rb').read())
+        doc = parser.close()
+        self.assertEqual('urn:custom',
+            doc.find_first('Attrs2').attributes.namespace_uri(
+                'myns:custom-ns-prefix-explicit'))
+        self.assertEqual(self.parse(self.small_xml_file_path).xml(),
+            doc.xml())
+        # Parse errors are raised as soon as the underlying parser finds them
+        def parse_invalid_xml():
+            parser = xml4h.feed_parser(adapter=self.adapter)
+            parser.feed('<a><b></a>')
+            parser.close()
+        self.assertRaises(Exception, parse_invalid_xml)
+
+    def test_parse_many(self):
+        years = ['1971', '1974', '1979', '1982', '1983', '2009', '2012']
+        sources = [self.films_xml_file_path, open(
+            self.films_xml_file_path).read()] * 3
+        self.assertEqual([years] * 6, list(xml4h.parse_many(sources,
+            film_years, workers=2, adapter=self.adapter)))
+        # Results are generated in order, or as completed
+        sources = ['<%s/>' % n for n in 'abcdefghij']
+        self.assertEqual(list('abcdefghij'), list(xml4h.parse_many(
+            sources, root_name, workers=3, chunk_size=3,
+            adapter=self.adapter)))
+        self.assertEqual(list('abcdefghij'), sorted(xml4h.parse_many(
+            sources, root_name, workers=3, ordered=False,
+            adapter=self.adapter)))
+        # Sources are read only a little ahead of the results consumed
+        sources_read = []
+        def generate_sources():
+            for name in 'abcdefghij':
+                sources_read.append(name)
+                yield '<%s/>' % name
+        results = xml4h.parse_many(generate_sources(), root_name, workers=2,
+            adapter=self.adapter)
+        self.assertEqual('a', results.next())
+        self.assertEqual(['a', 'b', 'c', 'd'], sources_read)
+        results.close()
+        # Errors in worker processes are raised
+        self.assertRaises(ValueError, list, xml4h.parse_many(
+            sources, fail_for_root_b, workers=2, adapter=self.adapter))
+
+    def test_parse_with_parser_config(self):
+        xml = '<a><!-- comment --><?pi data?><b>text</b></a>'
+        config = xml4h.ParserConfig(
+            huge_tree=True, remove_comments=True, remove_pis=True)
+        if 'remove_comments' not in self.adapter.SUPPORTED_PARSER_OPTIONS:
+            self.assertRaises(xml4h.exceptions.FeatureUnavailableException,
+                xml4h.parse, xml, adapter=self.adapter, parser_config=config)
+        else:
+            doc = xml4h.parse(xml, adapter=self.adapter, parser_config=config)
+            self.assertEqual(['b'], [n.name for n in doc.root.children])
+            if self.adapter.has_feature('iterparse'):
+                self.assertEqual(['a'], [e.name for e in xml4h.iterparse(
+                    StringIO(xml), tag='a', adapter=self.adapter,
+                    parser_config=config)])
+        # Recover from broken XML, if possible
+        config = xml4h.ParserConfig(recover=True)
+        if 'recover' not in self.adapter.SUPPORTED_PARSER_OPTIONS:
+            self.assertRaises(xml4h.exceptions.FeatureUnavailableException,
+                xml4h.parse, '<a><b></a>', adapter=self.adapter,
+                parser_config=config)
+        else:
+            doc = xml4h.parse(
+                '<a><b></a>', adapter=self.adapter, parser_config=config)
+            self.assertEqual(['b'], [n.name for n in doc.root.children])
+        # Options with default values are accepted by every adapter
+        doc = xml4h.parse(xml, adapter=self.adapter,
+            parser_config=xml4h.ParserConfig())
+        self.assertEqual(['a', 'b'], [n.name for n in doc.find()])
+
+    def test_iterparse(self):
+        if not self.adapter.has_feature('iterparse'):
+            self.assertRaises(xml4h.exceptions.FeatureUnavailableException,
+                xml4h.iterparse, self.films_xml_file_path,
+                adapter=self.adapter)
+            return
+        years = []
+        previous_films = []
+        for film in xml4h.iterparse(
+                self.films_xml_file_path, tag='Film', adapter=self.adapter):
+            self.assertIsInstance(film, xml4h.nodes.Element)
+            self.assertEqual(self.adapter, film.adapter_class)
+            # Whitespace is stripped, descendants are available
+            self.assertEqual(['Title', 'Description'],
+                [c.name for c in film.children])
+            years.append(film['year'])
+            # Earlier elements have been released, bar the emptied previous
+            # element which is retained on the path to the current one
+            earlier_elems = [n for n in film.siblings_before if n.is_element]
+            self.assertTrue(len(earlier_elems) <= 1)
+            self.assertEqual([], sum([e.children for e in earlier_elems], []))
+            previous_films.append(film)
+        self.assertEqual(
+            ['1971', '1974', '1979', '1982', '1983', '2009', '2012'], years)
+        self.assertEqual([], previous_films[0].children)
+        # Filter by namespace
+        self.assertEqual(
+            ['NSCustomExplicit', 'NSCustomWithPrefixImplicit',
+             'NSCustomWithPrefixExplicit'],
+            [e.local_name for e in xml4h.iterparse(self.small_xml_file_path,
+                ns_uri='urn:custom', adapter=self.adapter)])
+        # Filter by name and namespace, with the root element ended last
+        self.assertEqual(['DocRoot'],
+            [e.local_name for e in xml4h.iterparse(self.small_xml_file_path,
+                tag='DocRoot', ns_uri='urn:default', adapter=self.adapter)])
+
     def test_unicode(self):
         # NOTE lxml doesn't support unicode namespace URIs?
         doc = self.parse(self.unicode_xml_file_path)
@@ -133,6 +367,27 @@ class TestLXMLEtreeParser(unittest.TestCase, BaseParserTest):
             self.skipTest("lxml library is not installed")
         return xml4h.LXMLAdapter
 
+    def test_parsers_reused_by_thread(self):
+        parser = self.adapter._get_parser(True, None)
+        self.assertIs(parser, self.adapter._get_parser(True, None))
+        self.assertIs(parser, self.adapter._get_parser(
+            True, xml4h.ParserConfig()))
+        self.assertIsNot(parser, self.adapter._get_parser(False, None))
+        self.assertIsNot(parser, self.adapter._get_parser(
+            True, xml4h.ParserConfig(huge_tree=True)))
+        # Other threads get their own parsers
+        other_thread_parsers = []
+        thread = threading.Thread(target=lambda: other_thread_parsers.append(
+            self.adapter._get_parser(True, None)))
+        thread.start()
+        thread.join()
+        self.assertIsNot(parser, other_thread_parsers[0])
+        # Documents parsed with a reused parser are independent
+        doc1 = self.parse('<a><b/></a>')
+        doc2 = self.parse('<c/>')
+        self.assertEqual(['b'], [n.name for n in doc1.root.children])
+        self.assertEqual('c', doc2.root.name)
+
 
 class TestElementTreeEtreeParser(unittest.TestCase, BaseParserTest):
 
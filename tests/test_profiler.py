@@ -0,0 +1,95 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+import os
+
+import xml4h
+
+
+class BaseProfilerTest(object):
+    """
+    Tests of adapter call profiling across all xml4h implementations.
+    """
+
+    def setUp(self):
+        self.doc = xml4h.parse(os.path.join(os.path.dirname(__file__),
+            'data/monty_python_films.xml'), adapter=self.adapter)
+
+    def test_profile_counts_adapter_calls(self):
+        with xml4h.profile() as stats:
+            films = self.doc.find('Film')
+            [f.name for f in films]
+        self.assertEqual(1, stats.calls['find_node_elements'])
+        self.assertEqual(7, stats.calls['get_node_name'])
+        self.assertTrue(stats.seconds['find_node_elements'] > 0)
+        self.assertEqual(sum(stats.calls.values()), stats.total_calls)
+        self.assertEqual(
+            {'calls': 7, 'seconds': stats.seconds['get_node_name']},
+            stats.as_dict()['get_node_name'])
+        self.assertTrue(stats.report().splitlines()[0].startswith('Method'))
+        self.assertEqual(3, len(stats.report(limit=2).splitlines()))
+        # Calls made after the profile has stopped are not counted
+        self.doc.find('Film')
+        self.assertEqual(1, stats.calls['find_node_elements'])
+
+    def test_profile_by_document(self):
+        other_doc = xml4h.parse('<a><b/></a>', adapter=self.adapter)
+        with xml4h.profile(self.doc) as doc_stats:
+            with xml4h.profile() as all_stats:
+                self.doc.find('Film')
+                other_doc.find('b')
+        self.assertEqual(1, doc_stats.calls['find_node_elements'])
+        self.assertEqual(2, all_stats.calls['find_node_elements'])
+
+    def test_profile_records_failed_calls(self):
+        with xml4h.profile() as stats:
+            self.assertRaises(Exception,
+                self.doc.adapter.get_node_name, None)
+        self.assertEqual(1, stats.calls['get_node_name'])
+
+    def test_adapters_restored_after_profile(self):
+        original_attrs = dict(self.adapter.__dict__)
+        profile = xml4h.profile()
+        profile.start()
+        self.assertNotEqual(original_attrs, dict(self.adapter.__dict__))
+        self.assertRaises(ValueError, profile.start)
+        profile.stop()
+        self.assertEqual(original_attrs, dict(self.adapter.__dict__))
+        self.assertRaises(ValueError, profile.stop)
+
+
+class TestXmlDomProfiler(BaseProfilerTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        return xml4h.XmlDomImplAdapter
+
+
+class TestLXMLEtreeProfiler(BaseProfilerTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.LXMLAdapter.is_available():
+            self.skipTest("lxml library is not installed")
+        return xml4h.LXMLAdapter
+
+
+class TestElementTreeEtreeProfiler(BaseProfilerTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.ElementTreeAdapter.is_available():
+            self.skipTest(
+                "ElementTree library is not installed or is outdated")
+        return xml4h.ElementTreeAdapter
+
+
+class TestcElementTreeEtreeProfiler(BaseProfilerTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        if not xml4h.cElementTreeAdapter.is_available():
+            self.skipTest(
+                "cElementTree library is not installed or is outdated")
+        return xml4h.cElementTreeAdapter
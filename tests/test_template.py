@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+import functools
+
+import xml4h
+from xml4h.template import TemplateSlot
+
+
+class BaseTemplateTest(object):
+
+    def setUp(self):
+        if not self.adapter.is_available():
+            self.skipTest('Library for adapter %s is not available'
+            % self.adapter)
+        self.skeleton_builder = (
+            self.my_builder('Message', ns_uri='urn:msg')
+                .ns_prefix('h', 'urn:h')
+                .element('h:Header')
+                    .attributes({'id': '${id}', 'h:sent': '${sent}'}).up()
+                .element('Body')
+                    .element('To').text('${to}').up()
+                    .element('Amount', attributes={'currency': 'EUR'})
+                        .text('${amount} (${amount})'))
+
+    @property
+    def my_builder(self):
+        return functools.partial(xml4h.build, adapter=self.adapter)
+
+    def test_slots(self):
+        template = xml4h.Template(self.skeleton_builder)
+        self.assertEqual(self.adapter, template.adapter)
+        self.assertEqual(
+            [TemplateSlot('sent', 'attribute'),
+                TemplateSlot('id', 'attribute'),
+                TemplateSlot('to', 'text'),
+                TemplateSlot('amount', 'text'),
+                TemplateSlot('amount', 'text')],
+            template.slots)
+        self.assertEqual(['sent', 'id', 'to', 'amount'], template.slot_names)
+
+    def test_render(self):
+        template = xml4h.Template(self.skeleton_builder)
+        xml = template.render(
+            {'id': 7, 'sent': None, 'to': u'Ann & Bob <"ß">'}, amount=1.5)
+        self.assertEqual(
+            u'<?xml version="1.0" encoding="utf-8"?>'
+            u'<Message xmlns="urn:msg" xmlns:h="urn:h">'
+            u'<h:Header h:sent="" id="7"/>'
+            u'<Body>'
+            u'<To>Ann &amp; Bob &lt;&quot;ß&quot;&gt;</To>'
+            u'<Amount currency="EUR">1.5 (1.5)</Amount>'
+            u'</Body>'
+            u'</Message>'.encode('utf-8'),
+            xml)
+        # The skeleton is unchanged
+        self.assertEqual(
+            '${to}', self.skeleton_builder.document.find_first('To').text)
+        # Rendering requires a value for every slot
+        self.assertRaises(KeyError, template.render, id=1, sent=2, to=3)
+
+    def test_render_same_as_write(self):
+        # Formatting and encoding options apply to the rendered XML
+        template = xml4h.Template(self.skeleton_builder,
+            encoding='latin-1', indent=2, omit_declaration=True)
+        values = {'id': 1, 'sent': 'today', 'to': u'Zoë', 'amount': 2}
+        doc_builder = (
+            self.my_builder('Message', ns_uri='urn:msg')
+                .ns_prefix('h', 'urn:h')
+                .element('h:Header')
+                    .attributes({'id': 1, 'h:sent': 'today'}).up()
+                .element('Body')
+                    .element('To').text(u'Zoë').up()
+                    .element('Amount', attributes={'currency': 'EUR'})
+                        .text('2 (2)'))
+        self.assertEqual(
+            doc_builder.document.xml_doc(encoding='latin-1', indent=2,
+                omit_declaration=True),
+            template.render(values))
+        template = xml4h.Template(self.skeleton_builder, encoding=None)
+        self.assertEqual(
+            doc_builder.document.xml_doc(encoding=None, indent=False),
+            template.render(values))
+
+    def test_render_document(self):
+        template = xml4h.Template(self.skeleton_builder)
+        doc = template.render_document(
+            id=3, sent='now', to='Carol', amount=4)
+        self.assertIsInstance(doc, xml4h.nodes.Document)
+        self.assertEqual(self.adapter, doc.adapter_class)
+        self.assertEqual('Carol', doc.find_first('To').text)
+        self.assertEqual('3', doc.find_first('Header').attributes['id'])
+        self.assertEqual('urn:h', doc.find_first('Header').namespace_uri)
+
+    def test_parsed_skeleton(self):
+        template = xml4h.Template(
+            '<Doc a="${a}"><Text>$a ${text}$</Text></Doc>',
+            adapter=self.adapter)
+        self.assertEqual(
+            [TemplateSlot('a', 'attribute'), TemplateSlot('text', 'text')],
+            template.slots)
+        self.assertEqual(
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<Doc a="&amp;"><Text>$a &gt;$</Text></Doc>',
+            template.render(a='&', text='>'))
+
+    def test_placeholders_in_other_markup(self):
+        # Placeholders are left in comments and instructions
+        skeleton_builder = (
+            self.my_builder('Doc')
+                .comment(' ${comment} ')
+                .instruction('pi', '${pi}')
+                .element('Text').text('${text}'))
+        template = xml4h.Template(skeleton_builder, omit_declaration=True)
+        self.assertEqual([TemplateSlot('text', 'text')], template.slots)
+        self.assertEqual(
+            '<Doc><!-- ${comment} --><?pi ${pi}?>'
+            '<Text>&lt;b&gt;</Text></Doc>',
+            template.render(text='<b>'))
+
+
+class TestXmlDomTemplate(BaseTemplateTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        return xml4h.XmlDomImplAdapter
+
+
+class TestLXMLEtreeTemplate(BaseTemplateTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        return xml4h.LXMLAdapter
+
+
+class TestElementTreeTemplate(BaseTemplateTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        return xml4h.ElementTreeAdapter
+
+
+class TestcElementTreeTemplate(BaseTemplateTest, unittest.TestCase):
+
+    @property
+    def adapter(self):
+        return xml4h.cElementTreeAdapter
@@ -0,0 +1,153 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+import os
+import threading
+
+import xml4h
+
+
+class BaseThreadTest(object):
+    """
+    Tests that many threads can read the same document concurrently across
+    all xml4h implementations.
+    """
+    THREAD_COUNT = 8
+    REPEAT_COUNT = 20
+
+    @property
+    def films_xml_file_path(self):
+        return os.path.join(
+            os.path.dirname(__file__), 'data/monty_python_films.xml')
+
+    @property
+    def small_xml_file_path(self):
+        return os.path.join(
+            os.path.dirname(__file__), 'data/example_doc.small.xml')
+
+    def parent_name(self, node):
+        parent = node.parent
+        return parent.name if parent.is_element else None
+
+    def read_document(self, doc):
+        """
+        Perform a range of read-only operations on a document.
+
+        :return: a summary of the results, to compare across threads.
+        """
+        results = []
+        for element in doc.find():
+            results.append((
+                element.name, element.namespace_uri,
+                self.parent_name(element),
+                sorted(element.attributes.items()),
+                element.text,
+                [n.name for n in element.children],
+                ))
+        if doc.has_feature('xpath'):
+            results.append(len(doc.root.xpath('.//*')))
+        results.append(doc.xml())
+        return results
+
+    def run_in_threads(self, func):
+        """
+        Call a function from many threads at once, and repeatedly in each.
+
+        :return: the list of results from every call.
+        """
+        results = []
+        errors = []
+        start_event = threading.Event()
+
+        def run():
+            start_event.wait()
+            try:
+                for i in range(self.REPEAT_COUNT):
+                    results.append(func())
+            except Exception, e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run)
+            for i in range(self.THREAD_COUNT)]
+        for thread in threads:
+            thread.start()
+        start_event.set()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        self.assertEqual(self.THREAD_COUNT * self.REPEAT_COUNT, len(results))
+        return results
+
+    def test_concurrent_reads(self):
+        for path in (self.films_xml_file_path, self.small_xml_file_path):
+            expected = self.read_document(
+                xml4h.parse(path, adapter=self.adapter))
+            doc = xml4h.parse(path, adapter=self.adapter)
+            results = self.run_in_threads(lambda: self.read_document(doc))
+            for result in results:
+                self.assertEqual(expected, result)
+
+    def test_concurrent_reads_of_fresh_document(self):
+        # Caches are populated by whichever threads get there first
+        read = lambda doc: [self.parent_name(e) for e in doc.find()]
+        expected = read(
+            xml4h.parse(self.small_xml_file_path, adapter=self.adapter))
+        for i in range(self.REPEAT_COUNT):
+            doc = xml4h.parse(self.small_xml_file_path, adapter=self.adapter)
+            results = self.run_in_threads(lambda: read(doc))
+            for result in results:
+                self.assertEqual(expected, result)
+
+    def test_concurrent_namespace_prefixes_are_unique(self):
+        doc = xml4h.build('Root', adapter=self.adapter).dom_element.document
+        prefixes = self.run_in_threads(
+            lambda: doc.adapter.get_ns_prefix_for_uri(
+                doc.root.impl_node, 'urn:unknown', auto_generate_prefix=True))
+        self.assertEqual(len(prefixes), len(set(prefixes)))
+
+    def test_concurrent_wrapped_nodes_are_cached_once(self):
+        if not self.adapter.CACHE_WRAPPED_NODES:
+            return
+        doc = xml4h.parse(self.films_xml_file_path, adapter=self.adapter)
+        results = self.run_in_threads(lambda: doc.find('Film'))
+        for result in results:
+            for expected_node, node in zip(results[0], result):
+                self.assertIs(expected_node, node)
+
+
+class TestXmlDomThreads(unittest.TestCase, BaseThreadTest):
+
+    @property
+    def adapter(self):
+        return xml4h.XmlDomImplAdapter
+
+
+class TestLXMLEtreeThreads(unittest.TestCase, BaseThreadTest):
+
+    @property
+    def adapter(self):
+        if not xml4h.LXMLAdapter.is_available():
+            self.skipTest("lxml library is not installed")
+        return xml4h.LXMLAdapter
+
+
+class TestElementTreeEtreeThreads(unittest.TestCase, BaseThreadTest):
+
+    @property
+    def adapter(self):
+        if not xml4h.ElementTreeAdapter.is_available():
+            self.skipTest(
+                "ElementTree library is not installed or is outdated")
+        return xml4h.ElementTreeAdapter
+
+
+class TestcElementTreeEtreeThreads(unittest.TestCase, BaseThreadTest):
+
+    @property
+    def adapter(self):
+        if not xml4h.cElementTreeAdapter.is_available():
+            self.skipTest(
+                "cElementTree library is not installed or is outdated")
+        return xml4h.cElementTreeAdapter
@@ -134,6 +134,111 @@ class BaseWriterTest(object):
             u'</DocRoot>\t'.encode('utf-8'),
             self.iostr.getvalue())
 
+    def test_escape_special_characters(self):
+        self.builder = (
+            self.my_builder('DocRoot')
+                .element('Elem1').attributes(a=u'"1" & <2>')
+                    .text(u'<默认> & "جذ"'))
+        self.builder.dom_element.write_doc(self.iostr, encoding=None)
+        self.assertEqual(
+            u'<?xml version="1.0"?>'
+            u'<DocRoot>'
+            u'<Elem1 a="&quot;1&quot; &amp; &lt;2&gt;">'
+            u'&lt;默认&gt; &amp; &quot;جذ&quot;</Elem1>'
+            u'</DocRoot>',
+            self.iostr.getvalue())
+
+    def test_write_large_document_in_chunks(self):
+        # Build a document with more text fragments than the write buffer
+        self.builder = self.my_builder('DocRoot')
+        for i in range(xml4h.writer.WRITE_BUFFER_SIZE / 4):
+            self.builder.element('Elem').text(u'默认%d' % i).up()
+        expected_xml = (
+            u'<?xml version="1.0" encoding="utf-16"?><DocRoot>'
+            + u''.join([u'<Elem>默认%d</Elem>' % i
+                for i in range(xml4h.writer.WRITE_BUFFER_SIZE / 4)])
+            + u'</DocRoot>')
+        # Output is sent to writer in more than one chunk...
+        writes = []
+        class RecordingWriter(object):
+            def write(self, data):
+                writes.append(data)
+        self.builder.write_doc(RecordingWriter(), encoding='utf-16')
+        self.assertTrue(len(writes) > 1)
+        # ...but is encoded as a single text, with a single byte order mark
+        self.assertEqual(expected_xml.encode('utf-16'), ''.join(writes))
+
+    def test_iter_write(self):
+        doc = self.builder.dom_element.document
+        self.assertEqual(doc.xml(), ''.join(doc.iter_write(indent=4)))
+        self.assertEqual(doc.xml(encoding=None),
+            u''.join(doc.iter_write(indent=4, encoding=None)))
+        # Large documents are generated in more than one chunk
+        self.builder = self.my_builder('DocRoot')
+        for i in range(xml4h.writer.WRITE_BUFFER_SIZE / 4):
+            self.builder.element('Elem').text(u'默认%d' % i).up()
+        doc = self.builder.dom_element.document
+        chunks = list(doc.iter_write(encoding='utf-16'))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(doc.xml(indent=0, encoding='utf-16'), ''.join(chunks))
+        # Deeply nested elements are written without recursion
+        self.builder = self.my_builder('DocRoot')
+        for i in range(sys.getrecursionlimit() + 100):
+            self.builder = self.builder.element('Elem')
+        doc = self.builder.dom_element.document
+        self.assertEqual(
+            '<DocRoot>' + '<Elem>' * (sys.getrecursionlimit() + 99)
+                + '<Elem/>' + '</Elem>' * (sys.getrecursionlimit() + 99)
+                + '</DocRoot>',
+            ''.join(doc.iter_write(omit_declaration=True, quote_char="'")))
+
+    def test_native_serialization_is_identical(self):
+        # Documents the lxml library can serialize natively
+        native_xml_docs = [
+            '<a/>',
+            '<a b="1" c="x&amp;y&lt;&gt;&quot;">'
+                '<b>text &amp; &lt;&gt;</b><c></c></a>',
+            '<a xmlns="urn:d" xmlns:p="urn:p"><p:b p:z="3">t</p:b>'
+                '<c xmlns="urn:e"/></a>',
+            u'<a><!-- comment --><?pi data?><b>默认جذ</b></a>',
+            '<a xmlns="urn:d"><b xmlns="urn:d"/></a>',
+            ]
+        # Documents the writer serializes differently to lxml
+        writer_only_xml_docs = [
+            '<a>t<b/>tail</a>',
+            '<a b="x&#10;y"/>',
+            '<a>"quoted"</a>',
+            '<a z="1" b="2"/>',
+            '<a><b z="1" y="2"/></a>',
+            '<a xmlns="urn:d" x="1"/>',
+            '<a xmlns:q="urn:q" xmlns:p="urn:p"/>',
+            '<a xmlns:p="urn:p" xmlns:q="urn:p" p:x="1"/>',
+            ]
+        write_options = [
+            {},
+            {'encoding': None},
+            {'encoding': 'utf-16'},
+            {'omit_declaration': True},
+            {'indent': 2},
+            {'quote_char': "'"},
+            ]
+        for xml in native_xml_docs + writer_only_xml_docs:
+            doc = xml4h.parse(xml.encode('utf-8'), adapter=self.adapter)
+            if self.adapter == xml4h.LXMLAdapter:
+                self.assertEqual(xml in native_xml_docs,
+                    doc.adapter.serialize_node(doc.root.impl_node)
+                        is not None)
+            for options in write_options:
+                for node in (doc, doc.root):
+                    doc.adapter.NATIVE_SERIALIZATION = True
+                    native_output = StringIO()
+                    node.write(native_output, **options)
+                    doc.adapter.NATIVE_SERIALIZATION = False
+                    writer_output = StringIO()
+                    node.write(writer_output, **options)
+                    self.assertEqual(
+                        writer_output.getvalue(), native_output.getvalue())
+
 
 class TestXmlDomBuilder(BaseWriterTest, unittest.TestCase):
     """
@@ -145,6 +250,17 @@ class TestXmlDomBuilder(BaseWriterTest, unittest.TestCase):
     def adapter(self):
         return xml4h.XmlDomImplAdapter
 
+    def test_write_namespace_undeclaration(self):
+        # minidom gives the xmlns attribute of an undeclaration a None value
+        doc = xml4h.parse('<a xmlns="urn:a"><b xmlns=""/></a>',
+            adapter=self.adapter)
+        self.assertEqual(
+            '<a xmlns="urn:a"><b xmlns=""/></a>',
+            doc.root.xml(indent=False))
+        self.assertEqual(
+            u'<a xmlns="urn:a"><b xmlns=""/></a>',
+            doc.root.xml(indent=False, encoding=None))
+
 
 class TestLXMLEtreeBuilder(BaseWriterTest, unittest.TestCase):
     """
@@ -182,3 +298,110 @@ class TestElementTreeBuilder(BaseWriterTest, unittest.TestCase):
             self.skipTest(
                 "cElementTree library is not installed or is outdated")
         return xml4h.ElementTreeAdapter
+
+    def test_write_non_string_text(self):
+        # ElementTree stores text values as they are given
+        xmlb = xml4h.build('a', adapter=self.adapter).element('b', text=5)
+        self.assertEqual(5, xmlb.dom_element.impl_node.text)
+        self.assertEqual('<b>5</b>', xmlb.dom_element.xml(indent=False))
+        self.assertEqual(
+            u'<?xml version="1.0"?><a><b>5</b></a>',
+            xmlb.document.xml(indent=False, encoding=None))
+
+
+class TestStreamWriter(unittest.TestCase):
+
+    def build_content(self, b):
+        return (
+            b.attributes({'b': 2, 'a': u'1&"'}).ns_prefix('p', 'urn:p')
+                .element('Child', ns_uri='urn:c').attributes(x=1)
+                    .text(u'默认 <t>')
+                    .element('Sub').up()
+                    .comment(' note ').up()
+                .element('p:Pre').attributes({'{urn:q}z': 'q', 'p:y': 'y'})
+                    .instruction('pi', 'data').cdata('cd').up()
+                .element('{urn:p}Lit')
+                    .element('Deep').element('Deeper').up(to_name='Lit')
+                .element('Empty', text='').up()
+                .element('Last'))
+
+    def test_output_matches_dom_writer(self):
+        for options in [
+                {},
+                {'indent': 2},
+                {'indent': '\t', 'newline': '\r\n'},
+                {'encoding': 'utf-16'},
+                {'encoding': None},
+                {'omit_declaration': True},
+                ]:
+            dom_output = StringIO()
+            self.build_content(xml4h.build('Root', ns_uri='urn:r',
+                adapter=xml4h.XmlDomImplAdapter)).write_doc(
+                    dom_output, **options)
+            stream_output = StringIO()
+            self.build_content(
+                xml4h.StreamWriter(stream_output, **options)
+                    .element('Root', ns_uri='urn:r')).close()
+            self.assertEqual(dom_output.getvalue(), stream_output.getvalue())
+
+    def test_writes_content_as_it_is_added(self):
+        output = StringIO()
+        writer = xml4h.StreamWriter(output, omit_declaration=True)
+        writer.element('Root')
+        for i in range(xml4h.writer.WRITE_BUFFER_SIZE):
+            writer.element('Elem').text(str(i)).up()
+            # Only the root element remains open
+            self.assertEqual(1, len(writer._open_elements))
+        # Some output has already been sent to the writer...
+        self.assertTrue(
+            output.getvalue().startswith('<Root><Elem>0</Elem>'))
+        # ...but a start tag is pending until content is added
+        output = StringIO()
+        writer = xml4h.StreamWriter(output, omit_declaration=True)
+        writer.element('Root').attributes(a=1)
+        writer.flush()
+        self.assertTrue(output.getvalue().endswith('<Root'))
+        writer.attributes(b=2).element('Child')
+        writer.flush()
+        self.assertTrue(output.getvalue().endswith('<Root a="1" b="2"><Child'))
+
+    def test_non_string_text(self):
+        output = StringIO()
+        with xml4h.StreamWriter(output, omit_declaration=True) as writer:
+            writer.element('Root').element('A', text=5).up().text(1.5)
+        self.assertEqual('<Root><A>5</A>1.5</Root>', output.getvalue())
+
+    def test_close_ends_all_open_elements(self):
+        output = StringIO()
+        with xml4h.StreamWriter(output, indent=True) as writer:
+            writer.element('A').element('B').element('C').up(count=100)
+            self.assertEqual(1, len(writer._open_elements))
+            writer.element('B').text('t')
+        self.assertEqual(
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<A>\n    <B>\n        <C/>\n    </B>\n    <B>t</B>\n</A>\n',
+            output.getvalue())
+        # Closing again has no effect, adding content fails
+        writer.close()
+        self.assertRaises(ValueError, writer.text, 'late')
+        self.assertRaises(ValueError, writer.element, 'Late')
+
+    def test_invalid_content(self):
+        writer = xml4h.StreamWriter(StringIO())
+        self.assertRaises(ValueError, writer.text, 'no root')
+        self.assertRaises(ValueError, writer.close)
+        writer.element('Root')
+        self.assertRaises(xml4h.exceptions.UnknownNamespaceException,
+            writer.element, 'x:Child')
+        self.assertRaises(xml4h.exceptions.UnknownNamespaceException,
+            writer.attributes, {'x:attr': 1})
+        self.assertRaises(ValueError, writer.attributes, {'a b': 1})
+        self.assertRaises(ValueError, writer.comment, 'a--b')
+        self.assertRaises(ValueError, writer.cdata, 'a]]>b')
+        # Attributes cannot be added once element content is written
+        writer.text('content')
+        self.assertRaises(ValueError, writer.attributes, a=1)
+        self.assertRaises(ValueError, writer.ns_prefix, 'x', 'urn:x')
+        # Only one root element is permitted
+        writer.close()
+        self.assertRaises(ValueError, writer.element, 'Root2')
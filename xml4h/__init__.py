@@ -1,53 +1,42 @@
+import sys
+import mmap
+import types
+import Queue
+import itertools
+
 import xml4h
 
-# Make commonly-used classes and functions available in xml4h module
-from xml4h.impls.xml_dom_minidom import XmlDomImplAdapter
-from xml4h.impls.xml_etree_elementtree import (
-    ElementTreeAdapter, cElementTreeAdapter)
-from xml4h.impls.lxml_etree import LXMLAdapter
-from xml4h.builder import Builder
-from xml4h.writer import write_node
+# Make commonly-used classes and functions available in xml4h module. The
+# adapter classes are made available by _Xml4hModule below, since importing
+# them imports the underlying XML libraries
+from xml4h.impls import (
+    ADAPTER_CLASS_MODULES, get_adapter_class, iter_adapter_classes,
+    find_best_adapter)
+from xml4h.builder import Builder, FastBuilder
+from xml4h.writer import write_node, iter_write_node, StreamWriter
+from xml4h.parser import (
+    ParserConfig, BufferReader, FeedParser, BUFFER_TYPES)
+from xml4h.profiler import Profile
+from xml4h.template import Template
 
 
 __title__ = 'xml4h'
 __version__ = '0.2.0'
 
 
-# List of xml4h adapter classes, in order of preference
-_ADAPTER_CLASSES = [
-    LXMLAdapter,
-    cElementTreeAdapter,
-    ElementTreeAdapter,
-    XmlDomImplAdapter]
-
-_ADAPTERS_AVAILABLE = []
-_ADAPTERS_UNAVAILABLE = []
-
-for impl_class in _ADAPTER_CLASSES:
-    if impl_class.is_available():
-        _ADAPTERS_AVAILABLE.append(impl_class)
-    else:
-        _ADAPTERS_UNAVAILABLE.append(impl_class)
-
-
-best_adapter = _ADAPTERS_AVAILABLE[0]
-"""
-The :ref:`best adapter available <best-adapter>` in the Python environment.
-This adapter is the default when parsing or creating XML documents,
-unless overridden by passing a specific adapter class.
-"""
-
-
-def parse(to_parse, ignore_whitespace_text_nodes=True, adapter=None):
+def parse(to_parse, ignore_whitespace_text_nodes=True, adapter=None,
+        parser_config=None):
     """
     Parse an XML document into an *xml4h*-wrapped DOM representation
     using an underlying XML library implementation.
 
-    :param to_parse: an XML document file, document string, or the
-        path to an XML file. If a string value is given that contains
+    :param to_parse: an XML document file, document string or buffer, or
+        the path to an XML file. If a string value is given that contains
         a ``<`` character it is treated as literal XML data, otherwise
-        a string value is treated as a file path.
-    :type to_parse: a file-like object or string
+        a string value is treated as a file path. The data in a
+        *bytearray*, *memoryview* or *mmap* buffer is parsed in place
+        without copying it.
+    :type to_parse: a file-like object, string or buffer
     :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
         nodes are stripped from the parsed document, since these are
         usually noise introduced by XML docs serialized to be human-friendly.
@@ -55,6 +44,9 @@ def parse(to_parse, ignore_whitespace_text_nodes=True, adapter=None):
         the document and to interact with the resulting nodes.
         If None, :attr:`best_adapter` will be used.
     :type adapter: adapter class or None
+    :param parser_config: options for the underlying parser, or *None* for
+        the default options.
+    :type parser_config: :class:`~xml4h.parser.ParserConfig` or None
 
     :return: an :class:`xml4h.nodes.Document` node representing the
         parsed document.
@@ -63,14 +55,290 @@ def parse(to_parse, ignore_whitespace_text_nodes=True, adapter=None):
     :meth:`~xml4h.impls.interface.parse_file` implementation.
     """
     if adapter is None:
-        adapter = best_adapter
+        adapter = xml4h.best_adapter
     if isinstance(to_parse, basestring) and '<' in to_parse:
-        return adapter.parse_string(to_parse, ignore_whitespace_text_nodes)
+        return adapter.parse_string(
+            to_parse, ignore_whitespace_text_nodes, parser_config)
     else:
-        return adapter.parse_file(to_parse, ignore_whitespace_text_nodes)
+        if isinstance(to_parse, BUFFER_TYPES):
+            to_parse = BufferReader(to_parse)
+        return adapter.parse_file(
+            to_parse, ignore_whitespace_text_nodes, parser_config)
+
+
+def parse_mmap(file_path, ignore_whitespace_text_nodes=True, adapter=None,
+        parser_config=None):
+    """
+    Parse an XML file via a read-only memory map of its content, which
+    avoids holding both the file's data and the parsed document in memory.
 
+    The arguments are the same as for :func:`parse`, except that
+    *file_path* must be the path to an XML file.
 
-def build(tagname_or_element, ns_uri=None, adapter=None):
+    :return: an :class:`xml4h.nodes.Document` node representing the
+        parsed document.
+    """
+    with open(file_path, 'rb') as xml_file:
+        mapped_file = mmap.mmap(
+            xml_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return parse(mapped_file, ignore_whitespace_text_nodes,
+                adapter=adapter, parser_config=parser_config)
+        finally:
+            mapped_file.close()
+
+
+def parse_many(sources, func, workers=None, ordered=True, chunk_size=1,
+        ignore_whitespace_text_nodes=True, adapter=None, parser_config=None):
+    """
+    Parse many independent XML documents in a pool of worker processes,
+    and apply a function to each parsed document in the worker.
+
+    :param sources: the documents to parse, in any form accepted by
+        :func:`parse` that can be sent to another process, such as file
+        paths or XML strings. Sources are read from the iterable only as
+        fast as results are consumed, so it can be a generator of any size.
+    :type sources: iterable
+    :param func: a function that takes an :class:`xml4h.nodes.Document`
+        and returns a result that can be sent back from the worker process.
+        The function must be defined at the top level of a module, and any
+        exception it raises is re-raised when its result is reached.
+    :param workers: the number of worker processes.
+        If None, the number of CPUs is used.
+    :type workers: int or None
+    :param bool ordered: if *True* results are generated in the order of
+        the sources, otherwise in the order they are completed.
+    :param int chunk_size: the number of sources sent to a worker process
+        at a time. Larger chunks reduce the communication overhead for
+        many small documents.
+    :param bool ignore_whitespace_text_nodes: as for :func:`parse`.
+    :param adapter: as for :func:`parse`.
+    :param parser_config: as for :func:`parse`.
+
+    :return: a generator of results from *func*. The worker processes are
+        stopped when the generator is exhausted or closed.
+    """
+    if adapter is None:
+        adapter = xml4h.best_adapter
+    # Imported here since importing multiprocessing slows down startup
+    import multiprocessing
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    source_chunks = _iter_chunks(sources, chunk_size)
+    # Limit the chunks in progress, or finished but not yet consumed, to
+    # keep the workers busy without reading too far ahead of the consumer
+    max_pending = workers * 2
+    pending_results = {}
+    completed_chunks = Queue.Queue()
+    next_chunk_index = 0
+    next_result_index = 0
+    finished_results = {}
+    pool = multiprocessing.Pool(workers)
+    try:
+        while True:
+            while len(pending_results) + len(finished_results) < max_pending:
+                chunk = next(source_chunks, None)
+                if chunk is None:
+                    break
+                pending_results[next_chunk_index] = pool.apply_async(
+                    _parse_chunk, [(chunk, func, ignore_whitespace_text_nodes,
+                        adapter, parser_config)],
+                    callback=lambda r, i=next_chunk_index:
+                        completed_chunks.put(i))
+                next_chunk_index += 1
+            if not pending_results and not finished_results:
+                break
+            if ordered and next_result_index in finished_results:
+                chunk_index = next_result_index
+            elif not ordered and finished_results:
+                chunk_index = iter(finished_results).next()
+            else:
+                # Wait for a chunk to complete. Chunks that fail to complete
+                # never call back, so also check for these periodically
+                try:
+                    chunk_index = completed_chunks.get(timeout=1)
+                except Queue.Empty:
+                    for async_result in pending_results.values():
+                        if async_result.ready():
+                            async_result.get()
+                    continue
+                finished_results[chunk_index] = pending_results.pop(
+                    chunk_index).get()
+                continue
+            is_success, results = finished_results.pop(chunk_index)
+            if ordered:
+                next_result_index += 1
+            if not is_success:
+                raise results
+            for result in results:
+                yield result
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+def _iter_chunks(items, chunk_size):
+    """
+    Generate lists of up to *chunk_size* items from an iterable.
+    """
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _parse_chunk(args):
+    """
+    Parse each source in a chunk and apply a function to the documents,
+    in a worker process for :func:`parse_many`.
+
+    :return: *True* and the function results, or *False* and the exception
+        raised if parsing or the function failed.
+    """
+    sources, func, ignore_whitespace_text_nodes, adapter, parser_config = args
+    try:
+        return True, [
+            func(parse(source, ignore_whitespace_text_nodes,
+                adapter=adapter, parser_config=parser_config))
+            for source in sources]
+    except Exception, e:
+        return False, e
+
+
+def iterparse(to_parse, tag=None, ns_uri=None,
+        ignore_whitespace_text_nodes=True, adapter=None, parser_config=None):
+    """
+    Incrementally parse an XML document, generating *xml4h*-wrapped
+    :class:`xml4h.nodes.Element` nodes for matching elements as soon as
+    each element and its descendants have been parsed. Use this instead
+    of :func:`parse` for documents too large to hold in memory.
+
+    Each generated element is cleared, along with all content parsed before
+    it except the path of ancestors leading to it, when the next element is
+    requested. Clone or copy any content you need to keep.
+
+    :param to_parse: an XML document file or buffer, or the path to an XML
+        file.
+    :type to_parse: a file-like object, buffer or string
+    :param tag: only generate elements with this local name.
+        If *None* or ``'*'`` all element names are matched.
+    :type tag: string or None
+    :param ns_uri: only generate elements within this namespace URI.
+        If *None* or ``'*'`` all namespaces are matched.
+    :type ns_uri: string or None
+    :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+        nodes are stripped from each generated element.
+    :param adapter: the *xml4h* implementation adapter class used to parse
+        the document and to interact with the resulting nodes.
+        If None, :attr:`best_adapter` will be used.
+    :type adapter: adapter class or None
+    :param parser_config: options for the underlying parser, or *None* for
+        the default options.
+    :type parser_config: :class:`~xml4h.parser.ParserConfig` or None
+
+    :return: a generator of :class:`xml4h.nodes.Element` nodes.
+
+    Delegates to an adapter's :meth:`~xml4h.impls.interface.iterparse`
+    implementation, which is only available for adapters that support the
+    ``iterparse`` feature.
+    """
+    if adapter is None:
+        adapter = xml4h.best_adapter
+    if isinstance(to_parse, BUFFER_TYPES):
+        to_parse = BufferReader(to_parse)
+    return adapter.iterparse(to_parse, tag=tag, ns_uri=ns_uri,
+        ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+        parser_config=parser_config)
+
+
+def feed_parser(ignore_whitespace_text_nodes=True, adapter=None,
+        parser_config=None):
+    """
+    Return a parser for an XML document that arrives in chunks, such as from
+    a network connection in an event-driven program. Pass each chunk of data
+    to the parser's :meth:`~xml4h.parser.FeedParser.feed` method as it
+    arrives, then call :meth:`~xml4h.parser.FeedParser.close` to get the
+    parsed document.
+
+    :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+        nodes are stripped from the parsed document.
+    :param adapter: the *xml4h* implementation adapter class used to parse
+        the document and to interact with the resulting nodes.
+        If None, :attr:`best_adapter` will be used.
+    :type adapter: adapter class or None
+    :param parser_config: options for the underlying parser, or *None* for
+        the default options.
+    :type parser_config: :class:`~xml4h.parser.ParserConfig` or None
+
+    :return: a :class:`~xml4h.parser.FeedParser`.
+
+    Delegates to an adapter's :meth:`~xml4h.impls.interface.feed_parser`
+    implementation.
+    """
+    if adapter is None:
+        adapter = xml4h.best_adapter
+    return adapter.feed_parser(
+        ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+        parser_config=parser_config)
+
+
+def compile_xpath(xpath, namespaces=None, adapter=None):
+    """
+    Compile an XPath query once for efficient reuse, by passing the result
+    in place of a query string to :meth:`~xml4h.nodes.XPathMixin.xpath`
+    on nodes in any document handled by the same adapter.
+
+    :param string xpath: XPath query.
+    :param namespaces: prefix-to-URI mappings for the namespace prefixes
+        used in the query. Unlike with XPath query strings, the prefixes
+        defined in a document are not available to compiled queries,
+        though the default namespace can be given with a *None* prefix
+        and then referred to with the ``_`` alias.
+    :type namespaces: dict or None
+    :param adapter: the *xml4h* implementation adapter class that will
+        perform the query. If None, :attr:`best_adapter` will be used.
+    :type adapter: adapter class or None
+
+    :return: an implementation-specific compiled query.
+
+    Delegates to an adapter's :meth:`~xml4h.impls.interface.compile_xpath`
+    implementation, which is only available for adapters that support the
+    ``xpath`` feature.
+    """
+    if adapter is None:
+        adapter = xml4h.best_adapter
+    return adapter.compile_xpath(xpath, namespaces=namespaces)
+
+
+def profile(node=None):
+    """
+    Return a :class:`~xml4h.profiler.Profile` that counts and times the calls
+    made to adapter methods, for use in a ``with`` statement::
+
+        with xml4h.profile() as stats:
+            doc.find('Film')
+        print stats.as_dict()
+
+    Adapter methods are only instrumented while a profile is active, so
+    there is no overhead at other times.
+
+    :param node: if given, only calls made for the document containing this
+        node are recorded.
+    :type node: :class:`xml4h.nodes.Node` or None
+
+    :return: a :class:`~xml4h.profiler.Profile`, which starts recording
+        when the ``with`` statement is entered.
+    """
+    return Profile(node)
+
+
+def build(tagname_or_element, ns_uri=None, adapter=None, fast=False):
     """
     Return a :class:`~xml4h.builder.Builder` that represents an element in
     a new or existing XML DOM and provides "chainable" methods focussed
@@ -87,12 +355,15 @@ def build(tagname_or_element, ns_uri=None, adapter=None):
         interact with the document DOM nodes.
         If None, :attr:`best_adapter` will be used.
     :type adapter: adapter class or None
+    :param bool fast: if *True* return a :class:`~xml4h.builder.FastBuilder`,
+        which adds content to the underlying XML implementation nodes
+        directly and is much faster for large or deeply-nested documents.
 
     :return: a :class:`~xml4h.builder.Builder` instance that represents an
         :class:`~xml4h.nodes.Element` node in an XML DOM.
     """
     if adapter is None:
-        adapter = best_adapter
+        adapter = xml4h.best_adapter
     if isinstance(tagname_or_element, basestring):
         doc = adapter.create_document(
             tagname_or_element, ns_uri=ns_uri)
@@ -102,4 +373,41 @@ def build(tagname_or_element, ns_uri=None, adapter=None):
     else:
         raise xml4h.exceptions.IncorrectArgumentTypeException(
             tagname_or_element, [basestring, xml4h.nodes.Element])
+    if fast:
+        return FastBuilder(element)
     return Builder(element)
+
+
+class _Xml4hModule(types.ModuleType):
+    """
+    Type of the *xml4h* module, which imports the adapter classes and finds
+    the best adapter when these attributes are first used, rather than when
+    *xml4h* is imported, because doing so imports the underlying XML
+    libraries. Each attribute is stored in the module once found, so it can
+    also be overridden by assignment like any other module attribute.
+    """
+
+    def __getattr__(self, name):
+        if name == 'best_adapter':
+            value = find_best_adapter()
+        elif name in dict(ADAPTER_CLASS_MODULES):
+            value = get_adapter_class(name)
+        elif name == '_ADAPTERS_AVAILABLE':
+            value = [a for a in iter_adapter_classes() if a.is_available()]
+        elif name == '_ADAPTERS_UNAVAILABLE':
+            value = [a for a in iter_adapter_classes()
+                if not a.is_available()]
+        else:
+            raise AttributeError(
+                "'module' object has no attribute '%s'" % name)
+        setattr(self, name, value)
+        return value
+
+
+# Replace this module with an equivalent _Xml4hModule. The functions above
+# look up their module globals in this module's namespace, so keep this
+# module alive and refer them to the replacement module as ``xml4h``
+_original_module = sys.modules[__name__]
+xml4h = _Xml4hModule(__name__, __doc__)
+xml4h.__dict__.update(_original_module.__dict__)
+sys.modules[__name__] = xml4h
@@ -174,6 +174,27 @@ class Builder(object):
     e = element  # Alias
     """Alias of :meth:`element`"""
 
+    def elements_from(self, records, name, attributes=None, text=None,
+            ns_uri=None):
+        """
+        Add a child element to the :class:`xml4h.nodes.Element` node
+        represented by this Builder for each record in an iterable, with
+        attributes and text taken from the fields of each record.
+
+        For example, to add an ``Item`` element with ``id`` and ``kind``
+        attributes and text content for each dict in ``rows``::
+
+            builder.elements_from(rows, 'Item',
+                attributes={'id': 'item_id', 'kind': 'kind'}, text='title')
+
+        :return: the current Builder.
+
+        Delegates to :meth:`xml4h.nodes.Element.add_elements_from`.
+        """
+        self._element.add_elements_from(records, name,
+            attributes=attributes, text=text, ns_uri=ns_uri)
+        return self
+
     def attributes(self, *args, **kwargs):
         """
         Add one or more attributes to the :class:`xml4h.nodes.Element` node
@@ -269,3 +290,273 @@ class Builder(object):
         """
         self._element.set_ns_prefix(prefix, ns_uri)
         return self
+
+
+class FastBuilder(Builder):
+    """
+    Builder that adds content directly to the nodes of the underlying XML
+    implementation, for building large or deeply-nested documents quickly.
+
+    Unlike a :class:`Builder`, a FastBuilder only wraps its element as an
+    :class:`xml4h.nodes.Element` node when this is needed, such as when the
+    :attr:`dom_element` attribute is used. It also keeps track of the
+    namespace prefixes declared by the builders above it, so element names
+    are resolved without looking through the element's ancestors, and the
+    cost of adding an element does not depend on its depth in the document.
+
+    Namespaces must be declared with builder methods for the FastBuilder to
+    know about them, if they are declared after it was created.
+    """
+
+    # Incremented whenever a namespace is declared by a FastBuilder, so
+    # namespace URIs looked up before the declaration are not used again
+    _ns_version = 0
+
+    def __init__(self, element):
+        """
+        Create a FastBuilder representing an xml4h Element node.
+
+        :param element: Element node to represent
+        :type element: :class:`xml4h.nodes.Element`
+        """
+        super(FastBuilder, self).__init__(element)
+        self._impl_node = element.impl_node
+        self._parent = None
+        # The element where fast building started, whose helper methods
+        # are used to add content to any element it contains
+        self._start_element = element
+        # Namespace URIs declared on this builder's element, by prefix, and
+        # namespace URIs looked up for it, which are forgotten when a
+        # namespace is declared by any FastBuilder
+        self._ns_uris = {}
+        self._ns_lookups = {}
+        self._ns_lookups_version = FastBuilder._ns_version
+
+    @property
+    def _element(self):
+        if self._wrapped_element is None:
+            adapter = self._start_element.adapter
+            self._wrapped_element = adapter.wrap_node(
+                self._impl_node, adapter.impl_document, adapter)
+        return self._wrapped_element
+
+    @_element.setter
+    def _element(self, element):
+        self._wrapped_element = element
+
+    def _new_child_builder(self, impl_node):
+        """
+        :return: a FastBuilder for a new child element of the element
+            represented by this builder, whose namespace scope is nested in
+            this builder's scope.
+        """
+        builder = self.__class__.__new__(self.__class__)
+        builder._wrapped_element = None
+        builder._impl_node = impl_node
+        builder._parent = self
+        builder._start_element = self._start_element
+        builder._ns_uris = {}
+        builder._ns_lookups = {}
+        builder._ns_lookups_version = FastBuilder._ns_version
+        return builder
+
+    def _get_ns_uri(self, prefix):
+        """
+        :return: the namespace URI for a prefix, or for the default namespace
+            if the prefix is None, in the scope of this builder's element.
+        """
+        version = FastBuilder._ns_version
+        # Look through the builders of this element and its ancestors for
+        # the nearest declaration or a remembered lookup of the prefix
+        builders = []
+        builder = self
+        while True:
+            if builder._ns_lookups_version != version:
+                builder._ns_lookups = {}
+                builder._ns_lookups_version = version
+            if prefix in builder._ns_uris:
+                ns_uri = builder._ns_uris[prefix]
+                break
+            if prefix in builder._ns_lookups:
+                ns_uri = builder._ns_lookups[prefix]
+                break
+            builders.append(builder)
+            if builder._parent is None:
+                # Beyond the element where fast building started, namespaces
+                # are looked up by the adapter
+                ns_uri = self._start_element.adapter.get_ns_uri_for_prefix(
+                    builder._impl_node, prefix)
+                break
+            builder = builder._parent
+        for builder in builders:
+            builder._ns_lookups[prefix] = ns_uri
+        return ns_uri
+
+    def _declare_ns(self, prefix, ns_uri):
+        """
+        Record a namespace declared on this builder's element.
+        """
+        self._ns_uris[prefix] = ns_uri
+        # Lookups made by builders of this element's descendants may be
+        # outdated, and are forgotten
+        FastBuilder._ns_version += 1
+
+    def _declare_ns_attributes(self, attr_obj, attr_dict):
+        """
+        Record any namespaces declared by xmlns attributes set on this
+        builder's element.
+        """
+        if attr_obj is None:
+            attr_items = []
+        elif isinstance(attr_obj, dict):
+            attr_items = attr_obj.items()
+        else:
+            attr_items = list(attr_obj)
+        for name, value in attr_items + attr_dict.items():
+            if name == 'xmlns':
+                self._declare_ns(None, value)
+            elif name.startswith('xmlns:'):
+                self._declare_ns(name.split(':')[1], value)
+
+    def up(self, count=1, to_name=None):
+        """
+        :return: a builder representing an ancestor of the current element,
+                 as for :meth:`Builder.up`.
+        """
+        builder = self
+        up_count = 0
+        while builder._parent is not None:
+            builder = builder._parent
+            if to_name is None:
+                up_count += 1
+                if up_count >= count:
+                    return builder
+            elif builder._element.name == to_name:
+                return builder
+        # Continue up beyond the element where fast building started
+        elem = builder._element
+        while not (elem.is_root or elem.parent is None):
+            elem = elem.parent
+            if to_name is None:
+                up_count += 1
+                if up_count >= count:
+                    break
+            elif elem.name == to_name:
+                break
+        if elem == builder._element:
+            return builder
+        return FastBuilder(elem)
+
+    def element(self, name, ns_uri=None, attributes=None, text=None,
+            before_this_element=False):
+        """
+        Add a child element to the element represented by this builder, with
+        the same arguments as :meth:`xml4h.nodes.Element.add_element`.
+
+        :return: a new FastBuilder that represents the child element.
+        """
+        if before_this_element:
+            # The new element is not in this builder's scope
+            return FastBuilder(self._element.add_element(name,
+                ns_uri=ns_uri, attributes=attributes, text=text,
+                before_this_element=True))
+        start_element = self._start_element
+        adapter = start_element.adapter
+        # Determine local name, namespace and prefix info from tag name as
+        # for add_element, but look up prefixes in this builder's scope
+        if '}' in name:
+            prefix, local_name, node_ns_uri = \
+                adapter.get_ns_info_from_node_name(name, self._impl_node)
+        elif ':' in name:
+            prefix, local_name = name.split(':')
+            node_ns_uri = self._get_ns_uri(prefix)
+        else:
+            prefix, local_name, node_ns_uri = None, name, None
+        if prefix:
+            qname = u'%s:%s' % (prefix, local_name)
+        else:
+            qname = local_name
+        if node_ns_uri is None:
+            if ns_uri is None:
+                node_ns_uri = self._get_ns_uri(None)
+            else:
+                node_ns_uri = ns_uri
+        child_elem = adapter.new_impl_element(
+            qname, node_ns_uri, parent=self._impl_node)
+        child = self._new_child_builder(child_elem)
+        # The child has no descendants yet, so namespaces declared on it are
+        # recorded directly without forgetting any lookups
+        if not prefix and '}' in name:
+            start_element._set_element_attributes(child_elem,
+                {'xmlns': node_ns_uri}, ns_uri=start_element.XMLNS_URI)
+            child._ns_uris[None] = node_ns_uri
+        elif ns_uri is not None:
+            start_element._set_element_attributes(child_elem,
+                {'xmlns': ns_uri}, ns_uri=start_element.XMLNS_URI)
+            child._ns_uris[None] = ns_uri
+        elif adapter.NEW_ELEMENTS_DECLARE_DEFAULT_NS and not prefix:
+            child._ns_uris[None] = node_ns_uri
+        if attributes is not None:
+            start_element._set_element_attributes(
+                child_elem, attr_obj=attributes)
+            child._declare_ns_attributes(attributes, {})
+        if text is not None:
+            start_element._add_text(child_elem, text)
+        adapter.add_node_child(self._impl_node, child_elem)
+        if (adapter.NEW_ELEMENTS_DECLARE_DEFAULT_NS and prefix
+                and None not in child._ns_uris):
+            # The default namespace of a prefixed element is whatever the
+            # implementation gave it when it was added to the document
+            child._ns_uris[None] = adapter.get_ns_uri_for_prefix(
+                child_elem, None)
+        return child
+
+    elem = element  # Alias
+    """Alias of :meth:`element`"""
+
+    e = element  # Alias
+    """Alias of :meth:`element`"""
+
+    def attributes(self, attr_obj=None, ns_uri=None, **attr_dict):
+        """
+        Add one or more attributes to the element represented by this
+        builder, with the same arguments as
+        :meth:`xml4h.nodes.Element.set_attributes`.
+
+        :return: the current FastBuilder.
+        """
+        self._start_element._set_element_attributes(self._impl_node,
+            attr_obj=attr_obj, ns_uri=ns_uri, **attr_dict)
+        self._declare_ns_attributes(attr_obj, attr_dict)
+        return self
+
+    attrs = attributes  # Alias
+    """Alias of :meth:`attributes`"""
+
+    a = attributes  # Alias
+    """Alias of :meth:`attributes`"""
+
+    def text(self, text):
+        """
+        Add a text node to the element represented by this builder.
+
+        :return: the current FastBuilder.
+        """
+        if not isinstance(text, basestring):
+            text = unicode(text)
+        self._start_element._add_text(self._impl_node, text)
+        return self
+
+    t = text  # Alias
+    """Alias of :meth:`text`"""
+
+    def ns_prefix(self, prefix, ns_uri):
+        """
+        Set the namespace prefix of the element represented by this builder.
+
+        :return: the current FastBuilder.
+        """
+        self._start_element._add_ns_prefix_attr(
+            self._impl_node, prefix, ns_uri)
+        self._declare_ns(prefix, ns_uri)
+        return self
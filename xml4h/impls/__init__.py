@@ -0,0 +1,47 @@
+"""
+Adapters to the underlying XML library implementations.
+
+Each adapter module imports its XML library, which can be slow, so adapter
+modules are only imported when their adapter classes are first used.
+"""
+import sys
+
+
+# Names of the adapter classes in order of preference, with the name of the
+# module that defines each one
+ADAPTER_CLASS_MODULES = [
+    ('LXMLAdapter', 'xml4h.impls.lxml_etree'),
+    ('cElementTreeAdapter', 'xml4h.impls.xml_etree_elementtree'),
+    ('ElementTreeAdapter', 'xml4h.impls.xml_etree_elementtree'),
+    ('XmlDomImplAdapter', 'xml4h.impls.xml_dom_minidom'),
+    ]
+
+
+def get_adapter_class(name):
+    """
+    :return: the named adapter class, importing its module if necessary.
+    """
+    module_name = dict(ADAPTER_CLASS_MODULES)[name]
+    __import__(module_name)
+    return getattr(sys.modules[module_name], name)
+
+
+def iter_adapter_classes():
+    """
+    Generate all the adapter classes in order of preference, importing the
+    module of each one only when it is reached.
+    """
+    for name, module_name in ADAPTER_CLASS_MODULES:
+        yield get_adapter_class(name)
+
+
+def find_best_adapter():
+    """
+    :return: the most preferred adapter class that is available in the
+        Python environment. Only the adapters up to and including this one
+        are imported.
+    """
+    for adapter_class in iter_adapter_classes():
+        if adapter_class.is_available():
+            return adapter_class
+    raise ImportError('No supported XML library is available')
@@ -0,0 +1,50 @@
+"""
+Adapter methods shared by the lxml and ElementTree adapters, whose elements
+both store attributes in an ``attrib`` dict keyed by Clark-notation name.
+"""
+from xml4h import nodes
+
+
+class EtreeAttributesMixin(object):
+    """
+    Mixin for adapters to etree-style XML libraries that sets the attributes
+    of elements, including new elements added in bulk, through their
+    ``attrib`` dicts.
+    """
+
+    def set_node_attribute_values(self, element, attrs):
+        # Set ordinary attributes with a single update of the element's
+        # attributes, and namespace declarations individually
+        items = []
+        for name, value, ns_uri in attrs:
+            if ns_uri is None and (':' in name or name == 'xmlns'):
+                self.set_node_attribute_value(element, name, value)
+            elif ns_uri is None:
+                items.append((name, value))
+            elif ns_uri == nodes.Node.XMLNS_URI:
+                self.set_node_attribute_value(element, name, value, ns_uri)
+            else:
+                if ':' in name:
+                    name = name.split(':')[1]
+                items.append(('{%s}%s' % (ns_uri, name), value))
+        element.attrib.update(items)
+
+    def _get_new_attr_keys(self, attr_names):
+        """
+        :return: the keys in an ``attrib`` dict of the given (name, namespace
+            URI) pairs of attributes for new elements, or *None* if a prefix
+            must be resolved in the context of each element.
+        """
+        attr_keys = []
+        for name, ns_uri in attr_names:
+            if ':' in name:
+                if ns_uri is None:
+                    return None
+                name = name.split(':')[1]
+            if ns_uri is None:
+                attr_keys.append(name)
+            elif ns_uri == nodes.Node.XMLNS_URI and name == 'xmlns':
+                attr_keys.append(name)
+            else:
+                attr_keys.append('{%s}%s' % (ns_uri, name))
+        return attr_keys
@@ -1,4 +1,9 @@
+import weakref
+import itertools
+import threading
+
 from xml4h import nodes, exceptions
+from xml4h.parser import DEFAULT_PARSER_CONFIG
 
 
 class XmlImplAdapter(object):
@@ -16,8 +21,25 @@ class XmlImplAdapter(object):
     # List of extra features supported (or not) by an adapter implementation
     SUPPORTED_FEATURES = {
         'xpath': False,
+        'iterparse': False,
         }
 
+    # Names of the parser configuration options an adapter implementation
+    # can apply when they are changed from their default values
+    SUPPORTED_PARSER_OPTIONS = ()
+
+    # Set to True to always return the same wrapper object for a given
+    # implementation node, for as long as that wrapper object is in use.
+    CACHE_WRAPPED_NODES = False
+
+    # Set to False to always serialize nodes with the pure-Python writer,
+    # even where the underlying XML library can produce identical output.
+    NATIVE_SERIALIZATION = True
+
+    # Set to True if each new element with a namespace also declares that
+    # namespace as the default namespace of its descendants.
+    NEW_ELEMENTS_DECLARE_DEFAULT_NS = False
+
     @classmethod
     def has_feature(cls, feature_name):
         """
@@ -25,6 +47,23 @@ class XmlImplAdapter(object):
         """
         return cls.SUPPORTED_FEATURES.get(feature_name.lower(), False)
 
+    @classmethod
+    def check_parser_config(cls, parser_config):
+        """
+        :return: the given :class:`~xml4h.parser.ParserConfig`, or the
+            default configuration if it is *None*.
+
+        :raise FeatureUnavailableException: if the configuration changes
+            an option this adapter cannot apply.
+        """
+        if parser_config is None:
+            return DEFAULT_PARSER_CONFIG
+        for option_name in parser_config.changed_options:
+            if option_name not in cls.SUPPORTED_PARSER_OPTIONS:
+                raise exceptions.FeatureUnavailableException(
+                    'Parser option %s' % option_name)
+        return parser_config
+
     @classmethod
     def ignore_whitespace_text_nodes(cls, wrapped_node):
         """
@@ -63,8 +102,21 @@ class XmlImplAdapter(object):
             return None
         if adapter is None:
             adapter = cls(document)
+        if adapter.CACHE_WRAPPED_NODES:
+            wrapped_node = adapter._wrapped_nodes_cache.get(node)
+            if wrapped_node is not None:
+                return wrapped_node
         impl_class = adapter.map_node_to_class(node)
-        return impl_class(node, adapter)
+        wrapped_node = impl_class(node, adapter)
+        if adapter.CACHE_WRAPPED_NODES:
+            # Another thread may have wrapped the same node meanwhile, in
+            # which case use its wrapper so there is only ever one
+            with adapter._lock:
+                cached_node = adapter._wrapped_nodes_cache.get(node)
+                if cached_node is not None:
+                    return cached_node
+                adapter._wrapped_nodes_cache[node] = wrapped_node
+        return wrapped_node
 
     @classmethod
     def is_available(cls):
@@ -75,11 +127,76 @@ class XmlImplAdapter(object):
         raise NotImplementedError("Implementation missing for %s" % cls)
 
     @classmethod
-    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True):
+    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        raise NotImplementedError("Implementation missing for %s" % cls)
+
+    @classmethod
+    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        raise NotImplementedError("Implementation missing for %s" % cls)
+
+    @classmethod
+    def iterparse(cls, xml_file, tag=None, ns_uri=None,
+            ignore_whitespace_text_nodes=True, parser_config=None):
+        """
+        Incrementally parse an XML document, generating an *xml4h*-wrapped
+        :class:`~xml4h.nodes.Element` for each element matching the given
+        constraints as soon as the element and its descendants are parsed.
+
+        To keep memory use constant regardless of document size, each
+        generated element is cleared -- along with any earlier siblings of
+        the element and of its ancestors -- when the next element is
+        requested. Clone or copy any content you need to keep.
+
+        :param xml_file: an XML document file or the path to an XML file.
+        :param tag: only elements with a matching local name will be
+            generated. If *None* or ``*`` all names will match.
+        :type tag: string or None
+        :param ns_uri: only elements with a matching namespace URI will be
+            generated. If *None* or ``*`` all namespaces will match.
+        :type ns_uri: string or None
+        :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+            nodes are stripped from each generated element.
+        :param parser_config: options for the underlying parser.
+        :type parser_config: :class:`~xml4h.parser.ParserConfig` or None
+        """
+        if not cls.has_feature('iterparse'):
+            raise exceptions.FeatureUnavailableException('iterparse')
         raise NotImplementedError("Implementation missing for %s" % cls)
 
     @classmethod
-    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True):
+    def feed_parser(cls, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        """
+        :return: a :class:`~xml4h.parser.FeedParser` that parses an XML
+            document fed to it in chunks, using the incremental parser of the
+            underlying XML library.
+
+        :param bool ignore_whitespace_text_nodes: if ``True`` pure whitespace
+            nodes are stripped from the parsed document.
+        :param parser_config: options for the underlying parser.
+        :type parser_config: :class:`~xml4h.parser.ParserConfig` or None
+        """
+        raise NotImplementedError("Implementation missing for %s" % cls)
+
+    @classmethod
+    def compile_xpath(cls, xpath, namespaces=None):
+        """
+        Compile an XPath query once, for efficient reuse in many calls to
+        :meth:`xpath_on_node` on nodes from any document.
+
+        :param string xpath: XPath query.
+        :param namespaces: prefix-to-URI mappings for namespace prefixes
+            used in the query. Unlike with XPath query strings, the prefixes
+            defined in the document are not made available automatically.
+        :type namespaces: dict or None
+
+        :return: an implementation-specific compiled query, which can be
+            used in place of an XPath query string.
+        """
+        if not cls.has_feature('xpath'):
+            raise exceptions.FeatureUnavailableException('xpath')
         raise NotImplementedError("Implementation missing for %s" % cls)
 
     def __init__(self, document):
@@ -87,17 +204,33 @@ class XmlImplAdapter(object):
             raise exceptions.IncorrectArgumentTypeException(
                 document, [object])
         self._impl_document = document
-        self._auto_ns_prefix_count = 0
+        self._auto_ns_prefixes = itertools.count()
+        # Serializes changes to the adapter's cached data, which readers may
+        # add to concurrently but never modify in place
+        self._lock = threading.RLock()
         self.clear_caches()
 
-    def clear_caches(cls):
+    def clear_caches(self):
         """
         Clear any in-adapter cached data, for cases where cached data could
         become outdated e.g. by making DOM changes directly outside of *xml4h*.
 
-        This is a no-op if the implementing adapter has no cached data.
+        Implementing adapters with their own cached data must extend this
+        method. Cached data must only ever be replaced or added to, never
+        modified in place, so that threads reading a document concurrently
+        always see consistent data.
+        """
+        # Wrappers are held weakly so they expire when no longer in use.
+        # Wrappers hold their implementation node, so we cannot instead hold
+        # the node keys weakly: they would never expire.
+        self._wrapped_nodes_cache = weakref.WeakValueDictionary()
+
+    def uncache_wrapped_node(self, node):
         """
-        pass
+        Forget any cached wrapper object for the given implementation node,
+        such as when the node is deleted.
+        """
+        self._wrapped_nodes_cache.pop(node, None)
 
     @property
     def impl_document(self):
@@ -110,6 +243,8 @@ class XmlImplAdapter(object):
     def get_ns_uri_for_prefix(self, node, prefix):
         if prefix == 'xmlns':
             return nodes.Node.XMLNS_URI
+        elif prefix == 'xml':
+            return nodes.Node.XML_NS_URI
         elif prefix is None:
             attr_name = 'xmlns'
         else:
@@ -126,10 +261,11 @@ class XmlImplAdapter(object):
     def get_ns_prefix_for_uri(self, node, uri, auto_generate_prefix=False):
         if uri == nodes.Node.XMLNS_URI:
             return 'xmlns'
+        elif uri == nodes.Node.XML_NS_URI:
+            return 'xml'
         prefix = self.lookup_ns_prefix_for_uri(node, uri)
         if not prefix and auto_generate_prefix:
-            prefix = 'autoprefix%d' % self._auto_ns_prefix_count
-            self._auto_ns_prefix_count += 1
+            prefix = 'autoprefix%d' % next(self._auto_ns_prefixes)
         return prefix
 
     def get_ns_info_from_node_name(self, name, impl_node):
@@ -196,11 +332,34 @@ class XmlImplAdapter(object):
         """
         raise NotImplementedError("Implementation missing for %s" % self)
 
+    def iter_node_elements(self, node, name='*', ns_uri='*'):
+        """
+        :return: an iterator of element node descendents of the given node
+            that match the search constraints, which adapters may implement
+            to find elements lazily. The document must not be modified while
+            the iterator is in use.
+
+        See :meth:`find_node_elements` for the parameters.
+        """
+        return iter(self.find_node_elements(node, name=name, ns_uri=ns_uri))
+
     def xpath_on_node(self, node, xpath, **kwargs):
         if not self.has_feature('xpath'):
             raise exceptions.FeatureUnavailableException('xpath')
         raise NotImplementedError("Implementation missing for %s" % self)
 
+    def serialize_node(self, node):
+        """
+        :return: the given element node and its descendants serialized by
+            the underlying XML library as unicode text, exactly as
+            :func:`xml4h.writer.write_node` would write them without
+            indentation or newlines, or *None* if the library cannot
+            reproduce that output for this node.
+
+        Adapters with a native serializer should override this method.
+        """
+        return None
+
     # Node implementation methods
 
     def get_node_namespace_uri(self, node):
@@ -239,6 +398,9 @@ class XmlImplAdapter(object):
     def get_node_attributes(self, element, ns_uri=None):
         raise NotImplementedError("Implementation missing for %s" % self)
 
+    def get_node_attribute_count(self, element):
+        return len(self.get_node_attributes(element))
+
     def has_node_attribute(self, element, name, ns_uri=None):
         raise NotImplementedError("Implementation missing for %s" % self)
 
@@ -251,12 +413,48 @@ class XmlImplAdapter(object):
     def set_node_attribute_value(self, element, name, value, ns_uri=None):
         raise NotImplementedError("Implementation missing for %s" % self)
 
+    def set_node_attribute_values(self, element, attrs):
+        """
+        Set many attributes of an element, given as a list of
+        (name, value, namespace URI) tuples as for
+        :meth:`set_node_attribute_value`.
+
+        Adapters can override this to set all the attributes in one step.
+        """
+        for name, value, ns_uri in attrs:
+            self.set_node_attribute_value(element, name, value, ns_uri)
+
     def remove_node_attribute(self, element, name, ns_uri=None):
         raise NotImplementedError("Implementation missing for %s" % self)
 
     def add_node_child(self, parent, child, before_sibling=None):
         raise NotImplementedError("Implementation missing for %s" % self)
 
+    def add_node_elements(self, parent, tagname, ns_uri, attr_names, rows):
+        """
+        Append a new child element to the parent element for each row of
+        data, where all the children have the same name, namespace URI and
+        attribute names.
+
+        :param attr_names: a list of (name, namespace URI) pairs for the
+            attributes of the children, as for
+            :meth:`set_node_attribute_value`.
+        :param rows: an iterable of (attribute values, text) pairs, one for
+            each child, where the values are in the order of *attr_names*.
+            Attributes with a *None* value are omitted, as is *None* text.
+
+        Adapters can override this to create all the children in one step.
+        """
+        for values, text in rows:
+            element = self.new_impl_element(tagname, ns_uri, parent=parent)
+            self.set_node_attribute_values(element, [
+                (name, value, attr_ns_uri)
+                for (name, attr_ns_uri), value in zip(attr_names, values)
+                if value is not None])
+            if text is not None:
+                self.add_node_child(element, self.new_impl_text(text))
+            self.add_node_child(parent, element)
+
     def import_node(self, parent, node, original_parent=None, clone=False):
         raise NotImplementedError("Implementation missing for %s" % self)
 
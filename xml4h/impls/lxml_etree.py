@@ -1,7 +1,11 @@
 import re
 import copy
+import threading
+import collections
 
 from xml4h.impls.interface import XmlImplAdapter
+from xml4h.impls.etree_common import EtreeAttributesMixin
+from xml4h.parser import FeedParser
 from xml4h import nodes, exceptions
 
 try:
@@ -10,15 +14,43 @@ except ImportError:
     pass
 
 
-class LXMLAdapter(XmlImplAdapter):
+# Namespace prefixes assigned automatically by lxml, like 'ns0'
+AUTO_NS_PREFIX_RE = re.compile('ns\d')
+
+# Attribute names in an element's start tag serialized by lxml
+ATTR_NAME_RE = re.compile(' ([^\s=]+)="')
+
+
+class LXMLAdapter(EtreeAttributesMixin, XmlImplAdapter):
     """
     Adapter to the `lxml <http://lxml.de>`_ XML library implementation.
     """
 
     SUPPORTED_FEATURES = {
         'xpath': True,
+        'iterparse': True,
         }
 
+    SUPPORTED_PARSER_OPTIONS = (
+        'huge_tree', 'resolve_entities', 'recover',
+        'remove_comments', 'remove_pis')
+
+    # Parsers reused by each thread, keyed by parser options, since creating
+    # a parser is costly relative to parsing a small document
+    _thread_local = threading.local()
+
+    # Maximum number of compiled XPath expressions kept for reuse
+    XPATH_CACHE_SIZE = 256
+
+    # New elements are given an ``nsmap`` with their own namespace as the
+    # default namespace
+    NEW_ELEMENTS_DECLARE_DEFAULT_NS = True
+
+    # Compiled XPath expressions shared by all adapters, most recently used
+    # last, keyed by expression and namespace mappings
+    _compiled_xpath_cache = collections.OrderedDict()
+    _compiled_xpath_cache_lock = threading.Lock()
+
     @classmethod
     def is_available(cls):
         try:
@@ -28,21 +60,111 @@ class LXMLAdapter(XmlImplAdapter):
             return False
 
     @classmethod
-    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True):
-        impl_root_elem = etree.fromstring(xml_str)
-        wrapped_doc = LXMLAdapter.wrap_document(impl_root_elem.getroottree())
-        if ignore_whitespace_text_nodes:
-            cls.ignore_whitespace_text_nodes(wrapped_doc)
-        return wrapped_doc
+    def ignore_whitespace_text_nodes(cls, wrapped_node):
+        for node in wrapped_node.impl_node.iter(etree.Element):
+            cls._prune_whitespace_text(node)
+
+    @classmethod
+    def _prune_whitespace_text(cls, node):
+        """
+        Remove whitespace-only text from the given element's text and from
+        the tails of its children, which are complete once the element's
+        end tag has been parsed.
+        """
+        text = node.text
+        if text is not None and not text.strip():
+            node.text = None
+        for child in node:
+            tail = child.tail
+            if tail is not None and not tail.strip():
+                child.tail = None
+
+    @classmethod
+    def _get_parser(cls, ignore_whitespace_text_nodes, parser_config):
+        """
+        Return an lxml parser with the given options for use by the current
+        thread, which is only created the first time it is needed. lxml
+        parsers are reusable but must not be shared across threads.
+        """
+        parser_config = cls.check_parser_config(parser_config)
+        try:
+            parsers = cls._thread_local.parsers
+        except AttributeError:
+            parsers = cls._thread_local.parsers = {}
+        parser_key = (ignore_whitespace_text_nodes, parser_config)
+        parser = parsers.get(parser_key)
+        if parser is None:
+            # Remove redundant namespace declarations, which xml4h ignores,
+            # and let the parser skip the blank text between elements
+            parser = etree.XMLParser(ns_clean=True,
+                remove_blank_text=ignore_whitespace_text_nodes,
+                **parser_config._asdict())
+            parsers[parser_key] = parser
+        return parser
 
     @classmethod
-    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True):
-        impl_doc = etree.parse(xml_file)
+    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        parser = cls._get_parser(ignore_whitespace_text_nodes, parser_config)
+        impl_root_elem = etree.fromstring(xml_str, parser)
+        return cls._wrap_parsed_document(
+            impl_root_elem.getroottree(), ignore_whitespace_text_nodes)
+
+    @classmethod
+    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        parser = cls._get_parser(ignore_whitespace_text_nodes, parser_config)
+        impl_doc = etree.parse(xml_file, parser)
+        return cls._wrap_parsed_document(
+            impl_doc, ignore_whitespace_text_nodes)
+
+    @classmethod
+    def _wrap_parsed_document(cls, impl_doc, ignore_whitespace_text_nodes):
         wrapped_doc = LXMLAdapter.wrap_document(impl_doc)
+        wrapped_doc.adapter._has_redundant_ns_declarations = False
         if ignore_whitespace_text_nodes:
             cls.ignore_whitespace_text_nodes(wrapped_doc)
         return wrapped_doc
 
+    @classmethod
+    def feed_parser(cls, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        return LXMLFeedParser(cls, ignore_whitespace_text_nodes,
+            parser_config)
+
+    @classmethod
+    def iterparse(cls, xml_file, tag=None, ns_uri=None,
+            ignore_whitespace_text_nodes=True, parser_config=None):
+        parser_config = cls.check_parser_config(parser_config)
+        adapter = None
+        for event, node in etree.iterparse(xml_file, events=('end',),
+                remove_blank_text=ignore_whitespace_text_nodes,
+                **parser_config._asdict()):
+            if adapter is None:
+                adapter = cls(node.getroottree())
+            if ignore_whitespace_text_nodes:
+                cls._prune_whitespace_text(node)
+            if ns_uri not in (None, '*') and (
+                    adapter.get_node_namespace_uri(node) != ns_uri):
+                continue
+            if tag not in (None, '*') and (
+                    adapter.get_node_local_name(node) != tag):
+                continue
+            # The document has grown since we last looked, so forget any
+            # cached data about its structure
+            adapter.clear_caches()
+            wrapped_elem = adapter.wrap_node(
+                node, adapter.impl_document, adapter)
+            yield wrapped_elem
+            # Release the element and everything parsed before it, keeping
+            # only the (now empty) path from the root to this element
+            node.clear()
+            path_node = node
+            for ancestor in node.iterancestors():
+                while path_node.getprevious() is not None:
+                    del ancestor[0]
+                path_node = ancestor
+
     @classmethod
     def new_impl_document(cls, root_tagname, ns_uri=None, **kwargs):
         root_nsmap = {}
@@ -56,6 +178,92 @@ class LXMLAdapter(XmlImplAdapter):
         doc = etree.ElementTree(root_elem)
         return doc
 
+    def __init__(self, document):
+        super(LXMLAdapter, self).__init__(document)
+        # Elements may have namespace declarations that duplicate those of
+        # an ancestor, unless we know otherwise because we parsed the
+        # document and have not added elements to it since. lxml serializes
+        # such declarations while xml4h ignores them.
+        self._has_redundant_ns_declarations = True
+
+    # This method is called by interface super-class's __init__
+    def clear_caches(self):
+        super(LXMLAdapter, self).clear_caches()
+        self.CACHED_NS_SCOPE_DICT = {}
+        self.CACHED_XPATH_NS_DICT = {}
+
+    def _is_xmlns_attr_name(self, name):
+        """
+        Return True if the given attribute name declares a namespace.
+        """
+        return (name == 'xmlns'
+            or name.startswith('{%s}' % nodes.Node.XMLNS_URI))
+
+    def _lookup_ns_scope(self, node):
+        """
+        Return a four-element tuple describing the namespaces in scope for
+        the given element: the element's lxml ``nsmap`` and the reverse
+        URI-to-prefix mapping of it, then prefix-to-URI and URI-to-prefix
+        mappings for the namespaces declared by xmlns attributes of the
+        element and its ancestors, where the nearest declaration wins.
+
+        Scopes are computed once per element and cached, and an element that
+        declares no namespaces shares the scope dictionaries of its parent.
+        """
+        scope = self.CACHED_NS_SCOPE_DICT.get(node)
+        if scope is not None:
+            return scope
+        # Find nearest ancestor with a cached scope, if any
+        uncached_nodes = []
+        curr_node = node
+        while scope is None and curr_node.__class__ == etree._Element:
+            uncached_nodes.append(curr_node)
+            curr_node = self.get_node_parent(curr_node)
+            scope = self.CACHED_NS_SCOPE_DICT.get(curr_node)
+        if scope is None:
+            scope = ({}, {}, {}, {})
+        # Compute and cache scopes from the outermost element inwards
+        for curr_node in reversed(uncached_nodes):
+            (nsmap, nsmap_uri_to_prefix,
+                attr_prefix_to_uri, attr_uri_to_prefix) = scope
+            curr_nsmap = curr_node.nsmap
+            if curr_nsmap != nsmap:
+                nsmap = curr_nsmap
+                nsmap_uri_to_prefix = {}
+                for n, v in nsmap.items():
+                    nsmap_uri_to_prefix.setdefault(v, n)
+            declarations = []
+            for n, v in curr_node.attrib.items():
+                if n == 'xmlns':
+                    declarations.append((None, v))
+                elif n.startswith('{%s}' % nodes.Node.XMLNS_URI):
+                    declarations.append((n.split('}')[1], v))
+            if declarations:
+                attr_prefix_to_uri = dict(attr_prefix_to_uri)
+                attr_uri_to_prefix = dict(attr_uri_to_prefix)
+                element_uri_to_prefix = {}
+                for prefix, uri in declarations:
+                    attr_prefix_to_uri[prefix] = uri
+                    if prefix is not None:
+                        element_uri_to_prefix.setdefault(uri, prefix)
+                attr_uri_to_prefix.update(element_uri_to_prefix)
+            scope = (nsmap, nsmap_uri_to_prefix,
+                attr_prefix_to_uri, attr_uri_to_prefix)
+            self.CACHED_NS_SCOPE_DICT[curr_node] = scope
+        return scope
+
+    def _uncache_ns_scopes(self, node):
+        """
+        Forget the cached namespace scopes of the given element and its
+        descendants, which become outdated if namespaces are (re)declared or
+        the element is moved.
+        """
+        if self.CACHED_NS_SCOPE_DICT:
+            with self._lock:
+                for n in node.iter():
+                    self.CACHED_NS_SCOPE_DICT.pop(n, None)
+                    self.CACHED_XPATH_NS_DICT.pop(n, None)
+
     def map_node_to_class(self, node):
         if isinstance(node, etree._ProcessingInstruction):
             return nodes.ProcessingInstruction
@@ -85,15 +293,14 @@ class LXMLAdapter(XmlImplAdapter):
             if ':' in tagname:
                 tagname = tagname.split(':')[1]
             my_nsmap = {None: ns_uri}
-            # Add any xmlns attribute prefix mappings from parent's document
-            # TODO This doesn't seem to help
-            curr_node = parent
-            while curr_node.__class__ == etree._Element:
-                for n, v in curr_node.attrib.items():
-                    if '{%s}' % nodes.Node.XMLNS_URI in n:
-                        _, prefix = n.split('}')
-                        my_nsmap[prefix] = v
-                curr_node = self.get_node_parent(curr_node)
+            # Add any xmlns attribute prefix mappings in the parent's scope,
+            # which is cached so the parent's ancestors are not searched for
+            # every new element
+            if parent.__class__ == etree._Element:
+                attr_prefix_to_uri = self._lookup_ns_scope(parent)[2]
+                for prefix, uri in attr_prefix_to_uri.items():
+                    if prefix is not None:
+                        my_nsmap[prefix] = uri
             return etree.Element('{%s}%s' % (ns_uri, tagname), nsmap=my_nsmap)
         else:
             return etree.Element(tagname)
@@ -111,44 +318,45 @@ class LXMLAdapter(XmlImplAdapter):
         return LXMLText(text, is_cdata=True)
 
     def find_node_elements(self, node, name='*', ns_uri='*'):
-        # TODO Any proper way to find namespaced elements by name?
-        name_match_nodes = node.getiterator()
-        # Filter nodes by name and ns_uri if necessary
-        results = []
-        for n in name_match_nodes:
+        return list(self.iter_node_elements(node, name=name, ns_uri=ns_uri))
+    find_node_elements.__doc__ = XmlImplAdapter.find_node_elements.__doc__
+
+    def iter_node_elements(self, node, name='*', ns_uri='*'):
+        if ns_uri != '':
+            # Let lxml filter elements natively by a Clark-notation tag,
+            # where '{*}' matches any namespace and '*' any local name
+            if name == '*' and ns_uri == '*':
+                tag = etree.Element
+            else:
+                tag = '{%s}%s' % (ns_uri, name)
+            for n in node.iter(tag):
+                if n is not node:
+                    yield n
+            return
+        # Fall back to filtering elements in Python, since an empty URI in
+        # Clark notation would match non-namespaced elements in lxml
+        for n in node.iter(etree.Element):
             # Ignore the current node
-            if n == node:
+            if n is node:
                 continue
-            # Ignore non-Elements
-            if not n.__class__ == etree._Element:
-                continue
-            if ns_uri != '*' and self.get_node_namespace_uri(n) != ns_uri:
+            if self.get_node_namespace_uri(n) != ns_uri:
                 continue
             if name != '*' and self.get_node_local_name(n) != name:
                 continue
-            results.append(n)
-        return results
-    find_node_elements.__doc__ = XmlImplAdapter.find_node_elements.__doc__
+            yield n
+    iter_node_elements.__doc__ = XmlImplAdapter.iter_node_elements.__doc__
 
-    def xpath_on_node(self, node, xpath, **kwargs):
+    @classmethod
+    def _make_xpath_namespaces_dict(cls, nsmap):
         """
-        Return result of performing the given XPath query on the given node.
-
-        All known namespace prefix-to-URI mappings in the document are
-        automatically included in the XPath invocation.
+        Return a copy of the given prefix-to-URI mappings suitable for use
+        in XPath queries.
 
         If an empty/default namespace (i.e. None) is defined, this is
         converted to the prefix name '_' so it can be used despite empty
         namespace prefixes being unsupported by XPath.
         """
-        if isinstance(node, etree._ElementTree):
-            # Document node lxml.etree._ElementTree has no nsmap, lookup root
-            root = self.get_impl_root(node)
-            namespaces_dict = root.nsmap.copy()
-        else:
-            namespaces_dict = node.nsmap.copy()
-        if 'namespaces' in kwargs:
-            namespaces_dict.update(kwargs['namespaces'])
+        namespaces_dict = dict(nsmap)
         # Empty namespace prefix is not supported, convert to '_' prefix
         if None in namespaces_dict:
             default_ns_uri = namespaces_dict.pop(None)
@@ -156,7 +364,168 @@ class LXMLAdapter(XmlImplAdapter):
         # Include XMLNS namespace if it's not already defined
         if not 'xmlns' in namespaces_dict:
             namespaces_dict['xmlns'] = nodes.Node.XMLNS_URI
-        return node.xpath(xpath, namespaces=namespaces_dict)
+        return namespaces_dict
+
+    @classmethod
+    def _get_compiled_xpath(cls, xpath, namespaces_dict, namespaces_key):
+        """
+        Return a compiled XPath expression for the given query and
+        namespaces, reusing a recently compiled expression if possible.
+        """
+        key = (xpath, namespaces_key)
+        with cls._compiled_xpath_cache_lock:
+            compiled_xpath = cls._compiled_xpath_cache.pop(key, None)
+            if compiled_xpath is None:
+                compiled_xpath = etree.XPath(
+                    xpath, namespaces=namespaces_dict)
+            # (Re-)insert expression as the most recently used
+            cls._compiled_xpath_cache[key] = compiled_xpath
+            while len(cls._compiled_xpath_cache) > cls.XPATH_CACHE_SIZE:
+                cls._compiled_xpath_cache.popitem(last=False)
+        return compiled_xpath
+
+    @classmethod
+    def compile_xpath(cls, xpath, namespaces=None):
+        """
+        Return an :class:`lxml.etree.XPath` expression compiled with the
+        given namespace mappings, plus the '_' alias for a default (None)
+        namespace and the 'xmlns' prefix.
+
+        See :meth:`XmlImplAdapter.compile_xpath`.
+        """
+        namespaces_dict = cls._make_xpath_namespaces_dict(namespaces or {})
+        return cls._get_compiled_xpath(
+            xpath, namespaces_dict, frozenset(namespaces_dict.items()))
+
+    def _lookup_xpath_namespaces(self, node):
+        """
+        Return the namespace mappings in scope for XPath queries on the
+        given node, both as a dict and as a hashable key for compiled
+        expressions, computed once per element.
+        """
+        if isinstance(node, etree._ElementTree):
+            # Document node lxml.etree._ElementTree has no nsmap, lookup root
+            node = self.get_impl_root(node)
+        result = self.CACHED_XPATH_NS_DICT.get(node)
+        if result is None:
+            if node.__class__ == etree._Element:
+                nsmap = self._lookup_ns_scope(node)[0]
+            else:
+                nsmap = node.nsmap
+            namespaces_dict = self._make_xpath_namespaces_dict(nsmap)
+            result = (namespaces_dict, frozenset(namespaces_dict.items()))
+            if node.__class__ == etree._Element:
+                self.CACHED_XPATH_NS_DICT[node] = result
+        return result
+
+    def xpath_on_node(self, node, xpath, **kwargs):
+        """
+        Return result of performing the given XPath query on the given node.
+
+        All known namespace prefix-to-URI mappings in the document are
+        automatically included in the XPath invocation.
+
+        If an empty/default namespace (i.e. None) is defined, this is
+        converted to the prefix name '_' so it can be used despite empty
+        namespace prefixes being unsupported by XPath.
+
+        Queries are compiled once and reused from a cache of the
+        :attr:`XPATH_CACHE_SIZE` most recently used expressions. The query
+        may also be an expression from :meth:`compile_xpath`, in which case
+        only the namespaces given when it was compiled are available.
+        """
+        if isinstance(xpath, etree.XPath):
+            return xpath(node)
+        if 'namespaces' in kwargs:
+            if isinstance(node, etree._ElementTree):
+                nsmap = self.get_impl_root(node).nsmap.copy()
+            else:
+                nsmap = node.nsmap.copy()
+            nsmap.update(kwargs['namespaces'])
+            namespaces_dict = self._make_xpath_namespaces_dict(nsmap)
+            namespaces_key = frozenset(namespaces_dict.items())
+        else:
+            namespaces_dict, namespaces_key = \
+                self._lookup_xpath_namespaces(node)
+        compiled_xpath = self._get_compiled_xpath(
+            xpath, namespaces_dict, namespaces_key)
+        return compiled_xpath(node)
+
+    def serialize_node(self, node):
+        """
+        Serialize the root element with :func:`lxml.etree.tostring`, after
+        checking that the document content is written identically by lxml
+        and the *xml4h* writer. The checks fail, and *None* is returned, for
+        documents with:
+
+        - text following elements ("tail" text), which the *xml4h* writer
+          omits,
+        - values containing characters escaped differently by lxml, such
+          as quotes in text or newlines in attribute values,
+        - namespace declarations in attributes, or redundant namespace
+          declarations that lxml would write but *xml4h* omits,
+        - attributes of non-root elements that lxml would write in a
+          different order than the sorted order of the *xml4h* writer.
+        """
+        if (not self.NATIVE_SERIALIZATION
+                or self._has_redundant_ns_declarations
+                or node.__class__ != etree._Element
+                or node.getparent() is not None):
+            return None
+        xmlns_prefix = '{%s}' % nodes.Node.XMLNS_URI
+        parent_nsmap = {}
+        for el in node.iter():
+            el_class = el.__class__
+            if el.tail is not None and el is not node:
+                return None
+            if el_class == etree._Comment:
+                if el.text is None:
+                    return None
+                continue
+            elif el_class == etree._ProcessingInstruction:
+                if not el.text:
+                    return None
+                continue
+            elif el_class != etree._Element:
+                return None
+            text = el.text
+            if text is not None and ('"' in text or '\r' in text):
+                return None
+            nsmap = el.nsmap
+            if nodes.Node.XMLNS_URI in nsmap.values():
+                return None
+            if el is not node:
+                parent_nsmap = el.getparent().nsmap
+            # Names of namespace declarations and attributes in lxml's order
+            attr_names = []
+            for prefix, uri in nsmap.items():
+                if parent_nsmap.get(prefix) != uri:
+                    attr_names.append(
+                        prefix is None and 'xmlns' or 'xmlns:' + prefix)
+            if len(attr_names) > 1 and el is not node:
+                # Order of lxml's declarations is unknown
+                return None
+            for name, value in el.attrib.items():
+                if name == 'xmlns' or name.startswith(xmlns_prefix):
+                    return None
+                if ('\n' in value or '\t' in value or '\r' in value):
+                    return None
+                if name[0] == '{':
+                    uri, local_name = name[1:].split('}')
+                    prefixes = [p for p, u in nsmap.items() if u == uri]
+                    if len(prefixes) != 1 or prefixes[0] is None:
+                        return None
+                    name = '%s:%s' % (prefixes[0], local_name)
+                attr_names.append(name)
+            if el is not node and attr_names != sorted(attr_names):
+                return None
+        result = etree.tostring(node, encoding=unicode, with_tail=False)
+        # Check the order of the root element's declarations and attributes
+        start_tag = result[:result.index('>')]
+        attr_names = ATTR_NAME_RE.findall(start_tag)
+        if attr_names != sorted(attr_names):
+            return None
+        return result
 
     # Node implementation methods
 
@@ -237,6 +606,20 @@ class LXMLAdapter(XmlImplAdapter):
             attribs_by_qname[qname] = LXMLAttribute(
                 qname, ns_uri, prefix, local_name, v, element)
         # Include namespace declarations, which we also treat as attributes
+        for ns_attr_name, v in self._get_ns_declarations(element):
+            qname, ns_uri, prefix, local_name = self._unpack_name(
+                ns_attr_name, element)
+            attribs_by_qname[qname] = LXMLAttribute(
+                qname, ns_uri, prefix, local_name, v, element)
+        return attribs_by_qname.values()
+
+    def _get_ns_declarations(self, element):
+        """
+        :return: a list of (xmlns attribute name, URI) pairs for the
+            namespaces declared by the element, which lxml keeps in the
+            element's ``nsmap`` rather than as attributes.
+        """
+        result = []
         if element.nsmap:
             for n, v in element.nsmap.items():
                 # Only add namespace as attribute if not defined in ancestors
@@ -245,34 +628,78 @@ class LXMLAdapter(XmlImplAdapter):
                         or v == nodes.Node.XMLNS_URI):
                     continue
                 if n is None:
-                    ns_attr_name = 'xmlns'
+                    result.append(('xmlns', v))
                 else:
-                    ns_attr_name = 'xmlns:%s' % n
-                qname, ns_uri, prefix, local_name = self._unpack_name(
-                    ns_attr_name, element)
-                attribs_by_qname[qname] = LXMLAttribute(
-                    qname, ns_uri, prefix, local_name, v, element)
-        return attribs_by_qname.values()
+                    result.append(('xmlns:%s' % n, v))
+        return result
 
-    def has_node_attribute(self, element, name, ns_uri=None):
-        return name in [a.qname for a
-                        in self.get_node_attributes(element, ns_uri)]
+    def get_node_attribute_count(self, element):
+        return len(element.attrib) + len(self._get_ns_declarations(element))
 
-    def get_node_attribute_node(self, element, name, ns_uri=None):
-        for attr in self.get_node_attributes(element, ns_uri):
-            if attr.qname == name:
-                return attr
-        return None
+    def _get_attr_key(self, element, name, ns_uri=None):
+        """
+        :return: the Clark-notation name of the named attribute, which is
+            its key in the element's ``attrib`` dict, or *None* if the name
+            is that of a namespace declaration or has an unknown prefix.
+        """
+        if ns_uri is None and ':' in name:
+            prefix, name = name.split(':')
+            if prefix == 'xmlns':
+                return None
+            elif prefix == 'xml':
+                ns_uri = nodes.Node.XML_NS_URI
+            else:
+                ns_uri = self.lookup_ns_uri_by_attr_name(
+                    element, 'xmlns:%s' % prefix)
+                if ns_uri is None:
+                    return None
+        if ns_uri is None:
+            if name == 'xmlns':
+                return None
+            return name
+        elif ns_uri == nodes.Node.XMLNS_URI:
+            return None
+        return '{%s}%s' % (ns_uri, name)
 
-    def get_node_attribute_value(self, element, name, ns_uri=None):
+    def _find_attr_node(self, element, name, ns_uri=None):
+        """
+        :return: the named attribute found among all the element's
+            attributes and namespace declarations, or *None*.
+        """
         if ns_uri is not None:
             prefix = self.lookup_ns_prefix_for_uri(element, ns_uri)
             name = '%s:%s' % (prefix, name)
         for attr in self.get_node_attributes(element, ns_uri):
             if attr.qname == name:
-                return attr.value
+                return attr
         return None
 
+    def has_node_attribute(self, element, name, ns_uri=None):
+        key = self._get_attr_key(element, name, ns_uri)
+        if key is None:
+            return self._find_attr_node(element, name, ns_uri) is not None
+        return key in element.attrib
+
+    def get_node_attribute_node(self, element, name, ns_uri=None):
+        key = self._get_attr_key(element, name, ns_uri)
+        if key is None:
+            return self._find_attr_node(element, name, ns_uri)
+        value = element.get(key)
+        if value is None:
+            return None
+        qname, ns_uri, prefix, local_name = self._unpack_name(key, element)
+        return LXMLAttribute(
+            qname, ns_uri, prefix, local_name, value, element)
+
+    def get_node_attribute_value(self, element, name, ns_uri=None):
+        key = self._get_attr_key(element, name, ns_uri)
+        if key is None:
+            attr = self._find_attr_node(element, name, ns_uri)
+            if attr is None:
+                return None
+            return attr.value
+        return element.get(key)
+
     def set_node_attribute_value(self, element, name, value, ns_uri=None):
         prefix = None
         if ':' in name:
@@ -295,6 +722,18 @@ class LXMLAdapter(XmlImplAdapter):
             element.attrib[name] = value
         else:
             element.attrib[name] = value
+        # lxml also declares an automatic prefix, like 'ns0', for the
+        # namespace of an attribute if no prefix for it is in scope
+        if self._is_xmlns_attr_name(name) or name.startswith('{'):
+            self._uncache_ns_scopes(element)
+
+    def set_node_attribute_values(self, element, attrs):
+        super(LXMLAdapter, self).set_node_attribute_values(element, attrs)
+        # Namespaced attributes can declare automatic prefixes, as above
+        for name, value, ns_uri in attrs:
+            if ns_uri is not None:
+                self._uncache_ns_scopes(element)
+                break
 
     def remove_node_attribute(self, element, name, ns_uri=None):
         if ns_uri is not None:
@@ -307,6 +746,8 @@ class LXMLAdapter(XmlImplAdapter):
                 name = '{%s}%s' % (element.nsmap[prefix], name)
         if name in element.attrib:
             del(element.attrib[name])
+            if self._is_xmlns_attr_name(name):
+                self._uncache_ns_scopes(element)
 
     def add_node_child(self, parent, child, before_sibling=None):
         if isinstance(child, LXMLText):
@@ -326,8 +767,30 @@ class LXMLAdapter(XmlImplAdapter):
                 parent.insert(offset, child)
             else:
                 parent.append(child)
+            self._uncache_ns_scopes(child)
+            self._has_redundant_ns_declarations = True
             return child
 
+    def add_node_elements(self, parent, tagname, ns_uri, attr_names, rows):
+        attr_keys = self._get_new_attr_keys(attr_names)
+        if attr_keys is None:
+            return super(LXMLAdapter, self).add_node_elements(
+                parent, tagname, ns_uri, attr_names, rows)
+        # Create one element to find the tag and namespace map to reuse
+        template_element = self.new_impl_element(
+            tagname, ns_uri, parent=parent)
+        tag, nsmap = template_element.tag, template_element.nsmap
+        if ns_uri is None:
+            nsmap = None
+        sub_element = etree.SubElement
+        for values, text in rows:
+            element = sub_element(parent, tag, dict(
+                (k, v) for k, v in zip(attr_keys, values) if v is not None),
+                nsmap)
+            if text is not None:
+                element.text = text
+        self._has_redundant_ns_declarations = True
+
     def import_node(self, parent, node, original_parent=None, clone=False):
         original_node = node
         if clone:
@@ -356,6 +819,7 @@ class LXMLAdapter(XmlImplAdapter):
             parent.text = None
             return
         parent.remove(child)
+        self._uncache_ns_scopes(child)
         if destroy_node:
             child.clear()
             return None
@@ -363,12 +827,20 @@ class LXMLAdapter(XmlImplAdapter):
             return child
 
     def lookup_ns_uri_by_attr_name(self, node, name):
-        if name == 'xmlns':
-            ns_name = None
-        elif name.startswith('xmlns:'):
-            _, ns_name = name.split(':')
-        if ns_name in node.nsmap:
-            return node.nsmap[ns_name]
+        if name == 'xmlns' or name.startswith('xmlns:'):
+            if name == 'xmlns':
+                ns_name = None
+            else:
+                _, ns_name = name.split(':')
+            # Namespace declarations are resolved from the element's cached
+            # scope, which includes xmlns attributes as well as the `nsmap`
+            if node.__class__ == etree._Element:
+                nsmap, _, attr_prefix_to_uri, _ = self._lookup_ns_scope(node)
+                if ns_name in nsmap:
+                    return nsmap[ns_name]
+                return attr_prefix_to_uri.get(ns_name)
+            if hasattr(node, 'nsmap') and ns_name in node.nsmap:
+                return node.nsmap[ns_name]
         # If namespace is not in `nsmap` it may be in an XML DOM attribute
         # TODO Generalize this block
         curr_node = node
@@ -383,25 +855,30 @@ class LXMLAdapter(XmlImplAdapter):
     def lookup_ns_prefix_for_uri(self, node, uri):
         if uri == nodes.Node.XMLNS_URI:
             return 'xmlns'
+        elif uri == nodes.Node.XML_NS_URI:
+            return 'xml'
         result = None
-        if hasattr(node, 'nsmap') and uri in node.nsmap.values():
+        if node.__class__ == etree._Element:
+            (nsmap, nsmap_uri_to_prefix,
+                attr_prefix_to_uri, attr_uri_to_prefix) = \
+                self._lookup_ns_scope(node)
+            result = nsmap_uri_to_prefix.get(uri)
+            # Due to lxml's immutable nsmap, namespaces may also be declared
+            # by xmlns attributes.
+            if result is None or AUTO_NS_PREFIX_RE.match(result):
+                # We either have no namespace prefix in the nsmap, in which
+                # case we will try looking for a matching xmlns attribute, or
+                # we have a namespace prefix that was probably assigned
+                # automatically by lxml and we'd rather use a human-assigned
+                # prefix if available.
+                prefix = attr_uri_to_prefix.get(uri)
+                if prefix is not None:
+                    return prefix
+        elif hasattr(node, 'nsmap') and uri in node.nsmap.values():
             for n, v in node.nsmap.items():
                 if v == uri:
                     result = n
                     break
-        # TODO This is a slow hack necessary due to lxml's immutable nsmap
-        if result is None or re.match('ns\d', result):
-            # We either have no namespace prefix in the nsmap, in which case we
-            # will try looking for a matching xmlns attribute, or we have
-            # a namespace prefix that was probably assigned automatically by
-            # lxml and we'd rather use a human-assigned prefix if available.
-            curr_node = node  # self.get_node_parent(node)
-            while curr_node.__class__ == etree._Element:
-                for n, v in curr_node.attrib.items():
-                    if v == uri and ('{%s}' % nodes.Node.XMLNS_URI) in n:
-                        result = n.split('}')[1]
-                        return result
-                curr_node = self.get_node_parent(curr_node)
         return result
 
     def _unpack_name(self, name, node):
@@ -438,20 +915,17 @@ class LXMLAdapter(XmlImplAdapter):
         ancestor of the given node, meaning that the given node need not
         have its own attributes to apply that namespacing.
         """
-        curr_node = self.get_node_parent(node)
-        while curr_node.__class__ == etree._Element:
-            if (hasattr(curr_node, 'nsmap')
-                    and curr_node.nsmap.get(name) == value):
-                return True
-            for n, v in curr_node.attrib.items():
-                if v == value and '{%s}' % nodes.Node.XMLNS_URI in n:
-                    return True
-            curr_node = self.get_node_parent(curr_node)
-        return False
+        parent = self.get_node_parent(node)
+        if parent.__class__ != etree._Element:
+            return False
+        nsmap, _, _, attr_uri_to_prefix = self._lookup_ns_scope(parent)
+        return nsmap.get(name) == value or value in attr_uri_to_prefix
 
 
 class LXMLText(object):
 
+    __slots__ = ('_text', '_parent', '_is_cdata')
+
     def __init__(self, text, parent=None, is_cdata=False):
         self._text = text
         self._parent = parent
@@ -484,6 +958,9 @@ class LXMLText(object):
 
 class LXMLAttribute(object):
 
+    __slots__ = (
+        '_qname', '_ns_uri', '_prefix', '_local_name', '_value', '_element')
+
     def __init__(self, qname, ns_uri, prefix, local_name, value, element):
         self._qname, self._ns_uri, self._prefix, self._local_name = (
             qname, ns_uri, prefix, local_name)
@@ -513,3 +990,34 @@ class LXMLAttribute(object):
         return self._value
 
     name = tag = local_name  # Alias
+
+
+class LXMLFeedParser(FeedParser):
+
+    def __init__(self, adapter, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        super(LXMLFeedParser, self).__init__(
+            adapter, ignore_whitespace_text_nodes, parser_config)
+        # Report each completed element, so whitespace can be stripped as we
+        # go rather than in a pass over the whole document at the end
+        if ignore_whitespace_text_nodes:
+            events = ('end',)
+        else:
+            events = ()
+        self._parser = etree.XMLPullParser(events=events, ns_clean=True,
+            remove_blank_text=ignore_whitespace_text_nodes,
+            **self.parser_config._asdict())
+
+    def _strip_whitespace_text(self):
+        for event, node in self._parser.read_events():
+            self.adapter._prune_whitespace_text(node)
+
+    def _feed(self, data):
+        self._parser.feed(data)
+        self._strip_whitespace_text()
+
+    def _close(self):
+        impl_root_elem = self._parser.close()
+        self._strip_whitespace_text()
+        return self.adapter._wrap_parsed_document(
+            impl_root_elem.getroottree(), False)
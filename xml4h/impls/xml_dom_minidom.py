@@ -1,10 +1,12 @@
 from StringIO import StringIO
 
 from xml4h.impls.interface import XmlImplAdapter
+from xml4h.parser import FeedParser
 from xml4h import nodes, exceptions
 
 import xml.dom
 import xml.dom.minidom
+import xml.dom.expatbuilder
 
 
 class XmlDomImplAdapter(XmlImplAdapter):
@@ -14,6 +16,9 @@ class XmlDomImplAdapter(XmlImplAdapter):
     library implementation.
     """
 
+    # The expat parser imposes no limits on tree size
+    SUPPORTED_PARSER_OPTIONS = ('huge_tree',)
+
     @classmethod
     def is_available(cls):
         try:
@@ -23,18 +28,68 @@ class XmlDomImplAdapter(XmlImplAdapter):
             return False
 
     @classmethod
-    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True):
-        string_io = StringIO(xml_str)
-        return cls.parse_file(string_io, ignore_whitespace_text_nodes)
+    def ignore_whitespace_text_nodes(cls, wrapped_node):
+        # Walk the DOM without recursion and without wrapping nodes, and
+        # rebuild each child list once rather than removing nodes one by one
+        pending_nodes = [wrapped_node.impl_node]
+        while pending_nodes:
+            node = pending_nodes.pop()
+            children = node.childNodes
+            kept_children = []
+            for child in children:
+                if child.nodeType == xml.dom.Node.TEXT_NODE:
+                    if not child.data.strip():
+                        child.parentNode = None
+                        child.previousSibling = child.nextSibling = None
+                        continue
+                elif child.childNodes:
+                    pending_nodes.append(child)
+                kept_children.append(child)
+            if len(kept_children) == len(children):
+                continue
+            children[:] = kept_children
+            previous_child = None
+            for child in kept_children:
+                child.previousSibling = previous_child
+                if previous_child is not None:
+                    previous_child.nextSibling = child
+                previous_child = child
+            if previous_child is not None:
+                previous_child.nextSibling = None
+
+    @classmethod
+    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        if isinstance(xml_str, unicode):
+            return cls.parse_file(StringIO(xml_str),
+                ignore_whitespace_text_nodes, parser_config)
+        # Parse byte strings in place, rather than reading them in chunks
+        cls.check_parser_config(parser_config)
+        impl_doc = xml.dom.minidom.parseString(xml_str)
+        return cls._wrap_parsed_document(
+            impl_doc, ignore_whitespace_text_nodes)
 
     @classmethod
-    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True):
+    def parse_file(cls, xml_file, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        cls.check_parser_config(parser_config)
         impl_doc = xml.dom.minidom.parse(xml_file)
+        return cls._wrap_parsed_document(
+            impl_doc, ignore_whitespace_text_nodes)
+
+    @classmethod
+    def _wrap_parsed_document(cls, impl_doc, ignore_whitespace_text_nodes):
         wrapped_doc = XmlDomImplAdapter.wrap_document(impl_doc)
         if ignore_whitespace_text_nodes:
             cls.ignore_whitespace_text_nodes(wrapped_doc)
         return wrapped_doc
 
+    @classmethod
+    def feed_parser(cls, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        return XmlDomFeedParser(cls, ignore_whitespace_text_nodes,
+            parser_config)
+
     @classmethod
     def new_impl_document(cls, root_tagname, ns_uri=None,
             doctype=None, impl_features=None):
@@ -147,6 +202,11 @@ class XmlDomImplAdapter(XmlImplAdapter):
                     self.get_node_attribute_node(element, attr_name, ns_uri))
         return attr_nodes
 
+    def get_node_attribute_count(self, element):
+        if not element.attributes:
+            return 0
+        return element.attributes.length
+
     def has_node_attribute(self, element, name, ns_uri=None):
         if ns_uri is not None:
             return element.hasAttributeNS(ns_uri, name)
@@ -223,3 +283,36 @@ class XmlDomImplAdapter(XmlImplAdapter):
                         return attr.name
             curr_node = self.get_node_parent(curr_node)
         return None
+
+
+class XmlDomFeedParser(FeedParser):
+    """
+    Feed parser that drives the expat-based builder used by minidom's
+    own parse functions.
+    """
+
+    def __init__(self, adapter, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        super(XmlDomFeedParser, self).__init__(
+            adapter, ignore_whitespace_text_nodes, parser_config)
+        self._builder = xml.dom.expatbuilder.ExpatBuilderNS()
+        self._parser = self._builder.getParser()
+        # Data fed before the root element starts, which holds any DTD
+        self._prolog_chunks = []
+
+    def _feed(self, data):
+        self._parser.Parse(data, False)
+        # Capture any internal DTD subset from the data before the root
+        # element, as the builder does when it parses a file
+        if self._prolog_chunks is not None:
+            self._prolog_chunks.append(data)
+            if self._builder.document.documentElement:
+                self._builder._setup_subset(''.join(self._prolog_chunks))
+                self._prolog_chunks = None
+
+    def _close(self):
+        self._parser.Parse('', True)
+        impl_doc = self._builder.document
+        self._builder.reset()
+        return self.adapter._wrap_parsed_document(
+            impl_doc, self.ignore_whitespace_text_nodes)
@@ -4,6 +4,8 @@ import copy
 from StringIO import StringIO
 
 from xml4h.impls.interface import XmlImplAdapter
+from xml4h.impls.etree_common import EtreeAttributesMixin
+from xml4h.parser import FeedParser
 from xml4h import nodes, exceptions
 
 # Import the pure-Python ElementTree implementation, if possible
@@ -15,6 +17,12 @@ try:
 except ImportError:
     pass
 
+# Import the expat parser used by ElementTree, for incremental parsing
+try:
+    from xml.parsers import expat
+except ImportError:
+    pass
+
 # Import the C-based ElementTree implementation, if possible
 try:
     import xml.etree.cElementTree as cET
@@ -22,7 +30,19 @@ except ImportError:
     pass
 
 
-class ElementTreeAdapter(XmlImplAdapter):
+# Namespace prefixes assigned automatically by ElementTree, like 'ns0'
+AUTO_NS_PREFIX_RE = re.compile('ns\d')
+
+
+def _version_tuple(version):
+    """
+    :return: a tuple of the integer components of a version string like
+        ``'1.3.0'``, for comparison with other versions.
+    """
+    return tuple(int(n) for n in re.findall('\d+', version))
+
+
+class ElementTreeAdapter(EtreeAttributesMixin, XmlImplAdapter):
     """
     Adapter to the
     `ElementTree <http://docs.python.org/2/library/xml.etree.elementtree.html>`_
@@ -37,8 +57,13 @@ class ElementTreeAdapter(XmlImplAdapter):
 
     SUPPORTED_FEATURES = {
         'xpath': True,
+        'iterparse': True,
         }
 
+    # The expat parser imposes no limits on tree size, and ElementTree
+    # discards comments and processing instructions anyway
+    SUPPORTED_PARSER_OPTIONS = ('huge_tree', 'remove_comments', 'remove_pis')
+
     @classmethod
     def is_available(cls):
         # Is vital piece of ElementTree module available at all?
@@ -47,47 +72,141 @@ class ElementTreeAdapter(XmlImplAdapter):
         except:
             return False
         # We only support ElementTree version 1.3+
-        from distutils.version import StrictVersion
-        return StrictVersion(BaseET.VERSION) >= StrictVersion('1.3')
+        return _version_tuple(BaseET.VERSION) >= (1, 3)
+
+    @classmethod
+    def ignore_whitespace_text_nodes(cls, wrapped_node):
+        for node in wrapped_node.impl_node.iter():
+            # Skip comments and processing instructions, whose content
+            # is stored as text
+            if isinstance(node.tag, basestring):
+                cls._prune_whitespace_text(node)
+
+    @classmethod
+    def _prune_whitespace_text(cls, node):
+        """
+        Remove whitespace-only text from the given element's text and from
+        the tails of its children, which are complete once the element's
+        end tag has been parsed.
+        """
+        text = node.text
+        if text is not None and not text.strip():
+            node.text = None
+        for child in node:
+            tail = child.tail
+            if tail is not None and not tail.strip():
+                child.tail = None
 
     @classmethod
-    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True):
+    def parse_string(cls, xml_str, ignore_whitespace_text_nodes=True,
+            parser_config=None):
         return cls.parse_file(
             StringIO(xml_str),
-            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes)
+            ignore_whitespace_text_nodes=ignore_whitespace_text_nodes,
+            parser_config=parser_config)
 
     @classmethod
-    def parse_file(cls, xml_file_path, ignore_whitespace_text_nodes=True):
+    def _iterparse_with_xmlns_attrs(cls, xml_file, include_end=False):
+        """
+        Generate ('start', node) events -- and ('end', node) events if
+        requested -- while iteratively parsing the given XML file, adding
+        explicit xmlns namespace definition attributes to nodes as we go.
+        """
         # To retain explicit xmlns namespace definition attributes, we need to
         # manually add these elements to the parsed DOM as we go using
         # iterative parsing per:
         # effbot.org/zone/element-namespaces.htm#preserving-existing-namespace-attributes
         events = ('start', 'start-ns')
-        impl_root = None
+        if include_end:
+            events += ('end',)
         ns_list = []
-        for event, node in cls.ET.iterparse(xml_file_path, events):
+        for event, node in cls.ET.iterparse(xml_file, events):
             if event == 'start-ns':
                 # Track namespaces as nodes declared
                 ns_list.append(node)
+                continue
             elif event == 'start':
-                # Recognise and retain root node
-                if impl_root is None:
-                    impl_root = node
-                # Add xmlns attributes for each namespace declared
-                for ns_prefix, ns_uri in ns_list:
-                    if ns_prefix:
-                        attr_name = 'xmlns:%s' % ns_prefix
-                    else:
-                        attr_name = 'xmlns'
-                    node.set(attr_name, ns_uri)
+                cls._set_xmlns_attrs(node, ns_list)
                 # Reset namespace list now the corresponding attributes exist
                 ns_list = []
+            yield event, node
+
+    @classmethod
+    def _set_xmlns_attrs(cls, node, ns_list):
+        """
+        Add xmlns attributes to the given node for each (prefix, URI) pair
+        of the namespaces declared in its start tag.
+        """
+        for ns_prefix, ns_uri in ns_list:
+            if ns_prefix:
+                attr_name = 'xmlns:%s' % ns_prefix
+            else:
+                attr_name = 'xmlns'
+            node.set(attr_name, ns_uri)
+
+    @classmethod
+    def parse_file(cls, xml_file_path, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        cls.check_parser_config(parser_config)
+        impl_root = None
+        for event, node in cls._iterparse_with_xmlns_attrs(xml_file_path,
+                include_end=ignore_whitespace_text_nodes):
+            # Recognise and retain root node
+            if impl_root is None:
+                impl_root = node
+            # Strip whitespace as each element is completed
+            if event == 'end':
+                cls._prune_whitespace_text(node)
 
         impl_doc = cls.ET.ElementTree(impl_root)
-        wrapped_doc = cls.wrap_document(impl_doc)
-        if ignore_whitespace_text_nodes:
-            cls.ignore_whitespace_text_nodes(wrapped_doc)
-        return wrapped_doc
+        return cls.wrap_document(impl_doc)
+
+    @classmethod
+    def iterparse(cls, xml_file, tag=None, ns_uri=None,
+            ignore_whitespace_text_nodes=True, parser_config=None):
+        cls.check_parser_config(parser_config)
+        adapter = None
+        # Stack of elements that have been started but not yet ended, which
+        # are therefore the ancestors of the element most recently ended
+        open_elements = []
+        for event, node in cls._iterparse_with_xmlns_attrs(
+                xml_file, include_end=True):
+            if event == 'start':
+                if adapter is None:
+                    adapter = cls(cls.ET.ElementTree(node))
+                open_elements.append(node)
+                continue
+            open_elements.pop()
+            if ignore_whitespace_text_nodes:
+                cls._prune_whitespace_text(node)
+            if ns_uri not in (None, '*') and (
+                    adapter.get_node_namespace_uri(node) != ns_uri):
+                continue
+            if tag not in (None, '*') and (
+                    adapter.get_node_local_name(node) != tag):
+                continue
+            # The document has grown since we last looked, so forget any
+            # cached data about its structure
+            adapter.clear_caches()
+            wrapped_elem = adapter.wrap_node(
+                node, adapter.impl_document, adapter)
+            yield wrapped_elem
+            # Release the element and everything parsed before it, keeping
+            # only the (now empty) path from the root to this element
+            node.clear()
+            path_node = node
+            for ancestor in reversed(open_elements):
+                for offset, child in enumerate(ancestor):
+                    if child is path_node:
+                        break
+                del ancestor[:offset]
+                path_node = ancestor
+
+    @classmethod
+    def feed_parser(cls, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        return ElementTreeFeedParser(cls, ignore_whitespace_text_nodes,
+            parser_config)
 
     @classmethod
     def new_impl_document(cls, root_tagname, ns_uri=None, **kwargs):
@@ -101,23 +220,144 @@ class ElementTreeAdapter(XmlImplAdapter):
         doc = cls.ET.ElementTree(root_elem)
         return doc
 
+    # Set to True to verify the ancestry dict against the document after
+    # every adapter mutation, which is slow but handy for tests.
+    VERIFY_ANCESTRY_DICT = False
+
     # This method is called by interface super-class's __init__
     def clear_caches(self):
+        super(ElementTreeAdapter, self).clear_caches()
         self.CACHED_ANCESTRY_DICT = {}
+        self.CACHED_NS_SCOPE_DICT = {}
+        self._is_ancestry_dict_complete = False
 
     def _lookup_node_parent(self, node):
         """
         Return the parent of the given node, based on an internal dictionary
         mapping of child nodes to the child's parent required since
         ElementTree doesn't make info about node ancestry/parentage available.
+
+        The dictionary is built from the whole document only once, the first
+        time it is needed, and is then kept up-to-date incrementally by this
+        adapter's mutation methods. A node missing from a complete dictionary
+        has no parent, i.e. it is detached from the document.
+        """
+        if not self._is_ancestry_dict_complete:
+            with self._lock:
+                # Another thread may have built the dictionary meanwhile
+                if not self._is_ancestry_dict_complete:
+                    ancestry_dict = dict(
+                        (c, p) for p in self._impl_document.iter() for c in p)
+                    # Retain entries for detached subtrees we already know
+                    self.CACHED_ANCESTRY_DICT.update(ancestry_dict)
+                    self._is_ancestry_dict_complete = True
+        return self.CACHED_ANCESTRY_DICT.get(node)
+
+    def _index_node_ancestry(self, node, parent):
         """
-        # Basic caching of our internal ancestry dict to help performance
-        if not node in self.CACHED_ANCESTRY_DICT:
-            # Given node isn't in cached ancestry dictionary, rebuild this now
-            ancestry_dict = dict(
-                (c, p) for p in self._impl_document.getiterator() for c in p)
-            self.CACHED_ANCESTRY_DICT = ancestry_dict
-        return self.CACHED_ANCESTRY_DICT[node]
+        Record the given node as a child of the parent, along with the
+        parentage of all the node's descendants.
+        """
+        with self._lock:
+            self.CACHED_ANCESTRY_DICT[node] = parent
+            for p in node.iter():
+                for c in p:
+                    self.CACHED_ANCESTRY_DICT[c] = p
+
+    def _unindex_node_ancestry(self, node, include_descendants=False):
+        """
+        Forget the parentage of the given node and, optionally, of all its
+        descendants.
+        """
+        with self._lock:
+            self.CACHED_ANCESTRY_DICT.pop(node, None)
+            if include_descendants:
+                for p in node.iter():
+                    for c in p:
+                        self.CACHED_ANCESTRY_DICT.pop(c, None)
+
+    def _verify_ancestry_dict(self):
+        """
+        Raise an exception if the internal ancestry dictionary disagrees with
+        the actual structure of the document. This is a no-op unless
+        :attr:`VERIFY_ANCESTRY_DICT` is set.
+        """
+        if not (self.VERIFY_ANCESTRY_DICT and self._is_ancestry_dict_complete):
+            return
+        expected_dict = dict(
+            (c, p) for p in self._impl_document.iter() for c in p)
+        doc_nodes = set(expected_dict.keys())
+        doc_nodes.add(self._impl_document.getroot())
+        for c, p in expected_dict.items():
+            if self.CACHED_ANCESTRY_DICT.get(c) is not p:
+                raise exceptions.Xml4hImplementationBug(
+                    'Ancestry dict has wrong parent for node %s' % c)
+        for c, p in self.CACHED_ANCESTRY_DICT.items():
+            if c not in doc_nodes and p in doc_nodes:
+                raise exceptions.Xml4hImplementationBug(
+                    'Ancestry dict has stale parent for detached node %s' % c)
+
+    def _is_xmlns_attr_name(self, name):
+        """
+        Return True if the given attribute name declares a namespace.
+        """
+        return (name == 'xmlns' or name.startswith('xmlns:')
+            or name.startswith('{%s}' % nodes.Node.XMLNS_URI))
+
+    def _lookup_ns_scope(self, node):
+        """
+        Return a pair of dictionaries mapping prefix-to-URI and URI-to-prefix
+        for the namespaces declared by xmlns attributes of the given element
+        and its ancestors, where the nearest declaration wins. The default
+        namespace is mapped from the prefix None.
+
+        Scopes are computed once per element and cached, and an element that
+        declares no namespaces shares the scope dictionaries of its parent.
+        """
+        scope = self.CACHED_NS_SCOPE_DICT.get(node)
+        if scope is not None:
+            return scope
+        # Find nearest ancestor with a cached scope, if any
+        uncached_nodes = []
+        curr_node = node
+        while scope is None and self._is_node_an_element(curr_node):
+            uncached_nodes.append(curr_node)
+            curr_node = self.get_node_parent(curr_node)
+            scope = self.CACHED_NS_SCOPE_DICT.get(curr_node)
+        if scope is None:
+            scope = ({}, {})
+        # Compute and cache scopes from the outermost element inwards
+        for curr_node in reversed(uncached_nodes):
+            declarations = []
+            for n, v in curr_node.attrib.items():
+                if n == 'xmlns':
+                    declarations.append((None, v))
+                elif n.startswith('xmlns:'):
+                    declarations.append((n.split(':')[1], v))
+                elif n.startswith('{%s}' % nodes.Node.XMLNS_URI):
+                    declarations.append((n.split('}')[1], v))
+            if declarations:
+                prefix_to_uri, uri_to_prefix = dict(scope[0]), dict(scope[1])
+                element_uri_to_prefix = {}
+                for prefix, uri in declarations:
+                    prefix_to_uri[prefix] = uri
+                    if prefix is not None:
+                        element_uri_to_prefix.setdefault(uri, prefix)
+                uri_to_prefix.update(element_uri_to_prefix)
+                scope = (prefix_to_uri, uri_to_prefix)
+            self.CACHED_NS_SCOPE_DICT[curr_node] = scope
+        return scope
+
+    def _uncache_ns_scopes(self, node):
+        """
+        Forget the cached namespace scopes of the given element and its
+        descendants, which become outdated if namespaces are (re)declared or
+        the element is moved.
+        """
+        if self.CACHED_NS_SCOPE_DICT:
+            with self._lock:
+                for n in node.iter():
+                    self.CACHED_NS_SCOPE_DICT.pop(n, None)
 
     def _is_node_an_element(self, node):
         """
@@ -178,24 +418,75 @@ class ElementTreeAdapter(XmlImplAdapter):
         return ElementTreeText(text, is_cdata=True)
 
     def find_node_elements(self, node, name='*', ns_uri='*'):
-        # TODO Any proper way to find namespaced elements by name?
-        name_match_nodes = node.getiterator()
-        # Filter nodes by name and ns_uri if necessary
-        results = []
-        for n in name_match_nodes:
+        return list(self.iter_node_elements(node, name=name, ns_uri=ns_uri))
+    find_node_elements.__doc__ = XmlImplAdapter.find_node_elements.__doc__
+
+    def iter_node_elements(self, node, name='*', ns_uri='*'):
+        if name != '*' and ns_uri != '*' and not ':' in name:
+            # Let ElementTree find elements natively by Clark-notation tag
+            for n in node.iter('{%s}%s' % (ns_uri, name)):
+                if n is not node:
+                    yield n
+            return
+        # ElementTree cannot match wildcards natively, so filter elements by
+        # comparing Clark-notation tags with precomputed prefix and suffix
+        ns_uri_prefix = '{%s}' % ns_uri
+        name_suffix = '}%s' % name
+        for n in node.iter():
             # Ignore the current node
-            if n == node:
+            if n is node:
                 continue
+            tag = n.tag
             # Ignore non-Elements
-            if not isinstance(n.tag, basestring):
-                continue
-            if ns_uri != '*' and self.get_node_namespace_uri(n) != ns_uri:
-                continue
-            if name != '*' and self.get_node_local_name(n) != name:
+            if not isinstance(tag, basestring):
                 continue
-            results.append(n)
-        return results
-    find_node_elements.__doc__ = XmlImplAdapter.find_node_elements.__doc__
+            if tag[:1] == '{':
+                if ns_uri != '*' and not tag.startswith(ns_uri_prefix):
+                    continue
+                if name != '*' and not tag.endswith(name_suffix):
+                    continue
+            else:
+                # Local name is the whole tag, which may have a prefix
+                if name != '*' and tag != name:
+                    continue
+                if (ns_uri != '*'
+                        and self.get_node_namespace_uri(n) != ns_uri):
+                    continue
+            yield n
+    iter_node_elements.__doc__ = XmlImplAdapter.iter_node_elements.__doc__
+
+    @classmethod
+    def _make_xpath_namespaces_dict(cls, namespaces):
+        """
+        Return a copy of the given prefix-to-URI mappings suitable for use
+        in XPath queries.
+
+        If an empty/default namespace (i.e. None) is defined, this is
+        converted to the prefix name '_' so it can be used despite empty
+        namespace prefixes being unsupported by XPath.
+        """
+        namespaces_dict = dict(namespaces)
+        # Empty namespace prefix is not supported, convert to '_' prefix
+        if None in namespaces_dict:
+            default_ns_uri = namespaces_dict.pop(None)
+            namespaces_dict['_'] = default_ns_uri
+        # Include XMLNS namespace if it's not already defined
+        if not 'xmlns' in namespaces_dict:
+            namespaces_dict['xmlns'] = nodes.Node.XMLNS_URI
+        return namespaces_dict
+
+    @classmethod
+    def compile_xpath(cls, xpath, namespaces=None):
+        """
+        Return an :class:`ETXPath` query with the given namespace mappings
+        precomputed, plus the '_' alias for a default (None) namespace and
+        the 'xmlns' prefix. ElementTree compiles and caches the query
+        itself when it is first used.
+
+        See :meth:`XmlImplAdapter.compile_xpath`.
+        """
+        return ETXPath(
+            xpath, cls._make_xpath_namespaces_dict(namespaces or {}))
 
     def xpath_on_node(self, node, xpath, **kwargs):
         """
@@ -207,24 +498,20 @@ class ElementTreeAdapter(XmlImplAdapter):
         If an empty/default namespace (i.e. None) is defined, this is
         converted to the prefix name '_' so it can be used despite empty
         namespace prefixes being unsupported by XPath.
+
+        The query may also be an :class:`ETXPath` from :meth:`compile_xpath`.
         """
-        namespaces_dict = {}
-        if 'namespaces' in kwargs:
-            namespaces_dict.update(kwargs['namespaces'])
-        # Empty namespace prefix is not supported, convert to '_' prefix
-        if None in namespaces_dict:
-            default_ns_uri = namespaces_dict.pop(None)
-            namespaces_dict['_'] = default_ns_uri
+        if isinstance(xpath, ETXPath):
+            namespaces_dict = xpath.namespaces
+            xpath = xpath.path
+        else:
+            namespaces_dict = self._make_xpath_namespaces_dict(
+                kwargs.get('namespaces', {}))
         # If no default namespace URI defined, use root's namespace (if any)
         if not '_' in namespaces_dict:
-            root = self.get_impl_root(node)
-            qname, ns_uri, prefix, local_name = self._unpack_name(
-                root.tag, root)
+            ns_uri = self.get_node_namespace_uri(self.get_impl_root(node))
             if ns_uri:
-                namespaces_dict['_'] = ns_uri
-        # Include XMLNS namespace if it's not already defined
-        if not 'xmlns' in namespaces_dict:
-            namespaces_dict['xmlns'] = nodes.Node.XMLNS_URI
+                namespaces_dict = dict(namespaces_dict, _=ns_uri)
         return node.findall(xpath, namespaces_dict)
 
     # Node implementation methods
@@ -334,30 +621,71 @@ class ElementTreeAdapter(XmlImplAdapter):
                 qname, ns_uri, prefix, local_name, v, element)
         return attribs_by_qname.values()
 
+    def get_node_attribute_count(self, element):
+        return len(element.attrib)
+
+    def _find_attr_key(self, element, name, ns_uri=None):
+        """
+        :return: the key of the named attribute in the element's ``attrib``
+            dict, or *None* if the element has no such attribute.
+
+        Looks up the attribute directly by its Clark-notation name, rather
+        than unpacking the names of all the element's attributes.
+        """
+        if ns_uri is None and ':' in name:
+            prefix, name = name.split(':')
+            if prefix == 'xmlns':
+                ns_uri = nodes.Node.XMLNS_URI
+            elif prefix == 'xml':
+                ns_uri = nodes.Node.XML_NS_URI
+            else:
+                ns_uri = self.lookup_ns_uri_by_attr_name(
+                    element, 'xmlns:%s' % prefix)
+                if ns_uri is None:
+                    return None
+        attrib = element.attrib
+        if ns_uri is None:
+            key = name
+        elif ns_uri == nodes.Node.XMLNS_URI:
+            # Parsed namespace declarations are stored by prefixed name, but
+            # those set later are stored by Clark-notation name
+            if name == 'xmlns':
+                key = name
+            else:
+                key = 'xmlns:%s' % name
+                if key not in attrib:
+                    key = '{%s}%s' % (ns_uri, name)
+        else:
+            key = '{%s}%s' % (ns_uri, name)
+        if key in attrib:
+            return key
+        return None
+
     def has_node_attribute(self, element, name, ns_uri=None):
-        return name in [a.qname for a
-                        in self.get_node_attributes(element, ns_uri)]
+        return self._find_attr_key(element, name, ns_uri) is not None
 
     def get_node_attribute_node(self, element, name, ns_uri=None):
-        for attr in self.get_node_attributes(element, ns_uri):
-            if attr.qname == name:
-                return attr
-        return None
+        key = self._find_attr_key(element, name, ns_uri)
+        if key is None:
+            return None
+        qname, ns_uri, prefix, local_name = self._unpack_name(key, element)
+        return ETAttribute(
+            qname, ns_uri, prefix, local_name, element.attrib[key], element)
 
     def get_node_attribute_value(self, element, name, ns_uri=None):
-        if ns_uri is not None:
-            prefix = self.lookup_ns_prefix_for_uri(element, ns_uri)
-            name = '%s:%s' % (prefix, name)
-        for attr in self.get_node_attributes(element, ns_uri):
-            if attr.qname == name:
-                return attr.value
-        return None
+        key = self._find_attr_key(element, name, ns_uri)
+        if key is None:
+            return None
+        return element.attrib[key]
 
     def set_node_attribute_value(self, element, name, value, ns_uri=None):
         prefix = None
         if ':' in name:
             prefix, name = name.split(':')
-        if ns_uri is None and prefix is not None:
+        if ns_uri is None and prefix == 'xmlns':
+            # The xmlns prefix is never declared
+            ns_uri = nodes.Node.XMLNS_URI
+        elif ns_uri is None and prefix is not None:
             ns_uri = self.lookup_ns_uri_by_attr_name(element, prefix)
         if ns_uri is not None:
             name = '{%s}%s' % (ns_uri, name)
@@ -369,6 +697,8 @@ class ElementTreeAdapter(XmlImplAdapter):
             element.attrib[name] = value
         else:
             element.attrib[name] = value
+        if self._is_xmlns_attr_name(name):
+            self._uncache_ns_scopes(element)
 
     def remove_node_attribute(self, element, name, ns_uri=None):
         if ns_uri is not None:
@@ -381,6 +711,8 @@ class ElementTreeAdapter(XmlImplAdapter):
                 name = '{%s}%s' % (ns_uri, local_name)
         if name in element.attrib:
             del(element.attrib[name])
+            if self._is_xmlns_attr_name(name):
+                self._uncache_ns_scopes(element)
 
     def add_node_child(self, parent, child, before_sibling=None):
         if isinstance(child, ElementTreeText):
@@ -389,7 +721,7 @@ class ElementTreeAdapter(XmlImplAdapter):
                 parent.text = parent.text + child.text
             else:
                 parent.text = child.text
-            self.CACHED_ANCESTRY_DICT[child] = parent
+            child._parent = parent
             return None
         else:
             if before_sibling is not None:
@@ -401,9 +733,30 @@ class ElementTreeAdapter(XmlImplAdapter):
                 parent.insert(offset, child)
             else:
                 parent.append(child)
-            self.CACHED_ANCESTRY_DICT[child] = parent
+            self._index_node_ancestry(child, parent)
+            self._uncache_ns_scopes(child)
+            self._verify_ancestry_dict()
             return child
 
+    def add_node_elements(self, parent, tagname, ns_uri, attr_names, rows):
+        attr_keys = self._get_new_attr_keys(attr_names)
+        if attr_keys is None:
+            return super(ElementTreeAdapter, self).add_node_elements(
+                parent, tagname, ns_uri, attr_names, rows)
+        tag = self.new_impl_element(tagname, ns_uri).tag
+        sub_element = self.ET.SubElement
+        new_elements = []
+        for values, text in rows:
+            element = sub_element(parent, tag, dict(
+                (k, v) for k, v in zip(attr_keys, values) if v is not None))
+            if text is not None:
+                element.text = text
+            new_elements.append(element)
+        with self._lock:
+            self.CACHED_ANCESTRY_DICT.update(
+                (element, parent) for element in new_elements)
+        self._verify_ancestry_dict()
+
     def import_node(self, parent, node, original_parent=None, clone=False):
         original_node = node
         # We always clone for (c)ElementTree adapter so we can remove original
@@ -424,6 +777,8 @@ class ElementTreeAdapter(XmlImplAdapter):
                         original_parent.text.replace(original_node.text, '', 1)
             else:
                 original_parent.remove(original_node)
+                self._unindex_node_ancestry(original_node)
+                self._verify_ancestry_dict()
 
     def clone_node(self, node, deep=True):
         if deep:
@@ -436,6 +791,9 @@ class ElementTreeAdapter(XmlImplAdapter):
             child._parent.text = None
             return
         parent.remove(child)
+        self._unindex_node_ancestry(child, include_descendants=destroy_node)
+        self._uncache_ns_scopes(child)
+        self._verify_ancestry_dict()
         if destroy_node:
             child.clear()
             return None
@@ -443,6 +801,12 @@ class ElementTreeAdapter(XmlImplAdapter):
             return child
 
     def lookup_ns_uri_by_attr_name(self, node, name):
+        # Namespace declarations are resolved from the element's cached scope
+        if self._is_node_an_element(node):
+            if name == 'xmlns':
+                return self._lookup_ns_scope(node)[0].get(None)
+            elif name.startswith('xmlns:'):
+                return self._lookup_ns_scope(node)[0].get(name.split(':')[1])
         curr_node = node
         while (curr_node is not None
                 and not isinstance(curr_node, BaseET.ElementTree)):
@@ -456,28 +820,22 @@ class ElementTreeAdapter(XmlImplAdapter):
         if uri == nodes.Node.XMLNS_URI:
             return 'xmlns'
         result = None
-        # Lookup namespace URI in ET's awful global namespace/prefix registry
-        if hasattr(BaseET, '_namespace_map') and uri in BaseET._namespace_map:
-            result = BaseET._namespace_map[uri]
+        # Lookup namespace URI in ET's awful global namespace/prefix registry,
+        # in a single step since other threads may register namespaces
+        if hasattr(BaseET, '_namespace_map'):
+            result = BaseET._namespace_map.get(uri)
             if result == '':
                 result = None
-        if result is None or re.match('ns\d', result):
+        if result is None or AUTO_NS_PREFIX_RE.match(result):
             # We either have no namespace prefix in the global mapping, in
             # which case we will try looking for a matching xmlns attribute,
             # or we have a namespace prefix that was probably assigned
             # automatically by ElementTree and we'd rather use a
             # human-assigned prefix if available.
-            curr_node = node
-            while self._is_node_an_element(curr_node):
-                for n, v in curr_node.attrib.items():
-                    if v == uri:
-                        if n.startswith('xmlns:'):
-                            result = n.split(':')[1]
-                            return result
-                        elif n.startswith('{%s}' % nodes.Node.XMLNS_URI):
-                            result = n.split('}')[1]
-                            return result
-                curr_node = self.get_node_parent(curr_node)
+            if self._is_node_an_element(node):
+                prefix = self._lookup_ns_scope(node)[1].get(uri)
+                if prefix is not None:
+                    return prefix
         return result
 
     def _unpack_name(self, name, node):
@@ -509,8 +867,23 @@ class ElementTreeAdapter(XmlImplAdapter):
         return (qname, ns_uri, prefix, local_name)
 
 
+class ETXPath(object):
+    """
+    XPath query for ElementTree with precomputed namespace mappings, as
+    returned by :meth:`ElementTreeAdapter.compile_xpath`.
+    """
+
+    __slots__ = ('path', 'namespaces')
+
+    def __init__(self, path, namespaces):
+        self.path = path
+        self.namespaces = namespaces
+
+
 class ElementTreeText(object):
 
+    __slots__ = ('_text', '_parent', '_is_cdata')
+
     def __init__(self, text, parent=None, is_cdata=False):
         self._text = text
         self._parent = parent
@@ -543,6 +916,9 @@ class ElementTreeText(object):
 
 class ETAttribute(object):
 
+    __slots__ = (
+        '_qname', '_ns_uri', '_prefix', '_local_name', '_value', '_element')
+
     def __init__(self, qname, ns_uri, prefix, local_name, value, element):
         self._qname, self._ns_uri, self._prefix, self._local_name = (
             qname, ns_uri, prefix, local_name)
@@ -574,6 +950,83 @@ class ETAttribute(object):
     name = tag = local_name  # Alias
 
 
+def _fix_text(text):
+    """
+    :return: the given text from the expat parser as a byte string if it is
+        plain ASCII, as ElementTree's own parser returns it.
+    """
+    try:
+        return text.encode('ascii')
+    except UnicodeError:
+        return text
+
+
+class ElementTreeFeedParser(FeedParser):
+    """
+    Feed parser that drives an expat parser incrementally, building elements
+    with the ElementTree implementation's tree builder. ElementTree's own
+    XMLParser does not report the namespaces declared in each start tag,
+    which are kept as xmlns attributes.
+    """
+
+    def __init__(self, adapter, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        super(ElementTreeFeedParser, self).__init__(
+            adapter, ignore_whitespace_text_nodes, parser_config)
+        self._builder = adapter.ET.TreeBuilder()
+        self._ns_list = []
+        self._parser = expat.ParserCreate(None, '}')
+        self._parser.buffer_text = 1
+        self._parser.specified_attributes = 1
+        self._parser.StartNamespaceDeclHandler = self._start_ns
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._data
+
+    def _fix_name(self, name):
+        # Expat separates a namespace URI from a local name with '}'
+        if '}' in name:
+            name = '{' + name
+        return _fix_text(name)
+
+    def _start_ns(self, prefix, uri):
+        self._ns_list.append((_fix_text(prefix or ''), _fix_text(uri or '')))
+
+    def _start(self, tag, attrs):
+        attrib = {}
+        for name, value in attrs.items():
+            attrib[self._fix_name(name)] = _fix_text(value)
+        node = self._builder.start(self._fix_name(tag), attrib)
+        self.adapter._set_xmlns_attrs(node, self._ns_list)
+        self._ns_list = []
+
+    def _data(self, text):
+        self._builder.data(_fix_text(text))
+
+    def _end(self, tag):
+        node = self._builder.end(self._fix_name(tag))
+        if self.ignore_whitespace_text_nodes:
+            self.adapter._prune_whitespace_text(node)
+
+    def _parse(self, data, is_final):
+        try:
+            self._parser.Parse(data, is_final)
+        except expat.ExpatError, ex:
+            error = self.adapter.ET.ParseError(ex)
+            error.code = ex.code
+            error.position = (ex.lineno, ex.offset)
+            raise error
+
+    def _feed(self, data):
+        if data:
+            self._parse(data, False)
+
+    def _close(self):
+        self._parse('', True)
+        impl_doc = self.adapter.ET.ElementTree(self._builder.close())
+        return self.adapter.wrap_document(impl_doc)
+
+
 class cElementTreeAdapter(ElementTreeAdapter):
     """
     Adapter to the C-based implementation of the
@@ -588,5 +1041,4 @@ class cElementTreeAdapter(ElementTreeAdapter):
         if not super(cElementTreeAdapter, cls).is_available():
             return False
         # We only support cElementTree version 1.0.6+
-        from distutils.version import StrictVersion
-        return StrictVersion(cls.ET.VERSION) >= StrictVersion('1.0.6')
+        return _version_tuple(cls.ET.VERSION) >= (1, 0, 6)
@@ -24,9 +24,16 @@ class Node(object):
     node in the underlying XML implementation.
     """
 
+    # Avoid a per-instance __dict__, since documents can have millions of
+    # wrapped nodes. The __weakref__ slot allows wrappers to be cached.
+    __slots__ = ('_impl_node', '_adapter', '__weakref__')
+
     XMLNS_URI = 'http://www.w3.org/2000/xmlns/'
     """URI constant for XMLNS"""
 
+    XML_NS_URI = 'http://www.w3.org/XML/1998/namespace'
+    """URI constant for the ``xml`` prefix, which is never declared"""
+
     def __init__(self, node, adapter):
         """
         Construct an object that represents and wraps a DOM node in the
@@ -115,7 +122,9 @@ class Node(object):
         """
         if self.is_document:
             return self
-        return self.adapter.wrap_document(self.adapter.impl_document)
+        return self.adapter.wrap_node(
+            self.adapter.impl_document, self.adapter.impl_document,
+            self.adapter)
 
     @property
     def root(self):
@@ -232,15 +241,22 @@ class Node(object):
         """
         return self.is_type(NOTATION_NODE)
 
+    def _iter_wrapped_nodes(self, impl_nodes):
+        """
+        Generate *xml4h* wrapper nodes for underlying implementation nodes,
+        wrapping each node only when it is requested.
+        """
+        adapter = self.adapter
+        impl_document = adapter.impl_document
+        for n in impl_nodes:
+            yield adapter.wrap_node(n, impl_document, adapter)
+
     def _convert_nodelist(self, impl_nodelist):
         """
         Convert a list of underlying implementation nodes into a list of
         *xml4h* wrapper nodes.
         """
-        nodelist = [
-            self.adapter.wrap_node(n, self.adapter.impl_document, self.adapter)
-            for n in impl_nodelist]
-        return NodeList(nodelist)
+        return NodeList(self._iter_wrapped_nodes(impl_nodelist))
 
     @property
     def parent(self):
@@ -257,12 +273,18 @@ class Node(object):
         :return: the ancestors of this node in a list ordered by proximity to
             this node, that is: parent, grandparent, great-grandparent etc.
         """
-        ancestors = []
+        return NodeList(self.iter_ancestors())
+
+    def iter_ancestors(self):
+        """
+        :return: a generator of the ancestors of this node ordered by
+            proximity to this node, like :attr:`ancestors` but wrapping
+            each ancestor only when it is requested.
+        """
         p = self.parent
         while p:
-            ancestors.append(p)
+            yield p
             p = p.parent
-        return NodeList(ancestors)
 
     @property
     def children(self):
@@ -272,16 +294,32 @@ class Node(object):
         impl_nodelist = self.adapter.get_node_children(self.impl_node)
         return self._convert_nodelist(impl_nodelist)
 
+    def iter_children(self):
+        """
+        :return: a generator of this node's child nodes, like
+            :attr:`children` but wrapping each child only when it is
+            requested.
+        """
+        return self._iter_wrapped_nodes(
+            self.adapter.get_node_children(self.impl_node))
+
     def child(self, local_name=None, name=None, ns_uri=None, node_type=None,
             filter_fn=None):
         """
         :return: the first child node matching the given constraints, or \
                  *None* if there are no matching child nodes.
 
-        Delegates to :meth:`NodeList.filter`.
+        Accepts the same constraints as :meth:`NodeList.filter`, but stops
+        looking at child nodes as soon as one matches.
         """
-        return self.children(name=name, local_name=local_name, ns_uri=ns_uri,
-            node_type=node_type, filter_fn=filter_fn, first_only=True)
+        if filter_fn is None:
+            filter_fn = _build_filter_fn(
+                local_name=local_name, name=name, ns_uri=ns_uri,
+                node_type=node_type)
+        for n in self.iter_children():
+            if filter_fn(n):
+                return n
+        return None
 
     @property
     def attributes(self):
@@ -307,13 +345,21 @@ class Node(object):
         :return: a list of this node's siblings that occur *before* this
             node in the DOM.
         """
+        return NodeList(self.iter_siblings_before())
+
+    def iter_siblings_before(self):
+        """
+        :return: a generator of this node's siblings that occur *before*
+            this node in the DOM, like :attr:`siblings_before` but wrapping
+            each sibling only when it is requested.
+        """
         impl_nodelist = self.adapter.get_node_children(self.parent.impl_node)
         before_nodelist = []
         for n in impl_nodelist:
             if n == self.impl_node:
                 break
             before_nodelist.append(n)
-        return self._convert_nodelist(before_nodelist)
+        return self._iter_wrapped_nodes(before_nodelist)
 
     @property
     def siblings_after(self):
@@ -321,6 +367,14 @@ class Node(object):
         :return: a list of this node's siblings that occur *after* this
             node in the DOM.
         """
+        return NodeList(self.iter_siblings_after())
+
+    def iter_siblings_after(self):
+        """
+        :return: a generator of this node's siblings that occur *after*
+            this node in the DOM, like :attr:`siblings_after` but wrapping
+            each sibling only when it is requested.
+        """
         impl_nodelist = self.adapter.get_node_children(self.parent.impl_node)
         after_nodelist = []
         is_after_myself = False
@@ -329,7 +383,7 @@ class Node(object):
                 after_nodelist.append(n)
             elif n == self.impl_node:
                 is_after_myself = True
-        return self._convert_nodelist(after_nodelist)
+        return self._iter_wrapped_nodes(after_nodelist)
 
     @property
     def namespace_uri(self):
@@ -353,6 +407,7 @@ class Node(object):
         removed_child = self.adapter.remove_node_child(
             self.adapter.get_node_parent(self.impl_node), self.impl_node,
             destroy_node=destroy)
+        self.adapter.uncache_wrapped_node(self.impl_node)
         if removed_child is not None:
             return self.adapter.wrap_node(removed_child, None, self.adapter)
         else:
@@ -411,20 +466,45 @@ class Node(object):
         :returns: a list of :class:`Element` nodes matching any given
             constraints, or a single node if ``first_only=True``.
         """
+        if first_only:
+            # Stop searching as soon as the first result is found
+            for n in self.iter_find(name=name, ns_uri=ns_uri):
+                return n
+            return None
         if name is None:
             name = '*'  # Match all element names
         if ns_uri is None:
             ns_uri = '*'  # Match all namespaces
         impl_nodelist = self.adapter.find_node_elements(
             self.impl_node, name=name, ns_uri=ns_uri)
-        if first_only:
-            if impl_nodelist:
-                return self.adapter.wrap_node(
-                    impl_nodelist[0], self.adapter.impl_document, self.adapter)
-            else:
-                return None
         return self._convert_nodelist(impl_nodelist)
 
+    def iter_find(self, name=None, ns_uri=None):
+        """
+        Find :class:`Element` node descendants of this node like
+        :meth:`find`, but return a generator that finds and wraps each
+        result only when it is requested. This is the cheapest way to
+        search large documents if you may not need all the results.
+
+        The document must not be modified while the generator is in use.
+
+        :param name: limit results to elements with this name.
+            If *None* or ``'*'`` all element names are matched.
+        :type name: string or None
+        :param ns_uri: limit results to elements within this namespace URI.
+            If *None* all elements are matched, regardless of namespace.
+        :type ns_uri: string or None
+
+        :returns: a generator of :class:`Element` nodes matching any given
+            constraints.
+        """
+        if name is None:
+            name = '*'  # Match all element names
+        if ns_uri is None:
+            ns_uri = '*'  # Match all namespaces
+        return self._iter_wrapped_nodes(self.adapter.iter_node_elements(
+            self.impl_node, name=name, ns_uri=ns_uri))
+
     def find_first(self, name=None, ns_uri=None):
         """
         Find the first :class:`Element` node descendant of this node that
@@ -491,6 +571,22 @@ class Node(object):
             newline=newline, omit_declaration=omit_declaration,
             node_depth=node_depth, quote_char=quote_char)
 
+    def iter_write(self, encoding='utf-8', indent=0, newline='',
+            omit_declaration=False, node_depth=0, quote_char='"'):
+        """
+        Serialize this node and its descendants to text, generating the
+        output in chunks so other work can be done between chunks.
+
+        The arguments are the same as for :meth:`write`, without *writer*.
+
+        Delegates to :func:`xml4h.writer.iter_write_node` applied to this
+        node.
+        """
+        return xml4h.iter_write_node(self,
+            encoding=encoding, indent=indent,
+            newline=newline, omit_declaration=omit_declaration,
+            node_depth=node_depth, quote_char=quote_char)
+
     def write_doc(self, *args, **kwargs):
         """
         Serialize to text the document containing this node, writing
@@ -525,6 +621,8 @@ class NodeAttrAndChildElementLookupsMixin(object):
     reference, and child elements via class attribute reference.
     """
 
+    __slots__ = ()
+
     def __getitem__(self, attr_name):
         """
         Retrieve this node's attribute value by name using dict-style keyword
@@ -584,6 +682,8 @@ class XPathMixin(object):
     Provide :meth:`xpath` method to nodes that support XPath searching.
     """
 
+    __slots__ = ()
+
     def _maybe_wrap_node(self, node):
         # Don't try and wrap base types (e.g. attribute values or node text)
         if isinstance(node, (basestring, int, long, float)):
@@ -615,6 +715,7 @@ class Document(Node, NodeAttrAndChildElementLookupsMixin, XPathMixin):
     """
     Node representing an entire XML document.
     """
+    __slots__ = ()
     _node_type = DOCUMENT_NODE
     # TODO: doc_type, document_element
 
@@ -623,6 +724,7 @@ class DocumentType(Node):
     """
     Node representing the type of an XML document.
     """
+    __slots__ = ()
     _node_type = DOCUMENT_TYPE_NODE
     # TODO: name, entities, notations, public_id, system_id
 
@@ -631,6 +733,7 @@ class DocumentFragment(Node):
     """
     Node representing an XML document fragment.
     """
+    __slots__ = ()
     _node_type = DOCUMENT_FRAGMENT_NODE
     # TODO
 
@@ -639,6 +742,7 @@ class Notation(Node):
     """
     Node representing a notation in an XML document.
     """
+    __slots__ = ()
     _node_type = NOTATION_NODE
     # TODO: public_id, system_id
 
@@ -647,6 +751,7 @@ class Entity(Node):
     """
     Node representing an entity in an XML document.
     """
+    __slots__ = ()
     _node_type = ENTITY_NODE
     # TODO: public_id, system_id
 
@@ -659,6 +764,7 @@ class EntityReference(Node):
     """
     Node representing an entity reference in an XML document.
     """
+    __slots__ = ()
     _node_type = ENTITY_REFERENCE_NODE
     # TODO
 
@@ -669,6 +775,8 @@ class NameValueNodeMixin(Node):
     name may also be composed of "prefix" and "local" components.
     """
 
+    __slots__ = ()
+
     def __unicode__(self):
         return u'<%s.%s: "%s">' % (
             self.__class__.__module__, self.__class__.__name__,
@@ -726,6 +834,7 @@ class Text(NameValueNodeMixin):
     """
     Node representing text content in an XML document.
     """
+    __slots__ = ()
     _node_type = TEXT_NODE
 
 
@@ -733,6 +842,7 @@ class CDATA(NameValueNodeMixin):
     """
     Node representing character data in an XML document.
     """
+    __slots__ = ()
     _node_type = CDATA_NODE
 
 
@@ -740,6 +850,7 @@ class Comment(NameValueNodeMixin):
     """
     Node representing a comment in an XML document.
     """
+    __slots__ = ()
     _node_type = COMMENT_NODE
 
 
@@ -748,6 +859,7 @@ class Attribute(NameValueNodeMixin):
     Node representing an attribute of a :class:`Document` or
     :class:`Element` node.
     """
+    __slots__ = ()
     _node_type = ATTRIBUTE_NODE
 
 
@@ -755,6 +867,7 @@ class ProcessingInstruction(NameValueNodeMixin):
     """
     Node representing a processing instruction in an XML document.
     """
+    __slots__ = ()
     _node_type = PROCESSING_INSTRUCTION_NODE
 
     target = NameValueNodeMixin.name
@@ -768,6 +881,7 @@ class Element(NameValueNodeMixin,
     Node representing an element in an XML document, with support for
     manipulating and adding content to the element.
     """
+    __slots__ = ()
     _node_type = ELEMENT_NODE
 
     @property
@@ -801,37 +915,48 @@ class Element(NameValueNodeMixin,
                 raise xml4h.exceptions.IncorrectArgumentTypeException(
                     attr_obj, [dict, list, tuple])
 
+        adapter = self.adapter
         # Always process 'xmlns' namespace definitions first, in case other
         # attributes belong to a newly-defined namespace
-        def _xmlns_first(x, y):
-            nx, ny = x[0], y[0]
-            if nx.startswith('xmlns') and ny.startswith('xmlns'):
-                return cmp(nx, ny)
-            elif nx.startswith('xmlns'):
-                return -1
-            elif ny.startswith('xmlns'):
-                return 1
-            else:
-                return cmp(nx, ny)
-        attr_list = sorted(attr_dict.items(), cmp=_xmlns_first)
-        # Add attributes
+        attr_list = sorted(attr_dict.items(),
+            key=lambda item: (not item[0].startswith('xmlns'), item[0]))
+        # Namespace URIs of the prefixes used so far, and the namespace URI
+        # of the element, which only change when namespaces are declared
+        prefix_ns_uris = {}
+        element_ns_uri = None
+        # Attributes other than namespace declarations, to set in one step
+        new_attrs = []
         for attr_name, v in attr_list:
-            prefix, name, my_ns_uri = self.adapter.get_ns_info_from_node_name(
-                attr_name, element)
+            if '}' in attr_name:
+                prefix, name, my_ns_uri = adapter.get_ns_info_from_node_name(
+                    attr_name, element)
+            elif ':' in attr_name:
+                prefix, name = attr_name.split(':')
+                if prefix in prefix_ns_uris:
+                    my_ns_uri = prefix_ns_uris[prefix]
+                else:
+                    prefix, name, my_ns_uri = (
+                        adapter.get_ns_info_from_node_name(attr_name, element))
+                    prefix_ns_uris[prefix] = my_ns_uri
+            else:
+                prefix, name, my_ns_uri = None, attr_name, None
             if ' ' in name:
                 raise ValueError("Invalid attribute name value contains space")
             # If necessary, add an xmlns defn for new prefix-defined namespace
             if not prefix and '}' in attr_name:
-                prefix = self.adapter.get_ns_prefix_for_uri(
+                prefix = adapter.get_ns_prefix_for_uri(
                     element, my_ns_uri, auto_generate_prefix=True)
-                self.adapter.set_node_attribute_value(element,
+                adapter.set_node_attribute_value(element,
                     'xmlns:%s' % prefix, my_ns_uri, ns_uri=self.XMLNS_URI)
+                prefix_ns_uris, element_ns_uri = {}, None
             # Apply kw-specified namespace if not overridden by prefix name
             if my_ns_uri is None:
                 my_ns_uri = ns_uri
             if ns_uri is not None:
                 # Apply attribute namespace URI if different from owning elem
-                if ns_uri == self.adapter.get_node_namespace_uri(element):
+                if element_ns_uri is None:
+                    element_ns_uri = adapter.get_node_namespace_uri(element)
+                if ns_uri == element_ns_uri:
                     my_ns_uri = None
             # Forcibly convert all data to unicode text
             if not isinstance(v, basestring):
@@ -840,8 +965,14 @@ class Element(NameValueNodeMixin,
                 qname = '%s:%s' % (prefix, name)
             else:
                 qname = name
-            self.adapter.set_node_attribute_value(
-                element, qname, v, ns_uri=my_ns_uri)
+            if qname == 'xmlns' or prefix == 'xmlns':
+                # Declare namespaces straight away, for use by later names
+                adapter.set_node_attribute_value(
+                    element, qname, v, ns_uri=my_ns_uri)
+                prefix_ns_uris, element_ns_uri = {}, None
+            else:
+                new_attrs.append((qname, v, my_ns_uri))
+        adapter.set_node_attribute_values(element, new_attrs)
 
     def set_attributes(self, attr_obj=None, ns_uri=None, **attr_dict):
         """
@@ -868,8 +999,8 @@ class Element(NameValueNodeMixin,
             any existing attributes, as opposed to the :meth:`set_attributes`
             method which only updates and replaces them.
         """
-        attr_impl_nodes = self.adapter.get_node_attributes(self.impl_node)
-        return AttributeDict(attr_impl_nodes, self.impl_node, self.adapter)
+        # Attribute nodes are only looked up when needed by the AttributeDict
+        return AttributeDict(None, self.impl_node, self.adapter)
 
     @attributes.setter
     def attributes(self, attr_obj):
@@ -1009,6 +1140,106 @@ class Element(NameValueNodeMixin,
         return self.adapter.wrap_node(
             child_elem, self.adapter.impl_document, self.adapter)
 
+    def add_elements_from(self, records, name, attributes=None, text=None,
+            ns_uri=None):
+        """
+        Add a new child element to this element for each record in an
+        iterable, where every child has the same name and its attributes and
+        text are taken from fields of the record.
+
+        This is much faster than adding each child with :meth:`add_element`
+        because the namespaces of the names are resolved once, and the
+        children are created in a single step by the adapter without
+        wrapping them as :class:`Element` nodes.
+
+        :param records: the data for the new child elements, one record per
+            child. A record can be anything with fields that can be looked up
+            with ``record[field]``, such as a dict or a tuple.
+        :type records: iterable
+        :param string name: the name for every child, which may include a
+            namespace prefix or literal URI as for :meth:`add_element`.
+        :param attributes: a mapping from attribute names to record fields.
+            An attribute name may include a namespace prefix defined for
+            this element, or a literal namespace URI. A field may also be a
+            function that takes a record and returns the attribute value.
+            Attributes with a *None* value in a record are omitted.
+        :type attributes: dict or None
+        :param text: the record field with the text of each child, or a
+            function that takes a record and returns the text. Children
+            with *None* text are left empty.
+        :type text: field, function or None
+        :param ns_uri: a URI specifying the namespace of every child. If the
+            ``name`` parameter specifies a namespace this parameter is
+            ignored.
+        :type ns_uri: string or None
+        """
+        adapter = self.adapter
+        # Determine local name, namespace and prefix info from tag name once
+        # for all the children, as for add_element
+        prefix, local_name, node_ns_uri = \
+            adapter.get_ns_info_from_node_name(name, self.impl_node)
+        if prefix:
+            qname = u'%s:%s' % (prefix, local_name)
+        else:
+            qname = local_name
+        if node_ns_uri is None:
+            if ns_uri is None:
+                node_ns_uri = adapter.get_ns_uri_for_prefix(
+                    self.impl_node, None)
+            else:
+                node_ns_uri = ns_uri
+        attr_names = []
+        attr_fields = []
+        if not prefix and '}' in name:
+            attr_names.append(('xmlns', self.XMLNS_URI))
+            attr_fields.append(lambda record: node_ns_uri)
+        elif ns_uri is not None:
+            attr_names.append(('xmlns', self.XMLNS_URI))
+            attr_fields.append(lambda record: ns_uri)
+        # Resolve attribute names in this element's scope, in the same order
+        # as for set_attributes
+        for attr_name, field in sorted((attributes or {}).items(),
+                key=lambda item: (not item[0].startswith('xmlns'), item[0])):
+            attr_prefix, attr_local_name, attr_ns_uri = \
+                adapter.get_ns_info_from_node_name(attr_name, self.impl_node)
+            if ' ' in attr_local_name:
+                raise ValueError("Invalid attribute name value contains space")
+            # If necessary, declare a new prefix for a namespace given by
+            # literal URI on this element, once for all the children
+            if not attr_prefix and '}' in attr_name:
+                attr_prefix = adapter.get_ns_prefix_for_uri(
+                    self.impl_node, attr_ns_uri, auto_generate_prefix=True)
+                adapter.set_node_attribute_value(self.impl_node,
+                    'xmlns:%s' % attr_prefix, attr_ns_uri,
+                    ns_uri=self.XMLNS_URI)
+            if attr_prefix:
+                attr_names.append(
+                    ('%s:%s' % (attr_prefix, attr_local_name), attr_ns_uri))
+            else:
+                attr_names.append((attr_local_name, attr_ns_uri))
+            attr_fields.append(field)
+
+        def _field_value(record, field):
+            if callable(field):
+                value = field(record)
+            else:
+                value = record[field]
+            # Forcibly convert all data to unicode text
+            if value is not None and not isinstance(value, basestring):
+                value = unicode(value)
+            return value
+
+        def _rows():
+            for record in records:
+                values = [_field_value(record, f) for f in attr_fields]
+                if text is None:
+                    yield values, None
+                else:
+                    yield values, _field_value(record, text)
+
+        adapter.add_node_elements(
+            self.impl_node, qname, node_ns_uri, attr_names, _rows())
+
     def _add_text(self, element, text):
         text_node = self.adapter.new_impl_text(text)
         self.adapter.add_node_child(element, text_node)
@@ -1072,12 +1303,23 @@ class AttributeDict(object):
     modifications that will immediately affect the element.
     """
 
+    __slots__ = ('impl_element', 'adapter')
+
     def __init__(self, attr_impl_nodes, impl_element, adapter):
+        """
+        :param attr_impl_nodes: ignored, and kept only for compatibility
+            with callers that pass the element's attribute nodes, since
+            attributes are always looked up from *impl_element* when needed.
+        :param impl_element: element node in the underlying XML
+            implementation whose attributes are represented.
+        :param adapter: the :class:`xml4h.impls.XmlImplAdapter` for
+            *impl_element*.
+        """
         self.impl_element = impl_element
         self.adapter = adapter
 
     def __len__(self):
-        return len(self.impl_attributes)
+        return self.adapter.get_node_attribute_count(self.impl_element)
 
     def __getitem__(self, attr_name):
         prefix, name, ns_uri = self.adapter.get_ns_info_from_node_name(
@@ -1190,6 +1432,32 @@ class AttributeDict(object):
         return self.adapter.get_node_attributes(self.impl_element)
 
 
+def _build_filter_fn(local_name=None, name=None, ns_uri=None,
+        node_type=None):
+    """
+    :return: a function that returns True for :class:`Node` objects that
+        match all of the given constraints, as for :meth:`NodeList.filter`.
+    """
+    def filter_fn(n):
+        # Test node type first in case other tests require this type
+        if node_type is not None:
+            # Node type can be specified as an integer constant (e.g.
+            # ELEMENT_NODE) or a class.
+            if isinstance(node_type, int):
+                if not n.is_type(node_type):
+                    return False
+            elif n.__class__ != node_type:
+                return False
+        if name is not None and n.name != name:
+            return False
+        if local_name is not None and n.local_name != local_name:
+            return False
+        if ns_uri is not None and n.ns_uri != ns_uri:
+            return False
+        return True
+    return filter_fn
+
+
 class NodeList(list):
     """
     Custom implementation for :class:`Node` lists that provides additional
@@ -1231,30 +1499,16 @@ class NodeList(list):
         """
         # Build our own filter function unless a custom function is provided
         if filter_fn is None:
-            def filter_fn(n):
-                # Test node type first in case other tests require this type
-                if node_type is not None:
-                    # Node type can be specified as an integer constant (e.g.
-                    # ELEMENT_NODE) or a class.
-                    if isinstance(node_type, int):
-                        if not n.is_type(node_type):
-                            return False
-                    elif n.__class__ != node_type:
-                        return False
-                if name is not None and n.name != name:
-                    return False
-                if local_name is not None and n.local_name != local_name:
-                    return False
-                if ns_uri is not None and n.ns_uri != ns_uri:
-                    return False
-                return True
-        # Filter nodes
-        nodelist = filter(filter_fn, self)
+            filter_fn = _build_filter_fn(local_name=local_name, name=name,
+                ns_uri=ns_uri, node_type=node_type)
         # If requested, return just the first node (or None if no nodes)
         if first_only:
-            return nodelist[0] if nodelist else None
+            for n in self:
+                if filter_fn(n):
+                    return n
+            return None
         else:
-            return NodeList(nodelist)
+            return NodeList(filter(filter_fn, self))
 
     __call__ = filter  # Alias
     """Alias for :meth:`filter`."""
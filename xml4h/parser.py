@@ -0,0 +1,138 @@
+"""
+Configuration of the parsers provided by underlying XML libraries, and
+helpers for feeding XML data to them.
+"""
+import mmap
+import collections
+
+
+# Types of objects holding raw XML data that parsers read via BufferReader
+BUFFER_TYPES = (bytearray, memoryview, buffer, mmap.mmap)
+
+
+class ParserConfig(collections.namedtuple('ParserConfig', [
+        'huge_tree', 'resolve_entities', 'recover',
+        'remove_comments', 'remove_pis'])):
+    """
+    Options that control how XML documents are parsed, for passing to
+    :func:`xml4h.parse` and related functions.
+
+    Not every :ref:`XML library implementation <xml-lib-adapters>` can
+    apply every option. Parsing with an option changed from its default
+    value raises :class:`~xml4h.exceptions.FeatureUnavailableException` if
+    the adapter cannot apply it.
+
+    ParserConfig objects are immutable, so a single instance can be shared
+    and reused for any number of documents.
+    """
+    __slots__ = ()
+
+    def __new__(cls, huge_tree=False, resolve_entities=True, recover=False,
+            remove_comments=False, remove_pis=False):
+        """
+        :param bool huge_tree: if *True* disable the parser's security
+            limits on the depth of the tree and the size of text content.
+        :param bool resolve_entities: if *False* entity references are
+            retained instead of being replaced by their values.
+        :param bool recover: if *True* the parser tries hard to parse
+            broken XML instead of raising an error.
+        :param bool remove_comments: if *True* comments are discarded.
+        :param bool remove_pis: if *True* processing instructions are
+            discarded.
+        """
+        return super(ParserConfig, cls).__new__(cls, huge_tree,
+            resolve_entities, recover, remove_comments, remove_pis)
+
+    @property
+    def changed_options(self):
+        """
+        :return: a list of the names of options with non-default values.
+        """
+        return [name for name, value, default_value
+            in zip(self._fields, self, DEFAULT_PARSER_CONFIG)
+            if value != default_value]
+
+
+DEFAULT_PARSER_CONFIG = ParserConfig()
+"""
+The parser configuration applied when none is given.
+"""
+
+
+class BufferReader(object):
+    """
+    File-like reader of the XML data in a buffer such as a *bytearray*,
+    *memoryview* or memory-mapped file.
+
+    Parsers read the data in small chunks, so the content of the buffer
+    is never copied in full.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._position = 0
+
+    def read(self, size=-1):
+        """
+        :return: up to *size* bytes of data from the current position as a
+            string, or all the remaining data if *size* is negative.
+        """
+        start = self._position
+        if size is None or size < 0:
+            end = len(self._data)
+        else:
+            end = min(start + size, len(self._data))
+        self._position = end
+        chunk = self._data[start:end]
+        if isinstance(chunk, memoryview):
+            return chunk.tobytes()
+        return str(chunk)
+
+
+class FeedParser(object):
+    """
+    Parser for an XML document that arrives in chunks, such as from a
+    network connection in an event-driven program. Each chunk is parsed as
+    soon as it is fed in, so the work of parsing a large document is spread
+    across many short calls instead of blocking in one long one.
+
+    Get a feed parser for an adapter from :func:`xml4h.feed_parser`.
+    Adapters provide subclasses that implement :meth:`_feed` and
+    :meth:`_close` with the incremental parser of the underlying library.
+    """
+
+    def __init__(self, adapter, ignore_whitespace_text_nodes=True,
+            parser_config=None):
+        self.adapter = adapter
+        self.ignore_whitespace_text_nodes = ignore_whitespace_text_nodes
+        self.parser_config = adapter.check_parser_config(parser_config)
+        self._is_closed = False
+
+    def feed(self, data):
+        """
+        Parse the next chunk of the XML document.
+
+        :param string data: a chunk of raw XML data, which can end anywhere
+            in the document.
+        """
+        if self._is_closed:
+            raise ValueError('Cannot feed data to a closed parser')
+        self._feed(data)
+
+    def close(self):
+        """
+        Finish parsing the XML document, once all of it has been fed in.
+
+        :return: an :class:`xml4h.nodes.Document` node representing the
+            parsed document.
+        """
+        if self._is_closed:
+            raise ValueError('Parser is already closed')
+        self._is_closed = True
+        return self._close()
+
+    def _feed(self, data):
+        raise NotImplementedError("Implementation missing for %s" % self)
+
+    def _close(self):
+        raise NotImplementedError("Implementation missing for %s" % self)
@@ -0,0 +1,212 @@
+"""
+Opt-in instrumentation that counts and times the calls made to *xml4h*
+adapter methods, to show how much work the underlying XML library is asked
+to do by higher-level operations.
+"""
+import types
+import timeit
+import threading
+
+from xml4h.impls import iter_adapter_classes
+from xml4h.impls.interface import XmlImplAdapter
+
+
+# Profiles currently collecting statistics. While this is empty the adapter
+# classes are left untouched, so instrumentation costs nothing
+_active_profiles = ()
+
+# Original class attributes replaced by instrumented versions, by class
+_original_attrs = {}
+
+_instrumentation_lock = threading.Lock()
+
+
+def _adapter_classes(cls=XmlImplAdapter):
+    """
+    Generate all subclasses of the given adapter class, at any depth.
+    """
+    for subclass in cls.__subclasses__():
+        yield subclass
+        for subsubclass in _adapter_classes(subclass):
+            yield subsubclass
+
+
+def _instrumented_function(name, func):
+    """
+    :return: a function that calls *func* and reports the call and its
+        duration to each active profile.
+    """
+    def instrumented(self, *args, **kwargs):
+        profiles = _active_profiles
+        start_time = timeit.default_timer()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            elapsed_time = timeit.default_timer() - start_time
+            for profile in profiles:
+                profile._record_call(self, name, elapsed_time)
+    instrumented.__name__ = func.__name__
+    instrumented.__doc__ = func.__doc__
+    return instrumented
+
+
+def _instrumented_attr(cls, name, value):
+    """
+    :return: an instrumented version of the class attribute *value*, or
+        *None* if it is not a method or property.
+    """
+    if isinstance(value, types.FunctionType):
+        return _instrumented_function(name, value)
+    elif isinstance(value, classmethod):
+        func = value.__get__(None, cls).im_func
+        return classmethod(_instrumented_function(name, func))
+    elif isinstance(value, property) and value.fget is not None:
+        return property(_instrumented_function(name, value.fget),
+            value.fset, value.fdel, value.__doc__)
+    return None
+
+
+def _instrument_adapters():
+    """
+    Replace the methods and properties of every adapter class with
+    instrumented versions.
+    """
+    # Import all the adapter classes, so that adapters first used while
+    # profiles are active are instrumented too
+    list(iter_adapter_classes())
+    classes = list(_adapter_classes())
+    # Find every class's methods before changing any, so each instrumented
+    # method wraps the original rather than an instrumented superclass method
+    replacements = []
+    for cls in classes:
+        found_names = set()
+        for klass in cls.__mro__:
+            for name, value in klass.__dict__.items():
+                if name.startswith('__') or name in found_names:
+                    continue
+                found_names.add(name)
+                instrumented = _instrumented_attr(cls, name, value)
+                if instrumented is not None:
+                    replacements.append((cls, name, instrumented))
+            if klass is XmlImplAdapter:
+                break
+    for cls, name, instrumented in replacements:
+        _original_attrs.setdefault(cls, {})[name] = cls.__dict__.get(name)
+        setattr(cls, name, instrumented)
+
+
+def _uninstrument_adapters():
+    """
+    Restore the original methods and properties of every adapter class.
+    """
+    for cls, attrs in _original_attrs.items():
+        for name, value in attrs.items():
+            if value is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, value)
+    _original_attrs.clear()
+
+
+class Profile(object):
+    """
+    Statistics about the calls made to adapter methods while the profile
+    is active, for all documents or for a single document.
+
+    A profile is usually active within a ``with`` statement, see
+    :func:`xml4h.profile`, but can also be started and stopped directly.
+
+    The time recorded for a method includes the time spent in any other
+    adapter methods it calls, which are also recorded in their own right.
+    While any profile is active, calls made in every thread are counted.
+    """
+
+    def __init__(self, node=None):
+        """
+        :param node: if given, only calls made for the document containing
+            this node are recorded. Calls of class methods, such as those
+            that parse documents, are not made for any particular document
+            and are not recorded.
+        :type node: :class:`xml4h.nodes.Node` or None
+        """
+        if node is None:
+            self._adapter = None
+        else:
+            self._adapter = node.adapter
+        self._lock = threading.Lock()
+        self.calls = {}
+        """Number of calls by method name."""
+        self.seconds = {}
+        """Total time in seconds spent in calls by method name."""
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Start recording calls to adapter methods.
+        """
+        global _active_profiles
+        with _instrumentation_lock:
+            if self in _active_profiles:
+                raise ValueError('Profile is already active')
+            if not _active_profiles:
+                _instrument_adapters()
+            _active_profiles += (self,)
+
+    def stop(self):
+        """
+        Stop recording calls to adapter methods.
+        """
+        global _active_profiles
+        with _instrumentation_lock:
+            if self not in _active_profiles:
+                raise ValueError('Profile is not active')
+            _active_profiles = tuple(
+                p for p in _active_profiles if p is not self)
+            if not _active_profiles:
+                _uninstrument_adapters()
+
+    def _record_call(self, adapter, name, elapsed_time):
+        if self._adapter is not None and adapter is not self._adapter:
+            return
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.seconds[name] = self.seconds.get(name, 0.0) + elapsed_time
+
+    @property
+    def total_calls(self):
+        """
+        :return: the number of calls recorded for all methods.
+        """
+        return sum(self.calls.values())
+
+    def as_dict(self):
+        """
+        :return: a dictionary mapping each method name to a dictionary with
+            the number of ``calls`` recorded and their total ``seconds``.
+        """
+        with self._lock:
+            return dict(
+                (name, {'calls': count, 'seconds': self.seconds[name]})
+                for name, count in self.calls.items())
+
+    def report(self, limit=None):
+        """
+        :param limit: the maximum number of methods to include.
+        :type limit: int or None
+
+        :return: a text table of methods by the total time spent in them,
+            slowest first.
+        """
+        stats = sorted(self.as_dict().items(),
+            key=lambda item: item[1]['seconds'], reverse=True)
+        lines = ['%-40s %10s %12s' % ('Method', 'Calls', 'Seconds')]
+        for name, method_stats in stats[:limit]:
+            lines.append('%-40s %10d %12.6f' % (
+                name, method_stats['calls'], method_stats['seconds']))
+        return '\n'.join(lines)
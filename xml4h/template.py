@@ -0,0 +1,164 @@
+"""
+Templates for producing many near-identical XML documents quickly, by
+substituting values into a skeleton document that is serialized only once.
+"""
+import re
+import collections
+
+import xml4h
+from xml4h.writer import iter_write_node, _sanitize_write_value
+
+
+# Placeholder for a value in the text or attribute values of a skeleton
+SLOT_RE = re.compile(r'\$\{([A-Za-z_]\w*)\}')
+
+# Serialized markup, where attribute values can contain placeholders but
+# comments, CDATA sections and processing instructions cannot
+MARKUP_RE = re.compile(
+    r'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<\?.*?\?>|<[^>]*>', re.DOTALL)
+
+
+class TemplateSlot(collections.namedtuple('TemplateSlot', ['name', 'kind'])):
+    """
+    A place in a :class:`Template` where a value is substituted, with the
+    *name* of the value and the *kind* of content it becomes, either
+    ``'text'`` or ``'attribute'``.
+    """
+    __slots__ = ()
+
+
+class Template(object):
+    """
+    A skeleton XML document that is compiled once into static fragments of
+    serialized XML and slots for values, and can then be rendered any
+    number of times with different values much faster than building and
+    writing each document.
+
+    Slots are marked in the text or attribute values of the skeleton with
+    placeholders of the form ``${name}``. Placeholders in comments, CDATA
+    sections and processing instructions are left as they are.
+    """
+
+    def __init__(self, source, adapter=None, encoding='utf-8', indent=0,
+            newline='', omit_declaration=False):
+        """
+        Compile a template from a skeleton document.
+
+        :param source: the skeleton document, as an *xml4h* node, a
+            :class:`~xml4h.builder.Builder` whose whole document is the
+            skeleton, or anything accepted by :func:`xml4h.parse`.
+        :param adapter: the *xml4h* implementation adapter class used to
+            parse the skeleton, if necessary, and rendered documents.
+            If None, the adapter of the skeleton node is used or
+            :attr:`xml4h.best_adapter` if the skeleton is parsed.
+        :type adapter: adapter class or None
+        :param encoding: the character encoding of rendered XML, or *None*
+            to render unicode text.
+
+        The *indent*, *newline* and *omit_declaration* arguments control
+        how the skeleton is serialized, as for :func:`xml4h.write_node`.
+        """
+        if isinstance(source, xml4h.Builder):
+            node = source.document
+        elif isinstance(source, xml4h.nodes.Node):
+            node = source
+        else:
+            node = xml4h.parse(source, adapter=adapter)
+        if adapter is None:
+            adapter = node.adapter_class
+        self.adapter = adapter
+        self.encoding = encoding
+        text = ''.join(iter_write_node(node, encoding=encoding,
+            indent=indent, newline=newline,
+            omit_declaration=omit_declaration))
+        if encoding is not None:
+            text = text.decode(encoding)
+        self._compile(text)
+
+    def _compile(self, text):
+        """
+        Split serialized XML into the static fragments and slots of this
+        template.
+        """
+        # Parts of the rendered text, with None in the place of each slot
+        self._parts = []
+        self._slot_positions = []
+        self.slots = []
+        static_text = []
+
+        def _add_content(content, kind):
+            position = 0
+            for match in SLOT_RE.finditer(content):
+                static_text.append(content[position:match.start()])
+                self._parts.append(u''.join(static_text))
+                del static_text[:]
+                self._slot_positions.append((len(self._parts), match.group(1)))
+                self._parts.append(None)
+                self.slots.append(TemplateSlot(match.group(1), kind))
+                position = match.end()
+            static_text.append(content[position:])
+
+        position = 0
+        for match in MARKUP_RE.finditer(text):
+            _add_content(text[position:match.start()], 'text')
+            markup = match.group()
+            if markup.startswith('<!') or markup.startswith('<?'):
+                static_text.append(markup)
+            else:
+                _add_content(markup, 'attribute')
+            position = match.end()
+        _add_content(text[position:], 'text')
+        self._parts.append(u''.join(static_text))
+
+    @property
+    def slot_names(self):
+        """
+        :return: the names of the values substituted into this template, in
+            the order they first appear.
+        """
+        names = []
+        for slot in self.slots:
+            if slot.name not in names:
+                names.append(slot.name)
+        return names
+
+    def render(self, values=None, **value_dict):
+        """
+        Render this template with values substituted into its slots.
+
+        :param values: the values by slot name. Values other than strings
+            are converted to unicode text, except *None* which is rendered
+            as empty text. All values are XML-escaped.
+        :type values: dict or None
+        :param dict value_dict: values specified as keyword arguments.
+
+        :return: the rendered XML, encoded with this template's encoding.
+
+        :raises KeyError: if there is no value for a slot.
+        """
+        if values is None:
+            values = value_dict
+        elif value_dict:
+            values = dict(values, **value_dict)
+        parts = list(self._parts)
+        for index, name in self._slot_positions:
+            value = values[name]
+            if value is None:
+                value = u''
+            elif not isinstance(value, basestring):
+                value = unicode(value)
+            parts[index] = _sanitize_write_value(value)
+        text = u''.join(parts)
+        if self.encoding is not None:
+            text = text.encode(self.encoding)
+        return text
+
+    def render_document(self, values=None, **value_dict):
+        """
+        Render this template with values substituted into its slots, as for
+        :meth:`render`, and parse the result.
+
+        :return: a new :class:`xml4h.nodes.Document` node.
+        """
+        return xml4h.parse(self.render(values, **value_dict),
+            adapter=self.adapter)
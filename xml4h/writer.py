@@ -3,10 +3,67 @@ Writer to serialize XML DOM documents or sections to text.
 """
 # This implementation is adapted (heavily) from the standard library method
 # xml.dom.minidom.writexml
+import re
 import sys
 import codecs
 
-from xml4h import exceptions
+from xml4h import nodes, exceptions
+
+
+# Characters that must be escaped in text content and attribute values
+ESCAPE_CHARS_RE = re.compile(u'[&<>"]')
+
+ESCAPE_CHARS_DICT = {
+    u'&': u'&amp;',
+    u'<': u'&lt;',
+    u'"': u'&quot;',
+    u'>': u'&gt;',
+    }
+
+# Number of text fragments to accumulate before output is encoded and sent
+# to the writer, so the writer receives a few large chunks of text
+WRITE_BUFFER_SIZE = 8192
+
+
+def _escape_char(match):
+    return ESCAPE_CHARS_DICT[match.group()]
+
+
+def _sanitize_write_value(value):
+    """Return XML-encoded value."""
+    # A missing value, such as minidom's value for a namespace undeclaration
+    # like xmlns="", is written as empty text
+    if value is None:
+        return u''
+    # ElementTree stores values as they are given, which may not be text
+    if not isinstance(value, basestring):
+        value = unicode(value)
+    # Most values need no escaping, check for this quickly
+    if not value or ESCAPE_CHARS_RE.search(value) is None:
+        return value
+    return ESCAPE_CHARS_RE.sub(_escape_char, value)
+
+
+def _sanitize_whitespace_params(indent, newline):
+    """
+    Return the literal indent and newline strings for the forms of these
+    formatting parameters accepted by :func:`write_node`.
+    """
+    if indent is True:
+        indent = ' ' * 4
+    elif indent is False or indent is None:
+        indent = ''
+    elif isinstance(indent, int):
+        indent = ' ' * indent
+    # If indent but no newline set, always apply a newline (it makes sense)
+    if indent and not newline:
+        newline = True
+
+    if newline is None or newline is False:
+        newline = ''
+    elif newline is True:
+        newline = '\n'
+    return indent, newline
 
 
 def write_node(node, writer=None, encoding='utf-8', indent=0, newline='',
@@ -49,134 +106,638 @@ def write_node(node, writer=None, encoding='utf-8', indent=0, newline='',
     :param string quote_char: the character that delimits quoted content.
         You should never need to mess with this.
     """
-    def _sanitize_write_value(value):
-        """Return XML-encoded value."""
-        if not value:
-            return value
-        return (value
-            .replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace("\"", "&quot;")
-            .replace(">", "&gt;")
-            )
+    # We always need a writer, use stdout by default
+    if writer is None:
+        writer = sys.stdout
+    for text in iter_write_node(node, encoding=encoding, indent=indent,
+            newline=newline, omit_declaration=omit_declaration,
+            node_depth=node_depth, quote_char=quote_char):
+        writer.write(text)
 
+
+def iter_write_node(node, encoding='utf-8', indent=0, newline='',
+        omit_declaration=False, node_depth=0, quote_char='"'):
+    """
+    Serialize an *xml4h* DOM node and its descendants to text, generating
+    the output in chunks of a few kilobytes instead of writing it.
+
+    Only the work needed for each chunk is done before the chunk is
+    generated, so an event-driven program can send each chunk on its way
+    and attend to other tasks before requesting the next.
+
+    The arguments are the same as for :func:`write_node`, without *writer*.
+
+    :return: a generator of text chunks, which are byte strings unless
+        *encoding* is *None*.
+    """
     def _write_node_impl(node, node_depth):
         """
-        Internal write implementation that does the real work while keeping
-        track of node depth.
+        Internal write implementation that does the real work for unusual
+        node types while keeping track of node depth.
         """
         # Output document declaration if we're outputting the whole doc
         if node.is_document:
             if not omit_declaration:
-                writer.write(
-                    '<?xml version=%s1.0%s' % (quote_char, quote_char))
+                write('<?xml version=%s1.0%s' % (quote_char, quote_char))
                 if encoding:
-                    writer.write(' encoding=%s%s%s'
+                    write(' encoding=%s%s%s'
                         % (quote_char, encoding, quote_char))
-                writer.write('?>%s' % newline)
-            for child in node.children:
-                _write_node_impl(child,
-                    node_depth)  # node_depth not incremented
-            writer.write(newline)
+                write('?>%s' % newline)
+            for child in adapter.get_node_children(node.impl_node):
+                for text in _write_impl_node(child,
+                        node_depth):  # node_depth not incremented
+                    yield text
+            write(newline)
         elif node.is_document_type:
-            writer.write("<!DOCTYPE %s SYSTEM %s%s%s"
+            write("<!DOCTYPE %s SYSTEM %s%s%s"
                 % (node.name, quote_char, node.public_id))
             if node.system_id is not None:
-                writer.write(
-                    " %s%s%s" % (quote_char, node.system_id, quote_char))
+                write(" %s%s%s" % (quote_char, node.system_id, quote_char))
             if node.children:
-                writer.write("[")
+                write("[")
                 for child in node.children:
-                    _write_node_impl(child, node_depth + 1)
-                writer.write("]")
-            writer.write(">")
-        elif node.is_text:
-            writer.write(_sanitize_write_value(node.value))
-        elif node.is_cdata:
-            if ']]>' in node.value:
-                raise ValueError("']]>' is not allowed in CDATA node value")
-            writer.write("<![CDATA[%s]]>" % node.value)
+                    for text in _write_node_impl(child, node_depth + 1):
+                        yield text
+                write("]")
+            write(">")
         #elif node.is_entity_reference:  # TODO
         elif node.is_entity:
-            writer.write(newline + indent * node_depth)
-            writer.write("<!ENTITY ")
+            write(newline + indent * node_depth)
+            write("<!ENTITY ")
             if node.is_paremeter_entity:
-                writer.write('%% ')
-            writer.write("%s %s%s%s>"
+                write('%% ')
+            write("%s %s%s%s>"
                 % (node.name, quote_char, node.value, quote_char))
-        elif node.is_processing_instruction:
-            writer.write(newline + indent * node_depth)
-            writer.write("<?%s %s?>" % (node.target, node.data))
-        elif node.is_comment:
-            if '--' in node.value:
-                raise ValueError("'--' is not allowed in COMMENT node value")
-            writer.write("<!--%s-->" % node.value)
         elif node.is_notation:
-            writer.write(newline + indent * node_depth)
-            writer.write("<!NOTATION %s" % node.name)
+            write(newline + indent * node_depth)
+            write("<!NOTATION %s" % node.name)
             if node.is_system_identifier:
-                writer.write(" system %s%s%s>"
+                write(" system %s%s%s>"
                     % (quote_char, node.external_id, quote_char))
             elif node.is_system_identifier:
-                writer.write(" system %s%s%s %s%s%s>"
+                write(" system %s%s%s %s%s%s>"
                     % (quote_char, node.external_id, quote_char,
                     quote_char, node.uri, quote_char))
-        elif node.is_attribute:
-            writer.write(" %s=%s" % (node.name, quote_char))
-            writer.write(_sanitize_write_value(node.value))
-            writer.write(quote_char)
-        elif node.is_element:
-            # Only need a preceding newline if we're in a sub-element
-            if node_depth > 0:
-                writer.write(newline)
-            writer.write(indent * node_depth)
-            writer.write("<" + node.name)
-
-            for attr in node.attribute_nodes:
-                _write_node_impl(attr, node_depth)
-            if node.children:
-                found_indented_child = False
-                writer.write(">")
-                for child in node.children:
-                    _write_node_impl(child, node_depth + 1)
-                    if not (child.is_text
-                            or child.is_comment
-                            or child.is_cdata):
-                        found_indented_child = True
-                if found_indented_child:
-                    writer.write(newline + indent * node_depth)
-                writer.write('</%s>' % node.name)
-            else:
-                writer.write('/>')
         else:
-            raise exceptions.Xml4hImplementationBug(
-                'Cannot write node with class: %s' % node.__class__)
+            for text in _write_impl_node(node.impl_node, node_depth):
+                yield text
 
-    # Sanitize whitespace parameters
-    if indent is True:
-        indent = ' ' * 4
-    elif indent is False:
-        indent = ''
-    elif isinstance(indent, int):
-        indent = ' ' * indent
-    # If indent but no newline set, always apply a newline (it makes sense)
-    if indent and not newline:
-        newline = True
+    def _write_impl_node(impl_node, node_depth):
+        """
+        Write an underlying implementation node and its descendants using
+        the adapter directly, which avoids wrapping the common node types in
+        *xml4h* nodes, and generate the output each time the buffer fills.
 
-    if newline is None or newline is False:
-        newline = ''
-    elif newline is True:
-        newline = '\n'
+        Descendants are visited without recursion, using a stack of the
+        elements whose end tags are still to be written.
+        """
+        # Each open element is a list of its name, depth, an iterator over
+        # its remaining children, and whether it has an indented child
+        open_elements = []
+        while True:
+            node_type = adapter.map_node_to_class(impl_node)._node_type
+            if open_elements and node_type not in (
+                    nodes.TEXT_NODE, nodes.COMMENT_NODE, nodes.CDATA_NODE):
+                open_elements[-1][3] = True
+            if node_type == nodes.ELEMENT_NODE:
+                text = None
+                if impl_node is native_impl_node:
+                    text = adapter.serialize_node(impl_node)
+                if text is not None:
+                    write(text)
+                else:
+                    name = adapter.get_node_name(impl_node)
+                    # Only need a preceding newline if we're in a sub-element
+                    if node_depth > 0:
+                        write(newline)
+                    write(indent * node_depth)
+                    write("<" + name)
+                    attr_items = [
+                        (adapter.get_node_name(a), adapter.get_node_value(a))
+                        for a in adapter.get_node_attributes(impl_node)]
+                    attr_items.sort()
+                    for attr_name, attr_value in attr_items:
+                        write(" %s=%s%s%s" % (attr_name, quote_char,
+                            _sanitize_write_value(attr_value), quote_char))
+                    children = adapter.get_node_children(impl_node)
+                    if children:
+                        write(">")
+                        open_elements.append(
+                            [name, node_depth, iter(children), False])
+                    else:
+                        write('/>')
+            elif node_type == nodes.TEXT_NODE:
+                write(_sanitize_write_value(
+                    adapter.get_node_value(impl_node)))
+            elif node_type == nodes.CDATA_NODE:
+                value = adapter.get_node_value(impl_node)
+                if ']]>' in value:
+                    raise ValueError(
+                        "']]>' is not allowed in CDATA node value")
+                write("<![CDATA[%s]]>" % value)
+            elif node_type == nodes.PROCESSING_INSTRUCTION_NODE:
+                write(newline + indent * node_depth)
+                write("<?%s %s?>" % (adapter.get_node_name(impl_node),
+                    adapter.get_node_value(impl_node)))
+            elif node_type == nodes.COMMENT_NODE:
+                value = adapter.get_node_value(impl_node)
+                if '--' in value:
+                    raise ValueError(
+                        "'--' is not allowed in COMMENT node value")
+                write("<!--%s-->" % value)
+            elif node_type == nodes.ATTRIBUTE_NODE:
+                write(" %s=%s%s%s" % (adapter.get_node_name(impl_node),
+                    quote_char,
+                    _sanitize_write_value(adapter.get_node_value(impl_node)),
+                    quote_char))
+            elif node_type in (nodes.DOCUMENT_NODE, nodes.DOCUMENT_TYPE_NODE,
+                    nodes.ENTITY_NODE, nodes.NOTATION_NODE):
+                for text in _write_node_impl(adapter.wrap_node(
+                        impl_node, adapter.impl_document, adapter),
+                        node_depth):
+                    yield text
+            else:
+                raise exceptions.Xml4hImplementationBug(
+                    'Cannot write node with class: %s'
+                    % adapter.map_node_to_class(impl_node))
+            if len(output) >= WRITE_BUFFER_SIZE:
+                text = _flush()
+                if text:
+                    yield text
+            # Move on to the next child of the innermost open element,
+            # closing any elements that have no children left
+            while open_elements:
+                name, parent_depth, children, found_indented_child = (
+                    open_elements[-1])
+                impl_node = next(children, None)
+                if impl_node is not None:
+                    node_depth = parent_depth + 1
+                    break
+                open_elements.pop()
+                if found_indented_child:
+                    write(newline + indent * parent_depth)
+                write('</%s>' % name)
+            else:
+                return
 
-    # We always need a writer, use stdout by default
-    if writer is None:
-        writer = sys.stdout
+    def _flush(final=False):
+        """
+        :return: the buffered output, encoded if necessary.
+        """
+        text = ''.join(output)
+        del output[:]
+        if encoder is not None:
+            text = encoder.encode(text, final)
+        return text
 
-    # Apply a text encoding if we have one
+    indent, newline = _sanitize_whitespace_params(indent, newline)
+
+    # Apply a text encoding if we have one, encoding output in large chunks
     if encoding is None:
-        writer = writer
+        encoder = None
     else:
-        writer = codecs.getwriter(encoding)(writer)
+        encoder = codecs.getincrementalencoder(encoding)()
+
+    # Accumulate output text in a buffer, generated as it fills
+    output = []
+    write = output.append
+    adapter = node.adapter
+
+    # Let the underlying XML library serialize the top element, if it can
+    # produce exactly the same output because no formatting is required
+    native_impl_node = None
+    if not indent and not newline and quote_char == '"':
+        if node.is_document:
+            native_impl_node = adapter.impl_root_element
+        elif node.is_element:
+            native_impl_node = node.impl_node
 
     # Do the business...
-    _write_node_impl(node, node_depth)
+    for text in _write_node_impl(node, node_depth):
+        yield text
+    text = _flush(final=True)
+    if text:
+        yield text
+
+
+class _OpenElement(object):
+    """
+    Record of an element written by a :class:`StreamWriter` that has not
+    yet been closed.
+    """
+    __slots__ = ('name', 'namespaces', 'has_indented_child')
+
+    def __init__(self, name):
+        self.name = name
+        # Namespace URIs declared by this element, keyed by prefix
+        self.namespaces = {}
+        self.has_indented_child = False
+
+
+class StreamWriter(object):
+    """
+    Writer that serializes XML content as soon as it is added, for
+    generating documents too large to build as a DOM in memory.
+
+    A StreamWriter provides the same "chainable" methods as a
+    :class:`xml4h.builder.Builder` for adding content, except that it
+    always represents the most recently-added element that has not yet been
+    closed, and content cannot be changed once it is written. Only the
+    stack of open elements is held in memory: each element's start tag is
+    written when content is added to the element, and its end tag is
+    written when you move :meth:`up` past it or :meth:`close` the writer.
+
+    The output is the same as :func:`write_node` would produce for an
+    equivalent document built in a DOM.
+    """
+
+    def __init__(self, writer=None, encoding='utf-8', indent=0, newline='',
+            omit_declaration=False, quote_char='"'):
+        """
+        Create a StreamWriter that will send the XML text for a new document
+        to the given *writer*. Add the document's root element with
+        :meth:`element`.
+
+        The parameters are the same as for :func:`write_node`.
+        """
+        self._indent, self._newline = _sanitize_whitespace_params(
+            indent, newline)
+        # We always need a writer, use stdout by default
+        if writer is None:
+            writer = sys.stdout
+        self._writer = writer
+        self._encoding = encoding
+        if encoding is None:
+            self._encoder = None
+        else:
+            self._encoder = codecs.getincrementalencoder(encoding)()
+        self._omit_declaration = omit_declaration
+        self._quote_char = quote_char
+        self._output = []
+        self._open_elements = []
+        # Attributes of the newest open element, until its start tag is
+        # written when content is added to it
+        self._pending_attributes = None
+        self._auto_ns_prefix_count = 0
+        self._has_root = False
+        self._is_closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    def _current_element(self):
+        if not self._open_elements:
+            if self._is_closed:
+                raise ValueError("StreamWriter is closed")
+            raise ValueError("StreamWriter has no open element")
+        return self._open_elements[-1]
+
+    def _lookup_ns_uri(self, prefix):
+        for open_element in reversed(self._open_elements):
+            if prefix in open_element.namespaces:
+                return open_element.namespaces[prefix]
+        return None
+
+    def _lookup_ns_prefix(self, ns_uri):
+        for open_element in reversed(self._open_elements):
+            for prefix, uri in open_element.namespaces.items():
+                # Ignore prefixes redefined by a descendant element
+                if (uri == ns_uri and prefix is not None
+                        and self._lookup_ns_uri(prefix) == ns_uri):
+                    return prefix
+        return None
+
+    def _declare_ns(self, prefix, ns_uri):
+        if prefix is None:
+            attr_name = 'xmlns'
+        else:
+            attr_name = 'xmlns:%s' % prefix
+        self._open_elements[-1].namespaces[prefix] = ns_uri
+        self._pending_attributes[attr_name] = ns_uri
+
+    def _write_start_tag(self, close_tag=False):
+        """
+        Finish writing the start tag of the newest open element, if
+        necessary, with the attributes accumulated for it.
+        """
+        attributes = self._pending_attributes
+        if attributes is None:
+            return
+        self._pending_attributes = None
+        output = self._output
+        for attr_name in sorted(attributes):
+            output.append(' %s=%s%s%s' % (attr_name, self._quote_char,
+                _sanitize_write_value(attributes[attr_name]),
+                self._quote_char))
+        output.append(close_tag and '/>' or '>')
+
+    def _start_content(self, is_indented):
+        """
+        Prepare to write content within the newest open element.
+        """
+        open_element = self._current_element()
+        self._write_start_tag()
+        if is_indented:
+            open_element.has_indented_child = True
+            self._output.append(
+                self._newline + self._indent * len(self._open_elements))
+
+    def _end_element(self):
+        open_element = self._open_elements[-1]
+        if self._pending_attributes is not None:
+            self._write_start_tag(close_tag=True)
+        else:
+            if open_element.has_indented_child:
+                self._output.append(self._newline
+                    + self._indent * (len(self._open_elements) - 1))
+            self._output.append('</%s>' % open_element.name)
+        self._open_elements.pop()
+        if len(self._output) >= WRITE_BUFFER_SIZE:
+            self.flush()
+
+    def element(self, name, ns_uri=None, attributes=None, text=None):
+        """
+        Write the start of a new element, as the document's root element
+        or as a child of the newest open element.
+
+        :param string name: a name for the element, which may include a
+            namespace prefix or a literal namespace URI as for
+            :meth:`xml4h.nodes.Element.add_element`.
+        :param ns_uri: a URI specifying the new element's namespace.
+            If the ``name`` parameter specifies a namespace this parameter
+            is ignored.
+        :type ns_uri: string or None
+        :param attributes: collection of attributes to assign to the element.
+        :type attributes: dict, list, tuple, or None
+        :param text: text value to assign to the element, where values other
+            than strings are converted to unicode text.
+        :type text: string or None
+
+        :return: this StreamWriter, now representing the new element.
+        """
+        # Determine prefix and namespace from the name before the new
+        # element's declarations are in scope
+        declare_ns_uri = None
+        if '}' in name:
+            node_ns_uri, name = name[1:].split('}')
+            if node_ns_uri == self._lookup_ns_uri(None):
+                prefix = None
+            else:
+                prefix = self._lookup_ns_prefix(node_ns_uri)
+                if prefix is None:
+                    declare_ns_uri = node_ns_uri
+        elif ':' in name:
+            prefix, name = name.split(':')
+            if self._lookup_ns_uri(prefix) is None:
+                raise exceptions.UnknownNamespaceException(
+                    "Prefix '%s' does not have a defined namespace URI"
+                    % prefix)
+        else:
+            prefix = None
+            if ns_uri is not None and ns_uri != self._lookup_ns_uri(None):
+                declare_ns_uri = ns_uri
+        if self._open_elements:
+            self._start_content(True)
+        elif self._has_root:
+            raise ValueError("StreamWriter document already has a root")
+        else:
+            self._has_root = True
+            if not self._omit_declaration:
+                self._output.append('<?xml version=%s1.0%s' %
+                    (self._quote_char, self._quote_char))
+                if self._encoding:
+                    self._output.append(' encoding=%s%s%s' % (
+                        self._quote_char, self._encoding, self._quote_char))
+                self._output.append('?>%s' % self._newline)
+        if prefix:
+            name = u'%s:%s' % (prefix, name)
+        self._open_elements.append(_OpenElement(name))
+        self._output.append('<' + name)
+        self._pending_attributes = {}
+        if declare_ns_uri is not None:
+            self._declare_ns(None, declare_ns_uri)
+        if attributes is not None:
+            self.attributes(attributes)
+        if text is not None:
+            self.text(text)
+        return self
+
+    elem = element  # Alias
+    """Alias of :meth:`element`"""
+
+    e = element  # Alias
+    """Alias of :meth:`element`"""
+
+    def attributes(self, attr_obj=None, ns_uri=None, **attr_dict):
+        """
+        Add one or more attributes to the newest open element, which is only
+        possible until content has been added to the element.
+
+        :param attr_obj: a dictionary or list of attribute name/value pairs.
+        :type attr_obj: dict, list, tuple, or None
+        :param ns_uri: a URI defining a namespace for the new attributes.
+        :type ns_uri: string or None
+        :param dict attr_dict: attribute name and values specified as keyword
+            arguments.
+
+        :return: this StreamWriter.
+        """
+        self._current_element()
+        if self._pending_attributes is None:
+            raise ValueError(
+                "Cannot add attributes to an element after its content")
+        if attr_obj is not None:
+            if isinstance(attr_obj, dict):
+                attr_dict.update(attr_obj)
+            elif isinstance(attr_obj, (list, tuple)):
+                for n, v in attr_obj:
+                    attr_dict[n] = v
+            else:
+                raise exceptions.IncorrectArgumentTypeException(
+                    attr_obj, [dict, list, tuple])
+        # Always process 'xmlns' namespace definitions first, in case other
+        # attributes belong to a newly-defined namespace
+        attr_list = sorted(attr_dict.items(),
+            key=lambda x: (not x[0].startswith('xmlns'), x[0]))
+        for attr_name, v in attr_list:
+            # Forcibly convert all data to unicode text
+            if not isinstance(v, basestring):
+                v = unicode(v)
+            if attr_name == 'xmlns':
+                self._declare_ns(None, v)
+                continue
+            elif attr_name.startswith('xmlns:'):
+                self._declare_ns(attr_name[6:], v)
+                continue
+            if '}' in attr_name:
+                attr_ns_uri, attr_name = attr_name[1:].split('}')
+            elif (ns_uri is not None and ':' not in attr_name
+                    and ns_uri != self._lookup_ns_uri(None)):
+                attr_ns_uri = ns_uri
+            else:
+                attr_ns_uri = None
+            if ' ' in attr_name:
+                raise ValueError("Invalid attribute name value contains space")
+            if ':' in attr_name:
+                prefix = attr_name.split(':')[0]
+                if self._lookup_ns_uri(prefix) is None:
+                    raise exceptions.UnknownNamespaceException(
+                        "Prefix '%s' does not have a defined namespace URI"
+                        % prefix)
+            elif attr_ns_uri is not None:
+                # If necessary, add an xmlns defn for a new namespace
+                prefix = self._lookup_ns_prefix(attr_ns_uri)
+                if prefix is None:
+                    prefix = 'autoprefix%d' % self._auto_ns_prefix_count
+                    self._auto_ns_prefix_count += 1
+                    self._declare_ns(prefix, attr_ns_uri)
+                attr_name = '%s:%s' % (prefix, attr_name)
+            self._pending_attributes[attr_name] = v
+        return self
+
+    attrs = attributes  # Alias
+    """Alias of :meth:`attributes`"""
+
+    a = attributes  # Alias
+    """Alias of :meth:`attributes`"""
+
+    def text(self, text):
+        """
+        Write text content within the newest open element.
+
+        :return: this StreamWriter.
+        """
+        if not isinstance(text, basestring):
+            text = unicode(text)
+        self._start_content(False)
+        self._output.append(_sanitize_write_value(text))
+        if len(self._output) >= WRITE_BUFFER_SIZE:
+            self.flush()
+        return self
+
+    t = text  # Alias
+    """Alias of :meth:`text`"""
+
+    def comment(self, text):
+        """
+        Write a comment within the newest open element.
+
+        :return: this StreamWriter.
+        """
+        if '--' in text:
+            raise ValueError("'--' is not allowed in COMMENT node value")
+        self._start_content(False)
+        self._output.append('<!--%s-->' % text)
+        return self
+
+    c = comment  # Alias
+    """Alias of :meth:`comment`"""
+
+    def processing_instruction(self, target, data):
+        """
+        Write a processing instruction within the newest open element.
+
+        :return: this StreamWriter.
+        """
+        self._start_content(True)
+        self._output.append('<?%s %s?>' % (target, data))
+        return self
+
+    instruction = processing_instruction  # Alias
+    """Alias of :meth:`processing_instruction`"""
+
+    i = instruction  # Alias
+    """Alias of :meth:`processing_instruction`"""
+
+    def cdata(self, text):
+        """
+        Write a CDATA section within the newest open element.
+
+        :return: this StreamWriter.
+        """
+        if ']]>' in text:
+            raise ValueError("']]>' is not allowed in CDATA node value")
+        self._start_content(False)
+        self._output.append('<![CDATA[%s]]>' % text)
+        return self
+
+    data = cdata  # Alias
+    """Alias of :meth:`cdata`"""
+
+    d = cdata  # Alias
+    """Alias of :meth:`cdata`"""
+
+    def ns_prefix(self, prefix, ns_uri):
+        """
+        Define a namespace prefix on the newest open element, which is only
+        possible until content has been added to the element.
+
+        :return: this StreamWriter.
+        """
+        if prefix is None:
+            return self.attributes({'xmlns': ns_uri})
+        return self.attributes({'xmlns:%s' % prefix: ns_uri})
+
+    def up(self, count=1, to_name=None):
+        """
+        Close open elements to return to an ancestor of the newest open
+        element, by default its parent. The root element is never closed
+        by this method, use :meth:`close` to finish the document.
+
+        :param count: close this many elements; defaults to 1 which
+            means the newest element is closed.
+        :type count: integer >= 1 or None
+        :param to_name: close elements up to the nearest ancestor element
+            with the matching name, or up to the root element if there are
+            no matching elements. This argument trumps the ``count``
+            argument.
+        :type to_name: string or None
+
+        :return: this StreamWriter, now representing the ancestor element.
+        """
+        self._current_element()
+        if to_name is not None:
+            count = len(self._open_elements) - 1
+            for i, open_element in enumerate(
+                    reversed(self._open_elements[:-1])):
+                if open_element.name == to_name:
+                    count = i + 1
+                    break
+        # Don't go up beyond the document root
+        for i in range(min(count, len(self._open_elements) - 1)):
+            self._end_element()
+        return self
+
+    def flush(self, final=False):
+        """
+        Send all the text written so far to the writer, encoded if necessary.
+
+        :param bool final: if *True* no more text will be written, so the
+            encoder can output any state it is holding back.
+        """
+        text = ''.join(self._output)
+        del self._output[:]
+        if self._encoder is not None:
+            text = self._encoder.encode(text, final)
+        if text:
+            self._writer.write(text)
+
+    def close(self):
+        """
+        Close all open elements to finish the document, and send the
+        remaining text to the writer. Closing the writer more than once has
+        no effect. Note that the underlying writer is not closed.
+        """
+        if self._is_closed:
+            return
+        if not self._has_root:
+            raise ValueError("StreamWriter document has no root element")
+        while self._open_elements:
+            self._end_element()
+        self._output.append(self._newline)
+        self._is_closed = True
+        self.flush(final=True)